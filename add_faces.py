@@ -1,9 +1,14 @@
 import cv2 
 import os
-import face_recognition
+from gallery import FaceGallery
+from face_index import INDEX_FILE
+from detection import detect_faces
+from encoding_cache import encode_faces
+from face_quality import enrollment_gate, REJECTION_MESSAGES
 
 # Configuração dos diretórios
 KNOWN_FACES_DIR = 'data/known_faces'
+DETECTION_SCALE = 0.25  # Em 1920x1080 o rosto é grande: detecta em 480x270 e recorta na resolução original
 
 if not os.path.exists(KNOWN_FACES_DIR):
     os.makedirs(KNOWN_FACES_DIR)
@@ -20,24 +25,22 @@ def testar_camera(index=0):
 # Função para carregar as codificações de rostos registrados
 def carregar_faces_registradas():
     """Carrega as codificações de rostos salvos no diretório."""
-    registered_encodings = {}
-    for filename in os.listdir(KNOWN_FACES_DIR):
-        filepath = os.path.join(KNOWN_FACES_DIR, filename)
-        if os.path.isfile(filepath):
-            image = face_recognition.load_image_file(filepath)
-            encodings = face_recognition.face_encodings(image)
-            if encodings:  # Garante que a face foi detectada
-                registered_encodings[filename] = encodings[0]
-    return registered_encodings
+    # Usa o cache compartilhado; só imagens novas ou alteradas são recalculadas
+    return FaceGallery.from_directory(KNOWN_FACES_DIR, extension='')
 
 # Verifica se a face já está registrada
 def is_face_registered(new_face_encoding, registered_encodings, tolerance=0.5):
     """Verifica se a face já está registrada no sistema."""
-    for registered_encoding in registered_encodings.values():
-        match = face_recognition.compare_faces([registered_encoding], new_face_encoding, tolerance)
-        if match[0]:  # Se verdadeiro, a face já está registrada
-            return True
-    return False
+    # Uma única consulta vetorizada contra toda a galeria
+    return registered_encodings.contains(new_face_encoding, tolerance)
+
+# Atualiza o índice persistido da galeria com as fotos recém-salvas
+def atualizar_indice_galeria():
+    """Insere no índice salvo apenas as codificações novas (se o índice existir)."""
+    if not os.path.exists(INDEX_FILE):
+        return
+    gallery = FaceGallery.from_directory(KNOWN_FACES_DIR)
+    gallery.attach_index(INDEX_FILE)
 
 # Função para capturar e salvar rostos
 def capture_faces_for_person(name):
@@ -52,7 +55,10 @@ def capture_faces_for_person(name):
     video.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
 
     photo_count = 0
+    rejected_count = 0
     registered_encodings = carregar_faces_registradas()
+    # Amostras pequenas, borradas ou de perfil não são salvas (nem codificadas)
+    quality_gate = enrollment_gate()
 
     while photo_count < 5:  # Captura 5 fotos por pessoa
         ret, frame = video.read()
@@ -64,8 +70,25 @@ def capture_faces_for_person(name):
         rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
         # Detecta rostos
-        face_locations = face_recognition.face_locations(rgb_frame)
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+        face_locations = detect_faces(rgb_frame, scale=DETECTION_SCALE)
+
+        # Verifica a qualidade antes de codificar; os rejeitados ficam em vermelho com o motivo
+        accepted_locations, accepted_shapes = [], []
+        for face_location in face_locations:
+            reason, shape = quality_gate.check(rgb_frame, face_location)
+            if reason is None:
+                accepted_locations.append(face_location)
+                accepted_shapes.append(shape)
+                continue
+            rejected_count += 1
+            top, right, bottom, left = face_location
+            cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
+            cv2.putText(frame, REJECTION_MESSAGES[reason], (left, max(top - 10, 20)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+        face_locations = accepted_locations
+        # Os landmarks calculados pelo portão são reaproveitados na codificação
+        shapes = accepted_shapes if all(shape is not None for shape in accepted_shapes) else None
+        face_encodings = encode_faces(rgb_frame, face_locations, shapes=shapes)
 
         for face_location, face_encoding in zip(face_locations, face_encodings):
             # Converte as coordenadas para a escala original
@@ -105,6 +128,11 @@ def capture_faces_for_person(name):
     video.release()
     cv2.destroyAllWindows()
     print(f"Captura concluída para {name}. {photo_count} fotos salvas.")
+    if rejected_count:
+        print(f"{rejected_count} amostras descartadas por qualidade (tamanho, nitidez ou pose).")
+
+    if photo_count:
+        atualizar_indice_galeria()
 
 # Execução principal
 if __name__ == "__main__":
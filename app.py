@@ -1,28 +1,140 @@
+import os
+import json
+import time
+from collections import deque
+from datetime import datetime, date, timedelta
+
 import streamlit as st
 import pandas as pd
-import time 
-from datetime import datetime
+from streamlit_autorefresh import st_autorefresh
+from attendance_store import AttendanceStore, ATTENDANCE_DB
 
-ts=time.time()
-date=datetime.fromtimestamp(ts).strftime("%d-%m-%Y")
-timestamp=datetime.fromtimestamp(ts).strftime("%H:%M-%S")
+METRICS_FILE = 'data/pipeline_metrics.json'
+RECENT_ROWS = 200  # Registros recentes exibidos na tabela
+REFRESH_MS = 2000
 
-from streamlit_autorefresh import st_autorefresh
+render_start = time.perf_counter()
+st.set_page_config(page_title="Presenças", layout="wide")
+st_autorefresh(interval=REFRESH_MS, key="attendance_refresh")
+
+
+# Assinatura (tamanho, mtime) dos arquivos: a chave de cache muda só quando eles mudam
+def file_signature(*paths):
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+# Conexão única com o banco de presenças (SQLite em modo WAL)
+@st.cache_resource
+def get_store():
+    return AttendanceStore(ATTENDANCE_DB)
+
+
+# Resumo de um dia passado, recalculado só quando o banco muda
+@st.cache_data(max_entries=64, show_spinner=False)
+def load_day_summary(day, signature):
+    return get_store().day_summary(day)
+
+
+# Métricas publicadas pelo reconhecimento (principal.py)
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_metrics(signature):
+    try:
+        with open(METRICS_FILE) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
 
-count = st_autorefresh(interval=2000, limit=100, key="fizzbuzzcounter")
 
-if count == 0:
-    st.write("Count is zero")
-elif count % 3 == 0 and count % 5 == 0:
-    st.write("FizzBuzz")
-elif count % 3 == 0:
-    st.write("Fizz")
-elif count % 5 == 0:
-    st.write("Buzz")
+# Acumula em session_state só os registros de hoje gravados desde a última atualização
+def tail_today(day):
+    state = st.session_state
+    if state.get("day") != day:
+        state.day = day
+        state.last_id = 0
+        state.people = {}
+        state.recent = deque(maxlen=RECENT_ROWS)
+        state.times = deque()  # Horários dos registros da última hora
+    for row in get_store().rows_since(state.last_id, day):
+        person = state.people.setdefault(
+            row["name"], {"name": row["name"], "count": 0, "first_seen": row["time"], "last_seen": row["time"]})
+        person["count"] += 1
+        person["first_seen"] = min(person["first_seen"], row["time"])
+        person["last_seen"] = max(person["last_seen"], row["time"])
+        state.recent.appendleft(row)
+        state.times.append(datetime.strptime(f"{row['day']} {row['time']}", "%Y-%m-%d %H:%M:%S"))
+        state.last_id = row["id"]
+    one_hour_ago = datetime.now() - timedelta(hours=1)
+    while state.times and state.times[0] < one_hour_ago:
+        state.times.popleft()
+    return list(state.people.values()), list(state.recent), len(state.times)
+
+
+# Registros por hora entre o primeiro registro e o último (ou agora, no dia atual)
+def add_rates(people, day, is_today):
+    now = datetime.now()
+    for person in people:
+        first = datetime.strptime(f"{day} {person['first_seen']}", "%Y-%m-%d %H:%M:%S")
+        last = now if is_today else datetime.strptime(f"{day} {person['last_seen']}", "%Y-%m-%d %H:%M:%S")
+        hours = max((last - first).total_seconds() / 3600.0, 1.0)
+        person["rate"] = person["count"] / hours
+    return people
+
+
+selected = st.sidebar.date_input("Dia", value=date.today())
+day = selected.strftime("%Y-%m-%d")
+is_today = selected == date.today()
+
+if is_today:
+    people, recent, last_hour = tail_today(day)
 else:
-    st.write(f"Count: {count}")
+    people = load_day_summary(day, file_signature(ATTENDANCE_DB, ATTENDANCE_DB + "-wal"))
+    recent, last_hour = [], None
+people = add_rates([dict(person) for person in people], day, is_today)
 
+st.title(f"Presenças — {selected.strftime('%d-%m-%Y')}")
+
+total = sum(person["count"] for person in people)
+columns = st.columns(3)
+columns[0].metric("Pessoas", len(people))
+columns[1].metric("Registros", total)
+columns[2].metric("Registros na última hora", "-" if last_hour is None else last_hour)
+
+# Métricas do reconhecimento em tempo real
+metrics = load_metrics(file_signature(METRICS_FILE))
+st.subheader("Reconhecimento")
+if metrics is None or time.time() - metrics["updated_at"] > 10:
+    st.caption("Nenhuma métrica recente: o reconhecimento não está em execução.")
+else:
+    counters = metrics["counters"]
+    rate = counters["recognized"] / counters["faces"] if counters["faces"] else 0.0
+    columns = st.columns(3)
+    columns[0].metric("FPS", f"{metrics['fps']:.1f}")
+    columns[1].metric("Rostos vistos", counters["faces"])
+    columns[2].metric("Taxa de reconhecimento", f"{rate:.0%}")
+    stages = pd.DataFrame.from_dict(metrics["stages"], orient="index")
+    st.dataframe(stages.rename(columns={"count": "itens", "avg_ms": "média (ms)", "max_ms": "máx (ms)",
+                                        "p50_ms": "p50 (ms)", "p95_ms": "p95 (ms)", "p99_ms": "p99 (ms)",
+                                        "drops": "descartes"}).round(1),
+                 use_container_width=True)
+
+st.subheader("Por pessoa")
+if people:
+    summary = pd.DataFrame(people).sort_values("name").rename(columns={
+        "name": "NAME", "count": "registros", "first_seen": "primeiro", "last_seen": "último", "rate": "registros/h"})
+    st.dataframe(summary.round(2), hide_index=True, use_container_width=True)
+else:
+    st.info("Nenhuma presença registrada neste dia.")
 
-df=pd.read_csv("Attendance/Attendance_" + date + ".csv")
+if recent:
+    st.subheader("Registros recentes")
+    recent_df = pd.DataFrame(recent, columns=["name", "time"]).rename(columns={"name": "NAME", "time": "TIME"})
+    st.dataframe(recent_df, hide_index=True, use_container_width=True)
 
-st.dataframe(df.style.highlight_max(axis=0))
\ No newline at end of file
+st.caption(f"Atualizado em {1000 * (time.perf_counter() - render_start):.0f} ms.")
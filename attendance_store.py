@@ -0,0 +1,162 @@
+import os
+import csv
+import json
+import sqlite3
+import argparse
+import datetime
+import threading
+
+ATTENDANCE_DB = 'data/attendance.db'
+ATTENDANCE_DIR = 'Attendance'
+LEGACY_LOG_FILE = 'recognition_log.json'
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    day TEXT NOT NULL,      -- YYYY-MM-DD
+    time TEXT NOT NULL,     -- HH:MM:SS
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS attendance_day_name ON attendance (day, name);
+CREATE INDEX IF NOT EXISTS attendance_name_day ON attendance (name, day, time);
+-- Último registro de cada pessoa, mantido a cada gravação (evita varrer o histórico na abertura)
+CREATE TABLE IF NOT EXISTS last_seen (
+    name TEXT PRIMARY KEY,
+    time TEXT NOT NULL      -- YYYY-MM-DD HH:MM:SS
+);
+"""
+
+
+class AttendanceStore:
+    """Presenças em SQLite (modo WAL), compartilhadas pelo reconhecimento e pelo painel.
+
+    Também serve de armazenamento para `event_log.RecognitionLog`
+    (`load_last_seen`, `append`, `save_index`, `close`). Com WAL, leitores
+    como o app.py nunca bloqueiam a escrita nem veem uma gravação pela metade.
+    """
+
+    def __init__(self, path=ATTENDANCE_DB, legacy_file=None):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        created = not os.path.exists(path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(SCHEMA)
+        if created and legacy_file and os.path.exists(legacy_file):
+            self._import_legacy(legacy_file)
+
+    def _import_legacy(self, legacy_file):
+        """Importa uma única vez o histórico antigo (JSON nome -> lista de horários)."""
+        with open(legacy_file, 'r') as file:
+            history = json.load(file)
+        events = sorted(({'name': name, 'time': time} for name, times in history.items() for time in times),
+                        key=lambda event: event['time'])
+        self.append(events)
+        print(f"Histórico de {legacy_file} importado para {self.path} ({len(events)} eventos).")
+
+    # Interface usada por event_log.RecognitionLog
+
+    def load_last_seen(self):
+        """{nome: datetime} do último registro de cada pessoa (uma linha por pessoa)."""
+        with self._lock:
+            rows = self._connection.execute("SELECT name, time FROM last_seen").fetchall()
+        return {row['name']: datetime.datetime.strptime(row['time'], TIME_FORMAT) for row in rows}
+
+    def append(self, events):
+        """Grava os eventos ({'name', 'time': 'YYYY-MM-DD HH:MM:SS', 'source'?}) em uma transação."""
+        rows = [(event['name'], event['time'][:10], event['time'][11:], event.get('source'))
+                for event in events]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO attendance (name, day, time, source) VALUES (?, ?, ?, ?)", rows)
+            self._connection.executemany(
+                "INSERT INTO last_seen (name, time) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET time = excluded.time WHERE excluded.time > last_seen.time",
+                [(event['name'], event['time']) for event in events])
+
+    def save_index(self):
+        pass  # O próprio SQLite mantém os índices
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    # Consultas do painel
+
+    def rows_since(self, last_id=0, day=None, limit=None):
+        """Registros com id maior que `last_id` (opcionalmente de um dia), em ordem de id."""
+        query = "SELECT id, name, day, time, source FROM attendance WHERE id > ?"
+        params = [last_id]
+        if day is not None:
+            query += " AND day = ?"
+            params.append(day)
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._connection.execute(query, params)]
+
+    def day_summary(self, day):
+        """Por pessoa: registros, primeiro e último horário no dia."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT name, COUNT(*) AS count, MIN(time) AS first_seen, MAX(time) AS last_seen "
+                "FROM attendance WHERE day = ? GROUP BY name ORDER BY name", (day,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def days(self):
+        with self._lock:
+            return [row['day'] for row in self._connection.execute(
+                "SELECT DISTINCT day FROM attendance ORDER BY day DESC")]
+
+    # Exportação e importação no formato dos CSVs diários (Attendance/Attendance_dd-mm-YYYY.csv)
+
+    def export_csv(self, day, directory=ATTENDANCE_DIR):
+        """Grava os registros do dia no formato NAME,TIME e retorna o caminho do arquivo."""
+        date = datetime.datetime.strptime(day, "%Y-%m-%d").strftime("%d-%m-%Y")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"Attendance_{date}.csv")
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT name, time FROM attendance WHERE day = ? ORDER BY time, id", (day,)).fetchall()
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['NAME', 'TIME'])
+            writer.writerows((row['name'], row['time']) for row in rows)
+        return path
+
+    def import_csv(self, path):
+        """Importa um CSV diário (o dia vem do nome do arquivo) e retorna o número de registros."""
+        date = os.path.splitext(os.path.basename(path))[0].split('_')[-1]
+        day = datetime.datetime.strptime(date, "%d-%m-%Y").strftime("%Y-%m-%d")
+        with open(path, newline='') as file:
+            events = [{'name': row['NAME'], 'time': f"{day} {row['TIME']}"} for row in csv.DictReader(file)]
+        self.append(events)
+        return len(events)
+
+
+# Linha de comando: exportar um dia para CSV ou importar CSVs antigos
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Banco de presenças (SQLite).")
+    parser.add_argument('--db', default=ATTENDANCE_DB)
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='exporta um dia para Attendance/Attendance_dd-mm-YYYY.csv')
+    export_parser.add_argument('--date', default=datetime.date.today().strftime("%d-%m-%Y"), help='dd-mm-YYYY')
+    import_parser = commands.add_parser('import', help='importa CSVs diários existentes')
+    import_parser.add_argument('files', nargs='+')
+    args = parser.parse_args()
+
+    store = AttendanceStore(args.db)
+    if args.command == 'export':
+        day = datetime.datetime.strptime(args.date, "%d-%m-%Y").strftime("%Y-%m-%d")
+        print(f"Exportado para {store.export_csv(day)}.")
+    else:
+        for path in args.files:
+            print(f"{path}: {store.import_csv(path)} registros importados.")
+    store.close()
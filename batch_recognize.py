@@ -0,0 +1,240 @@
+"""Reconhecimento em lote (sem câmera e sem janela) de vídeos e pastas de imagens.
+
+Os quadros dos vídeos são divididos em trechos e as imagens em lotes,
+distribuídos entre processos; cada processo monta a galeria uma única vez.
+Os resultados saem na ordem das entradas, como JSONL ou CSV. O CSV começa
+com NAME,TIME (HH:MM:SS), como os arquivos de Attendance/, e traz o dia e os
+demais campos nas colunas seguintes.
+
+Uso: python batch_recognize.py aulas/ fotos/ --workers 8 --every 5 --format csv -o presencas.csv
+"""
+import os
+import sys
+import csv
+import math
+import json
+import argparse
+import datetime
+import multiprocessing
+import cv2
+
+from gallery import FaceGallery, UNKNOWN_NAME
+from identities import IdentityGallery
+from gallery_file import GALLERY_FILE, DTYPES, MappedIdentityGallery, update_gallery_file
+from detection import FaceDetector
+from recognizer import FaceRecognizer
+from encoding_cache import KNOWN_FACES_DIR, IMAGE_EXTENSIONS
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# NAME,TIME primeiro e no formato de Attendance/Attendance_dd-mm-YYYY.csv; o dia vai em DATE
+CSV_FIELDS = ['NAME', 'TIME', 'DATE', 'SOURCE', 'FRAME', 'DISTANCE']
+CSV_TIME_FORMAT = "%H:%M:%S"
+CSV_DATE_FORMAT = "%d-%m-%Y"
+
+# Estado de cada processo do pool (montado uma vez no inicializador)
+_recognizer = None
+
+
+def _init_worker(matcher, threshold, detection_scale, gallery_path=None):
+    global _recognizer
+    if gallery_path is not None:
+        # Arquivo mapeado: o modelo por identidade é lido do arquivo, sem cópia por processo
+        matcher = MappedIdentityGallery(gallery_path)
+    _recognizer = FaceRecognizer(matcher, threshold=threshold, detector=FaceDetector(scale=detection_scale))
+
+
+def _distance(distance):
+    """Distância arredondada; None sem correspondência (galeria vazia: inf) ou sem avaliação."""
+    if distance is None or not math.isfinite(distance):
+        return None
+    return round(float(distance), 4)
+
+
+def _results(faces_and_matches, source, frame_index, when):
+    locations, matches = faces_and_matches
+    return [{'name': name, 'time': when.strftime(TIME_FORMAT), 'source': source,
+             'frame': frame_index, 'distance': _distance(distance), 'location': [int(v) for v in location]}
+            for location, (name, distance) in zip(locations, matches)]
+
+
+def _process_images(paths):
+    """Tarefa: um lote de imagens; o horário é o mtime de cada arquivo."""
+    results = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Não foi possível ler {path}.", file=sys.stderr)
+            continue
+        when = datetime.datetime.fromtimestamp(os.path.getmtime(path))
+        results.extend(_results(_recognizer.detect_and_identify(image), path, None, when))
+    return results
+
+
+def _process_video_shard(task):
+    """Tarefa: quadros [início, fim) de um vídeo, um a cada `every`."""
+    path, start_frame, end_frame, every, start_time, fps = task
+    video = cv2.VideoCapture(path)
+    video.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    results = []
+    for frame_index in range(start_frame, end_frame):
+        # grab() avança sem decodificar; só os quadros amostrados são decodificados
+        if frame_index % every:
+            if not video.grab():
+                break
+            continue
+        ret, frame = video.read()
+        if not ret:
+            break
+        when = start_time + datetime.timedelta(seconds=frame_index / fps)
+        results.extend(_results(_recognizer.detect_and_identify(frame), path, frame_index, when))
+    video.release()
+    return results
+
+
+def collect_inputs(paths):
+    """Separa as entradas (arquivos ou diretórios, recursivamente) em vídeos e imagens."""
+    videos, images = [], []
+    for path in paths:
+        files = [path]
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        for file in files:
+            extension = os.path.splitext(file)[1].lower()
+            if extension in VIDEO_EXTENSIONS:
+                videos.append(file)
+            elif extension in IMAGE_EXTENSIONS:
+                images.append(file)
+    return videos, images
+
+
+def build_tasks(videos, images, every=5, shard_frames=300, images_per_task=16, start=None):
+    """Lista ordenada de (função, argumento) a distribuir entre os processos."""
+    tasks = []
+    for path in videos:
+        video = cv2.VideoCapture(path)
+        frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = video.get(cv2.CAP_PROP_FPS) or 30.0
+        video.release()
+        if frame_count <= 0:
+            print(f"Não foi possível ler {path}.", file=sys.stderr)
+            continue
+        start_time = start or datetime.datetime.fromtimestamp(os.path.getmtime(path))
+        for first in range(0, frame_count, shard_frames):
+            tasks.append((_process_video_shard,
+                          (path, first, min(first + shard_frames, frame_count), every, start_time, fps)))
+    for first in range(0, len(images), images_per_task):
+        tasks.append((_process_images, images[first:first + images_per_task]))
+    return tasks
+
+
+def _run_task(task):
+    function, argument = task
+    return function(argument)
+
+
+class AttendanceFilter:
+    """Mantém só um registro por pessoa e origem a cada `seconds` segundos (como no principal.py)."""
+
+    def __init__(self, seconds=60, unknown_name=UNKNOWN_NAME):
+        self.window = datetime.timedelta(seconds=seconds)
+        self.unknown_name = unknown_name
+        self.last_seen = {}
+
+    def accept(self, result):
+        if result['name'] == self.unknown_name:
+            return False
+        key = (result['source'], result['name'])
+        when = datetime.datetime.strptime(result['time'], TIME_FORMAT)
+        last_time = self.last_seen.get(key)
+        if last_time is not None and abs(when - last_time) < self.window:
+            return False
+        self.last_seen[key] = when
+        return True
+
+
+def run(paths, output, output_format='jsonl', workers=None, every=5, threshold=0.5, detection_scale=0.5,
+        dedupe_seconds=60, start=None, store=None, gallery_dtype=None):
+    """Processa as entradas e escreve os resultados em `output`; retorna o número de registros.
+
+    Sem `gallery_dtype`, o modelo por identidade é montado uma vez e cada processo
+    recebe uma cópia; com 'float16' ou 'int8', os processos leem o modelo
+    gravado na galeria compacta de `gallery_file` (mapeada em memória e
+    dividida entre eles); o modo de comparação é o mesmo.
+    """
+    videos, images = collect_inputs(paths)
+    tasks = build_tasks(videos, images, every=every, start=start)
+    if not tasks:
+        print("Nenhum vídeo ou imagem encontrado.", file=sys.stderr)
+        return 0
+
+    # A galeria é montada (e o cache atualizado) só no processo principal
+    if gallery_dtype is not None:
+        update_gallery_file(GALLERY_FILE, KNOWN_FACES_DIR, gallery_dtype)
+        initargs = (None, threshold, detection_scale, GALLERY_FILE)
+    else:
+        matcher = IdentityGallery.from_gallery(FaceGallery.from_directory(KNOWN_FACES_DIR))
+        initargs = (matcher, threshold, detection_scale)
+    attendance = AttendanceFilter(dedupe_seconds) if dedupe_seconds else None
+
+    writer = None
+    if output_format == 'csv':
+        writer = csv.DictWriter(output, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+
+    written = 0
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+        # imap preserva a ordem das tarefas: saída determinística e deduplicação correta
+        for results in pool.imap(_run_task, tasks):
+            accepted = [r for r in results if attendance is None or attendance.accept(r)]
+            for result in accepted:
+                if writer is not None:
+                    when = datetime.datetime.strptime(result['time'], TIME_FORMAT)
+                    writer.writerow({'NAME': result['name'], 'TIME': when.strftime(CSV_TIME_FORMAT),
+                                     'DATE': when.strftime(CSV_DATE_FORMAT), 'SOURCE': result['source'],
+                                     'FRAME': result['frame'], 'DISTANCE': result['distance']})
+                else:
+                    output.write(json.dumps(result, ensure_ascii=False) + '\n')
+            output.flush()
+            if store is not None and accepted:
+                store.append([{'name': r['name'], 'time': r['time'], 'source': r['source']} for r in accepted])
+            written += len(accepted)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('inputs', nargs='+', help='vídeos, imagens ou diretórios')
+    parser.add_argument('-o', '--output', help='arquivo de saída (padrão: saída padrão)')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+    parser.add_argument('--workers', type=int, default=None, help='processos (padrão: núcleos da CPU)')
+    parser.add_argument('--every', type=int, default=5, help='analisa um a cada N quadros dos vídeos')
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--scale', type=float, default=0.5, help='escala da detecção')
+    parser.add_argument('--dedupe', type=int, default=60,
+                        help='segundos entre registros da mesma pessoa por origem (0 = todos os rostos)')
+    parser.add_argument('--start', help='horário do início dos vídeos (YYYY-MM-DD HH:MM:SS; padrão: mtime)')
+    parser.add_argument('--store', action='store_true', help='grava também no banco de presenças')
+    parser.add_argument('--gallery-file', choices=DTYPES,
+                        help='lê a galeria do arquivo compacto mapeado em memória em vez de copiá-la para cada processo')
+    args = parser.parse_args()
+
+    start = datetime.datetime.strptime(args.start, TIME_FORMAT) if args.start else None
+    store = None
+    if args.store:
+        from attendance_store import AttendanceStore
+        store = AttendanceStore()
+    output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        written = run(args.inputs, output, args.format, args.workers, args.every, args.threshold,
+                      args.scale, args.dedupe, start, store, args.gallery_file)
+    finally:
+        if args.output:
+            output.close()
+        if store is not None:
+            store.close()
+    print(f"{written} registros.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
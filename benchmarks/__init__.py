@@ -0,0 +1 @@
+"""Benchmarks do reconhecimento facial (executar a partir da raiz do projeto)."""
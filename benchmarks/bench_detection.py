@@ -0,0 +1,113 @@
+"""Mede o tempo de detecção e o recall em cada escala com as imagens de data/known_faces.
+
+Cada imagem é colocada em um frame do tamanho da câmera (ou usada como
+está, com --native). A referência é a detecção no frame inteiro (escala 1);
+o recall de cada escala é a fração desses rostos reencontrada (IoU >= 0.5).
+O modo ROI procura só em volta das caixas de referência.
+
+Uso: python -m benchmarks.bench_detection --scales 1,0.5,0.25 --model hog
+"""
+import os
+import time
+import json
+import argparse
+import cv2
+import numpy as np
+import face_recognition
+
+from detection import detect_faces, detect_faces_in_regions, expand_location
+from encoding_cache import KNOWN_FACES_DIR, IMAGE_EXTENSIONS
+from tracking import iou
+
+
+def compose_frame(image, frame_size, face_fraction, rng):
+    """Reduz/amplia a imagem para `face_fraction` da altura e a posiciona em um frame preto."""
+    width, height = frame_size
+    factor = min(face_fraction * height / image.shape[0], width / image.shape[1])
+    resized = cv2.resize(image, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    top = int(rng.integers(0, height - resized.shape[0] + 1))
+    left = int(rng.integers(0, width - resized.shape[1] + 1))
+    frame[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return frame
+
+
+def load_frames(directory, frame_size=(1280, 720), face_fraction=0.4, native=False, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.lower().endswith(IMAGE_EXTENSIONS):
+            image = face_recognition.load_image_file(os.path.join(directory, filename))
+            frames.append(image if native else compose_frame(image, frame_size, face_fraction, rng))
+    return frames
+
+
+def count_matches(reference, found, threshold=0.5):
+    """Quantas caixas de referência foram reencontradas (associação gulosa por IoU)."""
+    remaining = list(found)
+    matched = 0
+    for location in reference:
+        overlaps = [iou(location, candidate) for candidate in remaining]
+        if overlaps and max(overlaps) >= threshold:
+            remaining.pop(int(np.argmax(overlaps)))
+            matched += 1
+    return matched
+
+
+def measure(frames, reference, detect):
+    elapsed, matched = 0.0, 0
+    for frame, expected in zip(frames, reference):
+        start = time.perf_counter()
+        found = detect(frame, expected)
+        elapsed += time.perf_counter() - start
+        matched += count_matches(expected, found)
+    total = sum(len(expected) for expected in reference)
+    return {'ms_per_frame': 1000.0 * elapsed / len(frames),
+            'recall': matched / total if total else None}
+
+
+def run(directory, scales, model='hog', frame_size=(1280, 720), face_fraction=0.4, native=False, roi_margin=0.6):
+    frames = load_frames(directory, frame_size, face_fraction, native)
+    if not frames:
+        raise SystemExit(f"Nenhuma imagem encontrada em {directory}.")
+    reference = [detect_faces(frame, model) for frame in frames]
+
+    report = {'images': len(frames), 'faces': sum(len(r) for r in reference), 'model': model,
+              'frame_size': None if native else list(frame_size), 'full': {}, 'roi': {}}
+    for scale in scales:
+        report['full'][str(scale)] = measure(
+            frames, reference, lambda frame, _: detect_faces(frame, model, scale))
+        report['roi'][str(scale)] = measure(
+            frames, reference,
+            lambda frame, expected: detect_faces_in_regions(
+                frame, [expand_location(loc, roi_margin, frame.shape) for loc in expected], model, scale))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', default=KNOWN_FACES_DIR)
+    parser.add_argument('--scales', default='1,0.5,0.25')
+    parser.add_argument('--model', default='hog', choices=['hog', 'cnn'])
+    parser.add_argument('--frame', default='1280x720', help='tamanho do frame sintético (LxA)')
+    parser.add_argument('--face-fraction', type=float, default=0.4, help='altura da imagem em relação ao frame')
+    parser.add_argument('--native', action='store_true', help='usa as imagens no tamanho original')
+    parser.add_argument('--json', action='store_true', help='imprime o resultado em JSON')
+    args = parser.parse_args()
+
+    frame_size = tuple(int(value) for value in args.frame.lower().split('x'))
+    report = run(args.dir, [float(s) for s in args.scales.split(',')], args.model,
+                 frame_size, args.face_fraction, args.native)
+    if args.json:
+        print(json.dumps(report, indent=4))
+        return
+    print(f"{report['images']} imagens, {report['faces']} rostos na referência (modelo {report['model']})")
+    print(f"{'modo':<6}{'escala':>8}{'ms/frame':>11}{'recall':>9}")
+    for mode in ('full', 'roi'):
+        for scale, row in report[mode].items():
+            recall = '-' if row['recall'] is None else f"{row['recall']:.3f}"
+            print(f"{mode:<6}{scale:>8}{row['ms_per_frame']:>11.2f}{recall:>9}")
+
+
+if __name__ == "__main__":
+    main()
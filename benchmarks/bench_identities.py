@@ -0,0 +1,104 @@
+"""Compara o modelo por identidade (centróide + modelos) com a busca em todas as fotos.
+
+Além das fotos novas de pessoas cadastradas (devem ser reconhecidas),
+mede as aceitações indevidas em duas séries de desconhecidos: pessoas que
+não estão na galeria e consultas na fronteira, a `--boundary` do centro de
+uma pessoa cadastrada (perto do limite, onde os dois modos podem divergir).
+
+Com `--templates`, repete o modelo para vários valores de max_templates e
+mostra o reconhecimento de cada um no limite, ao lado do das fotos.
+
+Uso: python -m benchmarks.bench_identities --identities 500 --samples 20 --templates 5,10,15,20
+"""
+import argparse
+import json
+import time
+import numpy as np
+
+from gallery import FaceGallery, UNKNOWN_NAME
+from identities import IdentityGallery
+from benchmarks.synthetic import synthetic_encodings
+
+
+def timed_identify(matcher, queries, threshold, batch):
+    names = []
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        names.extend(name for name, _ in matcher.identify(queries[i:i + batch], threshold))
+    return names, 1000.0 * (time.perf_counter() - start) / len(queries)
+
+
+def boundary_probes(centers, count, radius, seed=0):
+    """Consultas a `radius` do centro de pessoas cadastradas, em direção aleatória."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(centers), count, replace=count > len(centers))
+    directions = rng.normal(size=(count, centers.shape[1])).astype(np.float32)
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    return centers[rows] + radius * directions
+
+
+def accepted_rate(matcher, queries, threshold):
+    return float(np.mean([name != UNKNOWN_NAME for name, _ in matcher.identify(queries, threshold)]))
+
+
+def run(identities, samples, queries_count, threshold=0.5, batch=4, seed=0, boundary=0.45,
+        templates=(15,), shortlist=3):
+    vectors, labels = synthetic_encodings(identities, samples_per_identity=samples, seed=seed)
+    # Consultas são fotos novas das mesmas pessoas (mesmos centros, outro ruído)
+    new_photos, _ = synthetic_encodings(identities, samples_per_identity=1, seed=seed, noise_seed=seed + 1)
+    queries = new_photos[np.random.default_rng(seed).choice(identities, min(queries_count, identities), replace=False)]
+    gallery = FaceGallery.from_encodings(vectors, [f"pessoa{label}" for label in labels])
+    # Desconhecidos: outras pessoas (outros centros) e consultas na fronteira das cadastradas
+    strangers, _ = synthetic_encodings(queries_count, samples_per_identity=1, seed=seed + 1000)
+    centers, _ = synthetic_encodings(identities, samples_per_identity=1, spread=0.0, seed=seed)
+    near = boundary_probes(centers, queries_count, boundary, seed=seed + 2)
+
+    exact_names, exact_ms = timed_identify(gallery, queries, threshold, batch)
+    report = {
+        'rows': len(gallery),
+        'samples': {'comparisons_per_query': len(gallery),
+                    'recognized': float(np.mean([n != UNKNOWN_NAME for n in exact_names])),
+                    'false_accepts': {'strangers': accepted_rate(gallery, strangers, threshold),
+                                      f'boundary_{boundary}': accepted_rate(gallery, near, threshold)},
+                    'ms_per_query': exact_ms},
+        'identities': {},
+    }
+    # Uma linha por valor de max_templates: o reconhecimento no limite não pode cair em relação às fotos
+    for count in templates:
+        start = time.perf_counter()
+        model = IdentityGallery.from_gallery(gallery, max_templates=count, shortlist=shortlist)
+        build_s = time.perf_counter() - start
+        model_names, model_ms = timed_identify(model, queries, threshold, batch)
+        report['identities'][str(count)] = {
+            'identities': len(model),
+            'templates': len(model.templates),
+            'comparisons_per_query': len(model) + model.shortlist * model.max_templates,
+            'agreement': float(np.mean([a == b for a, b in zip(exact_names, model_names)])),
+            'recognized': float(np.mean([n != UNKNOWN_NAME for n in model_names])),
+            'false_accepts': {'strangers': accepted_rate(model, strangers, threshold),
+                              f'boundary_{boundary}': accepted_rate(model, near, threshold)},
+            'ms_per_query': model_ms,
+            'build_s': build_s,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--identities', type=int, default=500)
+    parser.add_argument('--samples', type=int, default=20, help='fotos por pessoa')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--boundary', type=float, default=0.45,
+                        help='distância do centro da pessoa para as consultas de fronteira')
+    parser.add_argument('--templates', default='5,10,15,20',
+                        help='valores de max_templates comparados, separados por vírgula')
+    parser.add_argument('--shortlist', type=int, default=3)
+    args = parser.parse_args()
+    templates = [int(value) for value in args.templates.split(',')]
+    print(json.dumps(run(args.identities, args.samples, args.queries, args.threshold, boundary=args.boundary,
+                         templates=templates, shortlist=args.shortlist), indent=4))
+
+
+if __name__ == "__main__":
+    main()
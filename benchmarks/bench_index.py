@@ -0,0 +1,73 @@
+"""Compara o índice aproximado (IVF) com a busca exata em codificações sintéticas.
+
+Uso: python -m benchmarks.bench_index --size 100000 --nprobe 1,4,8,16,32
+"""
+import argparse
+import json
+import time
+import numpy as np
+
+from face_index import FlatIndex, IVFIndex
+from benchmarks.synthetic import synthetic_encodings, synthetic_queries
+
+
+def time_queries(index, queries, batch):
+    """Latência média por consulta (ms), consultando em lotes de `batch` rostos."""
+    ids = []
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        ids.append(index.search(queries[i:i + batch], k=1)[0])
+    elapsed = time.perf_counter() - start
+    return np.vstack(ids)[:, 0], 1000.0 * elapsed / len(queries)
+
+
+def run(size, queries_count, nprobes, nlist=None, batch=4, seed=0):
+    vectors, _ = synthetic_encodings(size // 5, samples_per_identity=5, seed=seed)
+    queries = synthetic_queries(vectors, queries_count, seed=seed + 1)
+    ids = np.arange(len(vectors))
+
+    flat = FlatIndex()
+    flat.add(vectors, ids)
+    exact_ids, flat_ms = time_queries(flat, queries, batch)
+    results = [{'index': 'flat', 'nprobe': None, 'recall@1': 1.0, 'ms_per_query': flat_ms}]
+
+    start = time.perf_counter()
+    ivf = IVFIndex(nlist=nlist, seed=seed)
+    ivf.add(vectors, ids)
+    build_s = time.perf_counter() - start
+
+    for nprobe in nprobes:
+        ivf.nprobe = nprobe
+        found_ids, ms = time_queries(ivf, queries, batch)
+        results.append({'index': 'ivf', 'nprobe': nprobe,
+                        'recall@1': float(np.mean(found_ids == exact_ids)),
+                        'ms_per_query': ms})
+    return {'size': len(vectors), 'queries': queries_count, 'nlist': len(ivf.lists),
+            'ivf_build_s': build_s, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000, help='codificações na galeria')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--nprobe', default='1,4,8,16,32', help='valores de nprobe separados por vírgula')
+    parser.add_argument('--nlist', type=int, default=None, help='listas do IVF (padrão: raiz de N)')
+    parser.add_argument('--batch', type=int, default=4, help='rostos por consulta (rostos por frame)')
+    parser.add_argument('--json', action='store_true', help='imprime o resultado em JSON')
+    args = parser.parse_args()
+
+    report = run(args.size, args.queries, [int(n) for n in args.nprobe.split(',')],
+                 nlist=args.nlist, batch=args.batch)
+    if args.json:
+        print(json.dumps(report, indent=4))
+        return
+    print(f"Galeria: {report['size']} codificações, {report['nlist']} listas "
+          f"(treino do IVF: {report['ivf_build_s']:.2f} s)")
+    print(f"{'índice':<8}{'nprobe':>8}{'recall@1':>10}{'ms/consulta':>13}")
+    for row in report['results']:
+        nprobe = '-' if row['nprobe'] is None else row['nprobe']
+        print(f"{row['index']:<8}{nprobe:>8}{row['recall@1']:>10.3f}{row['ms_per_query']:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
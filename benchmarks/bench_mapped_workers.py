@@ -0,0 +1,111 @@
+"""Memória de N processos com o modelo por identidade mapeado, montado em cada um ou copiado.
+
+Os N processos montam o comparador como workers do batch_recognize,
+respondem consultas e, com todos vivos ao mesmo tempo, informam a memória
+de /proc/self/smaps_rollup (só no Linux): a anônima (arrays e heap do
+próprio processo; as páginas do arquivo mapeado ficam de fora, divididas no
+cache do sistema) e o PSS (páginas compartilhadas divididas entre quem as
+usa; a soma dos processos é a memória que eles ocupam de fato). Modos:
+
+    mapped   lê o modelo gravado no arquivo compacto (MappedIdentityGallery)
+    rebuild  monta o modelo a partir dos vetores dequantizados do arquivo
+    copy     recebe o modelo já montado pelo processo principal
+
+No modo mapped a memória anônima por processo deve ficar pequena e igual
+para qualquer número de processos; nos outros, cada processo guarda a sua
+cópia do modelo.
+
+Uso: python -m benchmarks.bench_mapped_workers --identities 5000 --samples 20 --workers 1,2,4,8
+"""
+import os
+import json
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+
+from gallery import FaceGallery
+from identities import IdentityGallery
+from gallery_file import MappedGallery, MappedIdentityGallery, write_gallery_file
+from benchmarks.synthetic import synthetic_encodings
+
+MODES = ('mapped', 'rebuild', 'copy')
+
+
+def memory_mb():
+    """Memória anônima e PSS do processo atual, em MiB."""
+    values = {}
+    with open('/proc/self/smaps_rollup') as file:
+        for line in file:
+            key, _, rest = line.partition(':')
+            if key in ('Anonymous', 'Pss'):
+                values[key] = int(rest.split()[0]) / 1024.0
+    return values
+
+
+def _worker(mode, path, model, queries, barrier, results):
+    startup = memory_mb()['Anonymous']
+    if mode == 'mapped':
+        matcher = MappedIdentityGallery(path)
+    elif mode == 'rebuild':
+        matcher = IdentityGallery.from_gallery(MappedGallery(path))
+    else:
+        matcher = model
+    for start in range(0, len(queries), 4):
+        matcher.identify(queries[start:start + 4])
+    # Mede com todos os processos prontos e mantém cada um vivo até todos medirem
+    barrier.wait()
+    memory = memory_mb()
+    results.put({'startup': startup, 'anonymous': memory['Anonymous'], 'pss': memory['Pss']})
+    barrier.wait()
+
+
+def measure(mode, workers, path, model, queries):
+    """Sobe `workers` processos ao mesmo tempo e retorna a memória de cada um com o comparador pronto."""
+    context = multiprocessing.get_context('spawn')  # Como no Windows e no macOS: nada herdado do pai
+    barrier, results = context.Barrier(workers), context.Queue()
+    processes = [context.Process(target=_worker, args=(mode, path, model if mode == 'copy' else None,
+                                                       queries, barrier, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {'workers': workers,
+            'startup_anonymous_mb': round(float(np.mean([r['startup'] for r in reports])), 1),
+            'anonymous_mb_per_worker': round(float(np.mean([r['anonymous'] for r in reports])), 1),
+            'pss_mb_total': round(float(np.sum([r['pss'] for r in reports])), 1)}
+
+
+def run(identities, samples, workers, dtype='int8', queries_count=200, modes=MODES, seed=0):
+    vectors, labels = synthetic_encodings(identities, samples_per_identity=samples, seed=seed)
+    queries, _ = synthetic_encodings(identities, samples_per_identity=1, seed=seed, noise_seed=seed + 1)
+    queries = queries[:queries_count]
+    gallery = FaceGallery.from_encodings(vectors, [f"pessoa{label}" for label in labels])
+    model = IdentityGallery.from_gallery(gallery)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'gallery.fgal')
+        write_gallery_file(path, gallery.matrix, gallery.labels, gallery.names, dtype=dtype, identities=model)
+        report = {'rows': len(gallery), 'identities': len(model), 'templates': len(model.templates),
+                  'file_mb': round(os.path.getsize(path) / 2 ** 20, 1),
+                  'float32_model_mb': round((model.centroids.nbytes + model.templates.nbytes) / 2 ** 20, 1)}
+        for mode in modes:
+            report[mode] = [measure(mode, count, path, model, queries) for count in workers]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--identities', type=int, default=5000)
+    parser.add_argument('--samples', type=int, default=20, help='fotos por pessoa')
+    parser.add_argument('--workers', default='1,2,4,8', help='números de processos separados por vírgula')
+    parser.add_argument('--dtype', choices=('float16', 'int8'), default='int8')
+    parser.add_argument('--modes', default=','.join(MODES))
+    args = parser.parse_args()
+    print(json.dumps(run(args.identities, args.samples, [int(n) for n in args.workers.split(',')],
+                         args.dtype, modes=args.modes.split(',')), indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""Mede todos os estágios do reconhecimento e compara com uma execução de referência.
+
+Estágios: inicialização (imports), load_known_faces (cache frio e quente),
+detecção (todos os detectores de detection.DETECTOR_BACKENDS), codificação
+em lote (`encode_faces`, comparada com `face_recognition.face_encodings`),
+comparação com galerias sintéticas de vários tamanhos, gravação do registro
+de presenças (JSONL e SQLite) e o caminho completo do FaceRecognizer.
+Os frames são sintéticos, montados com as fotos de data/known_faces.
+
+O relatório JSON traz ms por estágio, FPS e o pico de memória (RSS) do
+processo ao fim de cada estágio. Com --baseline, cada métrica é comparada
+com o arquivo salvo e pioras acima de --tolerance são apontadas (código de
+saída 1).
+
+Uso:
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --gallery-sizes 1000,100000
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import resource
+import tempfile
+import subprocess
+import cv2
+import numpy as np
+
+from encoding_cache import KNOWN_FACES_DIR, IMAGE_EXTENSIONS, load_encodings, encode_faces
+from gallery import FaceGallery, name_from_filename
+from identities import IdentityGallery
+from detection import detect_faces, get_backend, FaceDetector
+from recognizer import FaceRecognizer
+from event_log import RecognitionLog, JsonlEventStore
+from attendance_store import AttendanceStore
+from benchmarks.synthetic import synthetic_encodings, synthetic_queries, synthetic_frames
+
+DETECTORS = ('hog', 'cnn', 'mediapipe', 'haar', 'dnn')
+
+
+def peak_rss_mb():
+    # ru_maxrss é o pico do processo inteiro (em KB no Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def timed(function, repeat=1):
+    """Mediana do tempo (ms) de `repeat` execuções e o resultado da última."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        samples.append(1000.0 * (time.perf_counter() - start))
+    return float(np.median(samples)), result
+
+
+def load_images(directory, limit=None):
+    filenames = sorted(f for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTENSIONS))
+    images = [cv2.imread(os.path.join(directory, f)) for f in filenames[:limit]]
+    return [image for image in images if image is not None]
+
+
+def bench_startup(repeat=3):
+    """Tempo para iniciar o interpretador e importar o principal.py (processo novo)."""
+    code = "import time; start = time.perf_counter(); import principal; print(time.perf_counter() - start)"
+    totals, imports = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        totals.append(1000.0 * (time.perf_counter() - start))
+        imports.append(1000.0 * float(output.stdout.strip().splitlines()[-1]))
+    return {'process_ms': float(np.median(totals)), 'import_ms': float(np.median(imports))}
+
+
+def copy_known_faces(directory, destination, limit=None):
+    """Copia as fotos para um diretório temporário (o cache real não é tocado)."""
+    os.makedirs(destination)
+    filenames = sorted(f for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    for filename in filenames:
+        shutil.copy2(os.path.join(directory, filename), destination)
+    return len(filenames)
+
+
+def bench_load_known_faces(faces_dir, cache_file, state):
+    """load_encodings com cache frio (tudo codificado) e quente, e a montagem das galerias."""
+    cold_ms, _ = timed(lambda: load_encodings(faces_dir, cache_file))
+    warm_ms, encodings = timed(lambda: load_encodings(faces_dir, cache_file), repeat=3)
+    gallery_ms, gallery = timed(lambda: FaceGallery.from_encodings(
+        [encoding for _, encoding in encodings], [name_from_filename(f) for f, _ in encodings]), repeat=3)
+    identities_ms, state['identities'] = timed(lambda: IdentityGallery.from_gallery(gallery), repeat=3)
+    return {'images': len(os.listdir(faces_dir)), 'encoded': len(encodings), 'cold_ms': cold_ms,
+            'warm_ms': warm_ms, 'gallery_ms': gallery_ms, 'identities_ms': identities_ms}
+
+
+def make_detector(name, scale):
+    get_backend(name)  # Detector indisponível (ImportError/OSError) é pulado
+    return lambda rgb_frame: detect_faces(rgb_frame, model=name, scale=scale)
+
+
+def bench_detection(frames_by_size, detectors, scale, faces_per_frame):
+    """ms/frame, FPS e fração dos rostos colocados que foram encontrados, por detector e resolução."""
+    report = {}
+    for name in detectors:
+        try:
+            detect = make_detector(name, scale)
+        except (ImportError, OSError) as error:
+            report[name] = {'skipped': str(error)}
+            continue
+        report[name] = {}
+        for size, frames in frames_by_size.items():
+            rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+            detect(rgb_frames[0])  # Aquecimento (carregamento do modelo)
+            start = time.perf_counter()
+            found = sum(len(detect(rgb_frame)) for rgb_frame in rgb_frames)
+            elapsed = time.perf_counter() - start
+            report[name][size] = {'ms': 1000.0 * elapsed / len(frames), 'fps': len(frames) / elapsed,
+                                  'found_fraction': found / (faces_per_frame * len(frames))}
+    return report
+
+
+def bench_encodings(frames, repeat=1):
+    """Codificação com as caixas já conhecidas (ms por frame e por rosto), em lote e rosto a rosto."""
+    import face_recognition
+    rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+    locations = [detect_faces(rgb_frame) for rgb_frame in rgb_frames]
+    faces = sum(len(found) for found in locations)
+    ms, _ = timed(lambda: [encode_faces(rgb, found) for rgb, found in zip(rgb_frames, locations)], repeat)
+    single_ms, _ = timed(lambda: [face_recognition.face_encodings(rgb, found)
+                                  for rgb, found in zip(rgb_frames, locations)], repeat)
+    return {'faces': faces, 'ms_per_frame': ms / len(frames), 'ms_per_face': ms / faces if faces else None,
+            'unbatched_ms_per_frame': single_ms / len(frames)}
+
+
+def bench_matching(gallery_sizes, faces_per_frame, queries=200, samples_per_identity=5):
+    """Comparação de um frame (`faces_per_frame` rostos) contra galerias sintéticas."""
+    report = {}
+    for size in gallery_sizes:
+        vectors, labels = synthetic_encodings(max(size // samples_per_identity, 1), samples_per_identity)
+        names = [f"p{label}" for label in labels]
+        batches = synthetic_queries(vectors, min(queries * faces_per_frame, len(vectors)), seed=1)
+        batches = [batches[i:i + faces_per_frame] for i in range(0, len(batches), faces_per_frame)]
+        build_ms, gallery = timed(lambda: FaceGallery.from_encodings(vectors, names))
+        identities_build_ms, identities = timed(lambda: IdentityGallery.from_gallery(gallery))
+        samples_ms, _ = timed(lambda: [gallery.identify(batch) for batch in batches])
+        identities_ms, _ = timed(lambda: [identities.identify(batch) for batch in batches])
+        report[str(size)] = {'build_ms': build_ms, 'identities_build_ms': identities_build_ms,
+                             'samples_ms': samples_ms / len(batches), 'identities_ms': identities_ms / len(batches)}
+    return report
+
+
+def bench_log(events=5000, people=50):
+    """record() (caminho quente) e close() (gravação do que restou) nos dois armazenamentos."""
+    report = {}
+    base = datetime.datetime(2024, 1, 1, 8, 0, 0)
+    names = [f"pessoa{i}" for i in range(people)]
+    with tempfile.TemporaryDirectory() as workdir:
+        stores = {'jsonl': lambda: JsonlEventStore(os.path.join(workdir, 'log.jsonl'), legacy_file=None),
+                  'sqlite': lambda: AttendanceStore(os.path.join(workdir, 'attendance.db'))}
+        for name, create_store in stores.items():
+            log = RecognitionLog(create_store())
+            # Cada pessoa reaparece a cada 61 s: todos os eventos passam pela deduplicação
+            start = time.perf_counter()
+            for i in range(events):
+                log.record(names[i % people], base + datetime.timedelta(seconds=61 * (i // people)))
+            record_seconds = time.perf_counter() - start
+            close_ms, _ = timed(log.close)
+            report[name] = {'record_us': 1e6 * record_seconds / events, 'close_ms': close_ms,
+                            'events_per_s': events / (record_seconds + close_ms / 1000.0)}
+    return report
+
+
+def bench_end_to_end(frames, matcher, scale):
+    """FaceRecognizer.detect_and_identify (detecção HOG reduzida + codificação + comparação)."""
+    recognizer = FaceRecognizer(matcher, detector=FaceDetector(scale=scale))
+    recognizer.detect_and_identify(frames[0])
+    start = time.perf_counter()
+    for frame in frames:
+        recognizer.detect_and_identify(frame)
+    elapsed = time.perf_counter() - start
+    return {'ms': 1000.0 * elapsed / len(frames), 'fps': len(frames) / elapsed}
+
+
+def run(args):
+    report = {'config': {key: value for key, value in vars(args).items() if key not in ('baseline', 'save_baseline',
+                                                                                          'output')},
+              'stages': {}, 'peak_rss_mb': {}}
+    stages = report['stages']
+
+    def stage(name, function):
+        print(f"[benchmark] {name}...", file=sys.stderr)
+        stages[name] = function()
+        report['peak_rss_mb'][name] = peak_rss_mb()
+
+    images = load_images(args.dir, args.max_images)
+    if not images:
+        raise SystemExit(f"Nenhuma imagem encontrada em {args.dir}.")
+    frames_by_size = {
+        size: synthetic_frames(images, tuple(int(v) for v in size.split('x')), args.faces, args.frames, seed=0)
+        for size in args.resolutions.split(',')}
+    first_size = next(iter(frames_by_size))
+
+    state = {}
+    if not args.skip_startup:
+        stage('startup', bench_startup)
+    with tempfile.TemporaryDirectory() as workdir:
+        faces_dir = os.path.join(workdir, 'known_faces')
+        copy_known_faces(args.dir, faces_dir, args.max_images)
+        stage('load_known_faces', lambda: bench_load_known_faces(faces_dir, os.path.join(workdir, 'cache.npz'),
+                                                                 state))
+    stage('detection', lambda: bench_detection(frames_by_size, args.detectors.split(','), args.scale, args.faces))
+    stage('encodings', lambda: bench_encodings(frames_by_size[first_size]))
+    stage('matching', lambda: bench_matching([int(s) for s in args.gallery_sizes.split(',')], args.faces))
+    stage('log', lambda: bench_log(args.log_events))
+    stage('end_to_end', lambda: bench_end_to_end(frames_by_size[first_size], state['identities'], args.scale))
+    return report
+
+
+def flatten(report, prefix=''):
+    values = {}
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, path + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+
+def higher_is_better(metric):
+    leaf = metric.rsplit('.', 1)[-1]
+    return leaf in ('fps', 'events_per_s', 'found_fraction')
+
+
+def is_compared(metric):
+    leaf = metric.rsplit('.', 1)[-1]
+    return leaf.endswith(('_ms', '_us')) or leaf in ('ms', 'fps', 'events_per_s', 'found_fraction') \
+        or metric.startswith('peak_rss_mb.')
+
+
+def compare(report, baseline, tolerance):
+    """Lista de (métrica, referência, atual, variação) das métricas que pioraram além da tolerância."""
+    current, reference = flatten(report), flatten(baseline)
+    regressions = []
+    for metric, old in sorted(reference.items()):
+        new = current.get(metric)
+        if new is None or not is_compared(metric) or not old:
+            continue
+        change = (new - old) / abs(old)
+        worse = -change if higher_is_better(metric) else change
+        if worse > tolerance:
+            regressions.append((metric, old, new, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', default=KNOWN_FACES_DIR)
+    parser.add_argument('--max-images', type=int, default=None, help='limita as fotos usadas de --dir')
+    parser.add_argument('--resolutions', default='640x480,1280x720')
+    parser.add_argument('--faces', type=int, default=2, help='rostos por frame sintético')
+    parser.add_argument('--frames', type=int, default=10, help='frames sintéticos por resolução')
+    parser.add_argument('--scale', type=float, default=0.5, help='escala da detecção HOG/CNN')
+    parser.add_argument('--detectors', default=','.join(DETECTORS))
+    parser.add_argument('--gallery-sizes', default='100,1000,10000')
+    parser.add_argument('--log-events', type=int, default=5000)
+    parser.add_argument('--skip-startup', action='store_true')
+    parser.add_argument('--output', help='grava o relatório JSON neste arquivo')
+    parser.add_argument('--baseline', help='relatório de referência para comparar')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='piora relativa tolerada (0.15 = 15%%)')
+    parser.add_argument('--save-baseline', help='grava o relatório como nova referência')
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=4)
+    print(text)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as file:
+                file.write(text)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.tolerance)
+        for metric, old, new, change in regressions:
+            print(f"PIORA {metric}: {old:.3f} -> {new:.3f} ({100 * change:+.1f}%)", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"Sem pioras acima de {100 * args.tolerance:.0f}% em relação a {args.baseline}.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import numpy as np
+
+
+def synthetic_encodings(identities, samples_per_identity=5, dim=128, spread=0.03, seed=0, noise_seed=None):
+    """Gera codificações 128-d sintéticas agrupadas por identidade.
+
+    Os centros têm norma próxima de 1, como as codificações do dlib, e as
+    amostras de uma mesma pessoa ficam a ~0.35 do centro. Com o mesmo
+    `seed` e outro `noise_seed` obtêm-se novas fotos das mesmas pessoas.
+    Retorna (vetores float32, rótulos).
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0.0, 1.0 / np.sqrt(dim), size=(identities, dim)).astype(np.float32)
+    labels = np.repeat(np.arange(identities), samples_per_identity)
+    if noise_seed is not None:
+        rng = np.random.default_rng(noise_seed)
+    noise = rng.normal(0.0, spread, size=(len(labels), dim)).astype(np.float32)
+    return centers[labels] + noise, labels
+
+
+def synthetic_queries(vectors, count, spread=0.03, seed=1):
+    """Consultas próximas de amostras existentes (novas fotos das mesmas pessoas)."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), count, replace=False)
+    noise = rng.normal(0.0, spread, size=(count, vectors.shape[1])).astype(np.float32)
+    return vectors[rows] + noise
+
+
+def synthetic_frames(images, frame_size=(1280, 720), faces_per_frame=1, count=10, face_fraction=0.5, seed=0):
+    """Frames BGR com `faces_per_frame` imagens reais lado a lado sobre ruído de fundo.
+
+    `images` são fotos (BGR) de um rosto, como as de data/known_faces; cada
+    uma ocupa uma coluna do frame, reduzida para `face_fraction` da altura.
+    """
+    import cv2
+    rng = np.random.default_rng(seed)
+    width, height = frame_size
+    cell_width = width // faces_per_frame
+    frames = []
+    for _ in range(count):
+        frame = rng.integers(0, 64, size=(height, width, 3), dtype=np.uint8)
+        for cell in range(faces_per_frame):
+            image = images[int(rng.integers(len(images)))]
+            factor = min(face_fraction * height / image.shape[0], 0.9 * cell_width / image.shape[1])
+            face = cv2.resize(image, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+            top = int(rng.integers(0, height - face.shape[0] + 1))
+            left = cell * cell_width + int(rng.integers(0, cell_width - face.shape[1] + 1))
+            frame[top:top + face.shape[0], left:left + face.shape[1]] = face
+        frames.append(frame)
+    return frames
@@ -0,0 +1,265 @@
+"""Cadastro em lote de pessoas a partir de pastas de fotos ou de vídeos.
+
+Estrutura aceita (o nome da pasta ou do vídeo é o nome da pessoa):
+    cadastro/ana/*.jpg      várias fotos da mesma pessoa
+    cadastro/bruno.mp4      um vídeo por pessoa
+
+Os recortes são codificados em paralelo; amostras quase idênticas entre si
+ou às já cadastradas são descartadas com uma única matriz de distâncias por
+pessoa, e as codificações entram direto no cache compartilhado
+(data/encodings_cache.npz), sem recodificar a galeria.
+
+Uso: python bulk_enroll.py cadastro/ --workers 8
+"""
+import io
+import os
+import sys
+import tempfile
+import argparse
+import multiprocessing
+import cv2
+import numpy as np
+import face_recognition
+
+from gallery import FaceGallery, UNKNOWN_NAME, name_from_filename
+from face_index import INDEX_FILE, squared_distances
+from detection import detect_faces, expand_location
+from encoding_cache import KNOWN_FACES_DIR, CACHE_FILE, IMAGE_EXTENSIONS, EncodingCache, encode_image_file
+from batch_recognize import VIDEO_EXTENSIONS
+from face_quality import enrollment_gate
+
+DETECTION_SCALE = 0.5
+CROP_MARGIN = 0.4  # Margem em volta do rosto: o recorte salvo precisa ser detectável de novo
+CROP_SIZE = 300  # Maior lado do recorte salvo, em pixels
+DUPLICATE_DISTANCE = 0.15  # Amostras mais próximas que isso de outra da mesma pessoa são descartadas
+CONFLICT_DISTANCE = 0.5  # Mesma tolerância de add_faces.is_face_registered
+
+# Fotos pequenas, borradas ou de perfil não viram amostras (nem chegam a ser codificadas)
+_quality = enrollment_gate()
+
+
+def person_name(name):
+    # "_" separa o nome do número da foto em name_from_filename
+    return name.strip().replace('_', '-')
+
+
+def collect_sources(root):
+    """Lista de (pessoa, tipo, caminhos) a partir da estrutura do diretório."""
+    sources = []
+    for entry in sorted(os.listdir(root)):
+        path = os.path.join(root, entry)
+        stem, extension = os.path.splitext(entry)
+        if os.path.isdir(path):
+            images = sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(IMAGE_EXTENSIONS))
+            if images:
+                sources.append((person_name(entry), 'images', images))
+        elif extension.lower() in VIDEO_EXTENSIONS:
+            sources.append((person_name(stem), 'video', [path]))
+    return sources
+
+
+def face_sample(rgb_image):
+    """Recorta o maior rosto da imagem e o codifica como o cache codificaria o arquivo salvo.
+
+    Retorna (bytes JPEG, codificação) ou None, também quando o rosto não
+    passa no portão de qualidade do cadastro. A codificação vem do JPEG já
+    comprimido, pelo mesmo caminho de `encode_image_file`, para que a entrada
+    gravada no cache seja idêntica à que o cache calcularia.
+    """
+    locations = detect_faces(rgb_image, scale=DETECTION_SCALE)
+    if not locations:
+        return None
+    location = max(locations, key=lambda l: (l[2] - l[0]) * (l[1] - l[3]))
+    reason, _ = _quality.check(rgb_image, location)  # A codificação vem do JPEG recortado, não deste frame
+    if reason is not None:
+        return None
+    top, right, bottom, left = expand_location(location, CROP_MARGIN, rgb_image.shape)
+    crop = cv2.cvtColor(rgb_image[top:bottom, left:right], cv2.COLOR_RGB2BGR)
+    factor = CROP_SIZE / max(crop.shape[:2])
+    if factor < 1:
+        crop = cv2.resize(crop, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    ok, jpeg = cv2.imencode('.jpg', crop)
+    if not ok:
+        return None
+    data = jpeg.tobytes()
+    encoding = encode_image_file(io.BytesIO(data))
+    if encoding is None:
+        return None
+    return data, encoding
+
+
+def _encode_images(task):
+    name, paths = task
+    samples = []
+    for path in paths:
+        try:
+            sample = face_sample(face_recognition.load_image_file(path))
+        except OSError as error:
+            print(f"Não foi possível ler {path} ({error}).", file=sys.stderr)
+            continue
+        if sample is not None:
+            samples.append(sample)
+    return name, len(paths), samples
+
+
+def _encode_video(task):
+    name, path, frame_step, max_frames = task
+    video = cv2.VideoCapture(path)
+    samples, read = [], 0
+    frame_index = 0
+    while read < max_frames:
+        # grab() avança sem decodificar os quadros pulados
+        if frame_index % frame_step:
+            if not video.grab():
+                break
+            frame_index += 1
+            continue
+        ret, frame = video.read()
+        if not ret:
+            break
+        frame_index += 1
+        read += 1
+        sample = face_sample(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if sample is not None:
+            samples.append(sample)
+    video.release()
+    return name, read, samples
+
+
+def build_tasks(sources, images_per_task=8, frame_step=10, max_frames=60):
+    tasks = []
+    for name, kind, paths in sources:
+        if kind == 'video':
+            tasks.append((_encode_video, (name, paths[0], frame_step, max_frames)))
+        else:
+            for first in range(0, len(paths), images_per_task):
+                tasks.append((_encode_images, (name, paths[first:first + images_per_task])))
+    return tasks
+
+
+def _run_task(task):
+    function, argument = task
+    return function(argument)
+
+
+def select_new_samples(candidates, existing, max_samples, duplicate_distance=DUPLICATE_DISTANCE):
+    """Índices das candidatas mantidas, descartando quase-duplicatas.
+
+    Uma única matriz de distâncias (candidatas x [existentes + candidatas]);
+    a seleção gulosa percorre as linhas mantendo uma máscara das já aceitas.
+    """
+    candidates = np.asarray(candidates, dtype=np.float32)
+    existing = np.asarray(existing, dtype=np.float32).reshape(-1, candidates.shape[1])
+    near = squared_distances(candidates, np.vstack([existing, candidates])) < duplicate_distance ** 2
+    near_existing, near_candidates = near[:, :len(existing)].any(axis=1), near[:, len(existing):]
+    accepted = np.zeros(len(candidates), dtype=bool)
+    for i in np.flatnonzero(~near_existing):
+        if accepted.sum() >= max_samples:
+            break
+        if not (near_candidates[i] & accepted).any():
+            accepted[i] = True
+    return np.flatnonzero(accepted)
+
+
+def next_photo_number(filenames, name):
+    numbers = [int(stem.rsplit('_', 1)[1]) for stem in (os.path.splitext(f)[0] for f in filenames)
+               if name_from_filename(stem) == name and '_' in stem and stem.rsplit('_', 1)[1].isdigit()]
+    return max(numbers, default=-1) + 1
+
+
+def enroll(root, directory=KNOWN_FACES_DIR, cache_file=CACHE_FILE, workers=None, max_samples=10,
+           frame_step=10, duplicate_distance=DUPLICATE_DISTANCE, allow_conflicts=False):
+    """Cadastra as pessoas de `root` e retorna {pessoa: fotos salvas}."""
+    sources = collect_sources(root)
+    if not sources:
+        print(f"Nenhuma pasta de fotos ou vídeo encontrado em {root}.")
+        return {}
+    os.makedirs(directory, exist_ok=True)
+
+    cache = EncodingCache(directory, cache_file)
+    cache.load()
+    cache.refresh()
+    gallery = FaceGallery.from_encodings(
+        [encoding for _, encoding in cache.encodings()],
+        [name_from_filename(filename) for filename, _ in cache.encodings()])
+
+    # Agrupa as amostras por pessoa (as tarefas de uma pessoa podem estar em processos diferentes)
+    samples, inputs = {}, {}
+    tasks = build_tasks(sources, frame_step=frame_step, max_frames=max_samples * 6)
+    with multiprocessing.Pool(workers) as pool:
+        for name, count, found in pool.imap(_run_task, tasks):
+            samples.setdefault(name, []).extend(found)
+            inputs[name] = inputs.get(name, 0) + count
+
+    saved = {}
+    filenames = list(cache.entries)
+    for name in dict.fromkeys(name for name, _, _ in sources):
+        found = samples.get(name, [])
+        if not found:
+            print(f"{name}: nenhum rosto com qualidade suficiente em {inputs.get(name, 0)} fotos/quadros.")
+            saved[name] = 0
+            continue
+        encodings = np.array([encoding for _, encoding in found])
+
+        # Amostras que já pertencem a outra pessoa da galeria (como em add_faces)
+        if len(gallery) and not allow_conflicts:
+            keep = np.array([other in (name, UNKNOWN_NAME)
+                             for other, _ in gallery.identify(encodings, CONFLICT_DISTANCE)])
+            if not keep.all():
+                print(f"{name}: {int((~keep).sum())} amostras parecidas com outra pessoa cadastrada foram ignoradas.")
+            found = [sample for sample, kept in zip(found, keep) if kept]
+            encodings = encodings[keep]
+            if not found:
+                saved[name] = 0
+                continue
+
+        existing = gallery.matrix[gallery.labels == gallery.label_for(name)] if name in gallery.names else []
+        selected = select_new_samples(encodings, existing, max_samples, duplicate_distance)
+        number = next_photo_number(filenames, name)
+        for offset, i in enumerate(selected):
+            data, encoding = found[i]
+            filename = f"{name}_{number + offset}.jpg"
+            path = os.path.join(directory, filename)
+            # Temporário com nome único (fora de IMAGE_EXTENSIONS): cadastros em paralelo não se atropelam
+            fd, tmp_file = tempfile.mkstemp(prefix=filename + '.', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'wb') as file:
+                    file.write(data)
+                os.chmod(tmp_file, 0o644)  # Como as fotos gravadas pelo cv2.imwrite
+                os.replace(tmp_file, path)
+            except BaseException:
+                os.remove(tmp_file)
+                raise
+            cache.put(filename, encoding)
+            filenames.append(filename)
+        gallery.add(encodings[selected], [name] * len(selected))
+        saved[name] = len(selected)
+        print(f"{name}: {len(selected)} fotos salvas "
+              f"({len(found) - len(selected)} repetidas descartadas, {inputs.get(name, 0)} fotos/quadros lidos).")
+
+    if cache.dirty:
+        cache.save()
+    # Mantém o índice salvo da galeria em dia (só insere as novas linhas)
+    if os.path.exists(INDEX_FILE) and any(saved.values()):
+        FaceGallery.from_directory(directory).attach_index(INDEX_FILE)
+    return saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('root', help='diretório com uma pasta de fotos ou um vídeo por pessoa')
+    parser.add_argument('--workers', type=int, default=None, help='processos (padrão: núcleos da CPU)')
+    parser.add_argument('--max-samples', type=int, default=10, help='fotos novas por pessoa, no máximo')
+    parser.add_argument('--frame-step', type=int, default=10, help='nos vídeos, analisa um a cada N quadros')
+    parser.add_argument('--duplicate-distance', type=float, default=DUPLICATE_DISTANCE)
+    parser.add_argument('--allow-conflicts', action='store_true',
+                        help='aceita amostras parecidas com outra pessoa já cadastrada')
+    args = parser.parse_args()
+
+    saved = enroll(args.root, workers=args.workers, max_samples=args.max_samples, frame_step=args.frame_step,
+                   duplicate_distance=args.duplicate_distance, allow_conflicts=args.allow_conflicts)
+    print(f"Cadastro concluído: {sum(saved.values())} fotos de {len(saved)} pessoas.")
+
+
+if __name__ == "__main__":
+    main()
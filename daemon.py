@@ -0,0 +1,317 @@
+"""Daemon de reconhecimento residente, com API HTTP local e recarga da galeria sem reinício.
+
+Os modelos (dlib, detector) e a galeria são carregados uma única vez; cada
+requisição paga só a inferência. Uma thread acompanha data/known_faces e,
+quando fotos são adicionadas, alteradas ou removidas, só elas passam pelo
+cache de codificações; o comparador novo substitui o antigo de uma vez,
+sem interromper as requisições em andamento.
+
+Endpoints (127.0.0.1 ou socket Unix):
+    POST /recognize  frames em lote: array .npy (N x H x W x 3, BGR) ou
+                     JSON {"images": [JPEG/PNG em base64, ...]}; ?threshold=0.5
+    POST /reload     relê o diretório imediatamente
+    GET  /status     tamanho da galeria, versão e contadores
+    GET  /metrics    tempos por estágio no formato do Prometheus
+
+Uso: python daemon.py [--port 9110 | --unix data/daemon.sock] (cliente: daemon_client.py)
+"""
+import os
+import io
+import json
+import time
+import queue
+import base64
+import socket
+import argparse
+import binascii
+import threading
+import socketserver
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+import numpy as np
+
+from principal import (MATCH_MODE, IDENTITY_MAX_TEMPLATES, IDENTITY_SHORTLIST, DETECTOR_BACKEND, DETECTOR_RECALL,
+                       DETECTION_SCALE, create_quality_gate)
+from encoding_cache import KNOWN_FACES_DIR, CACHE_FILE, IMAGE_EXTENSIONS, EncodingCache
+from gallery import FaceGallery, name_from_filename
+from identities import IdentityGallery
+from detection import FaceDetector
+from detector_select import resolve_backend
+from recognizer import FaceRecognizer
+from metrics import Metrics
+from daemon_client import DAEMON_HOST, DAEMON_PORT
+
+WATCH_INTERVAL = 1.0  # Segundos entre as verificações de data/known_faces
+MAX_REQUEST_BYTES = 256 << 20
+
+
+def directory_state(directory):
+    """(nome, tamanho, mtime) de cada foto; muda também quando um arquivo é sobrescrito."""
+    try:
+        entries = os.scandir(directory)
+    except OSError:
+        return ()
+    with entries:
+        return tuple(sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns) for entry in entries
+                            if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file()))
+
+
+def build_matcher(encodings, match_mode=MATCH_MODE):
+    """Comparador (como em principal.load_known_faces) a partir de [(arquivo, codificação)]."""
+    encodings = [(filename, encoding) for filename, encoding in encodings if filename.endswith('.jpg')]
+    gallery = FaceGallery.from_encodings([encoding for _, encoding in encodings],
+                                         [name_from_filename(filename) for filename, _ in encodings],
+                                         [filename for filename, _ in encodings])
+    if match_mode == 'identities':
+        return IdentityGallery.from_gallery(gallery, max_templates=IDENTITY_MAX_TEMPLATES,
+                                            shortlist=IDENTITY_SHORTLIST)
+    return gallery
+
+
+class GalleryWatcher(threading.Thread):
+    """Mantém o cache de codificações em memória e republica o comparador quando as fotos mudam.
+
+    Uma mudança só é aplicada depois de ficar estável por uma verificação
+    inteira, para não codificar uma foto ainda sendo gravada.
+    """
+
+    def __init__(self, directory=KNOWN_FACES_DIR, cache_file=CACHE_FILE, interval=WATCH_INTERVAL,
+                 match_mode=MATCH_MODE):
+        super().__init__(name='gallery-watcher', daemon=True)
+        self.directory = directory
+        self.interval = interval
+        self.match_mode = match_mode
+        self.cache = EncodingCache(directory, cache_file)
+        self.cache.load()
+        self.matcher = None
+        self.version = 0
+        self.last_stats = {}
+        self._state = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """Aplica as fotos novas, alteradas e removidas; retorna as estatísticas do cache."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            self._state = directory_state(self.directory)
+            stats = self.cache.refresh()
+            if self.cache.dirty:
+                self.cache.save()
+            # Troca atômica: requisições em andamento terminam com o comparador anterior
+            self.matcher = build_matcher(self.cache.encodings(), self.match_mode)
+            self.version += 1
+            self.last_stats = stats
+        if self.version > 1:
+            print(f"Galeria atualizada (versão {self.version}): {stats['encoded']} fotos codificadas, "
+                  f"{stats['removed']} removidas, {len(self.matcher.names)} pessoas.")
+        return stats
+
+    def run(self):
+        pending = None
+        while not self._stop_event.wait(self.interval):
+            state = directory_state(self.directory)
+            if state == self._state:
+                pending = None
+            elif state == pending:
+                try:
+                    self.reload()
+                except Exception as error:  # Uma foto problemática não pode derrubar o daemon
+                    print(f"Falha ao atualizar a galeria: {error}")
+                pending = None
+            else:
+                pending = state
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class RecognitionDaemon:
+    """Galeria e modelos residentes; `recognize` atende um lote de frames BGR."""
+
+    def __init__(self, directory=KNOWN_FACES_DIR, workers=2, threshold=0.5, metrics=None):
+        self.threshold = threshold
+        self.metrics = metrics or Metrics()
+        self.watcher = GalleryWatcher(directory)
+        backend = resolve_backend(DETECTOR_BACKEND, DETECTION_SCALE, recall_target=DETECTOR_RECALL)
+        # Um reconhecedor por worker; a fila também limita quantos lotes rodam ao mesmo tempo
+        self._recognizers = queue.Queue()
+        for _ in range(workers):
+            detector = FaceDetector(backend, scale=DETECTION_SCALE)
+            self._recognizers.put(FaceRecognizer(None, threshold, detector=detector, metrics=self.metrics,
+                                                 quality=create_quality_gate()))
+        self._warm_up()
+        self.started_at = time.time()
+        self.counters = {'requests': 0, 'frames': 0, 'faces': 0}
+        self._counters_lock = threading.Lock()
+
+    def _warm_up(self):
+        # A primeira inferência carrega o restante dos modelos (ex.: MediaPipe, CNN) antes do primeiro cliente
+        self.recognize([np.zeros((120, 160, 3), dtype=np.uint8)], count=False)
+
+    def recognize(self, frames, threshold=None, count=True):
+        """Lista, por frame, de {'location', 'name', 'distance'}."""
+        recognizer = self._recognizers.get()
+        try:
+            recognizer.matcher = self.watcher.matcher
+            recognizer.threshold = self.threshold if threshold is None else threshold
+            results = []
+            for frame in frames:
+                locations, matches = recognizer.detect_and_identify(frame)
+                results.append([{'location': [int(value) for value in location], 'name': name,
+                                 'distance': None if distance is None else float(distance)}
+                                for location, (name, distance) in zip(locations, matches)])
+        finally:
+            self._recognizers.put(recognizer)
+        if count:
+            with self._counters_lock:
+                self.counters['requests'] += 1
+                self.counters['frames'] += len(frames)
+                self.counters['faces'] += sum(len(faces) for faces in results)
+        return results
+
+    def status(self):
+        matcher = self.watcher.matcher
+        summary = self.metrics.summary()
+        with self._counters_lock:
+            counters = {**summary['counters'], **self.counters}  # Inclui 'encodes_skipped' (portão de qualidade)
+        return {'gallery_version': self.watcher.version, 'people': len(matcher.names),
+                'last_reload': self.watcher.last_stats, 'uptime_seconds': round(time.time() - self.started_at, 1),
+                'counters': counters, 'stages': summary['stages']}
+
+    def start(self):
+        self.watcher.start()
+        return self
+
+    def close(self):
+        self.watcher.stop()
+
+
+def decode_frames(body, content_type):
+    """Frames BGR de um corpo .npy (N x H x W x 3 ou H x W x 3) ou JSON com imagens em base64."""
+    if content_type == 'application/x-npy':
+        array = np.load(io.BytesIO(body), allow_pickle=False)
+        if array.dtype != np.uint8 or array.ndim not in (3, 4) or array.shape[-1] != 3:
+            raise ValueError("esperado um array uint8 N x H x W x 3")
+        return list(array) if array.ndim == 4 else [array]
+    images = json.loads(body).get('images', [])
+    frames = []
+    for data in images:
+        buffer = np.frombuffer(base64.b64decode(data), dtype=np.uint8)
+        # imdecode levanta cv2.error (e não devolve None) com um buffer vazio
+        frame = cv2.imdecode(buffer, cv2.IMREAD_COLOR) if buffer.size else None
+        if frame is None:
+            raise ValueError("imagem ilegível")
+        frames.append(frame)
+    return frames
+
+
+def make_handler(daemon):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Conexões persistentes: sem um handshake por requisição
+
+        def _send(self, status, payload, content_type='application/json'):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == '/status':
+                self._send(200, daemon.status())
+            elif path == '/metrics':
+                self._send(200, daemon.metrics.prometheus_text().encode(),
+                           'text/plain; version=0.0.4; charset=utf-8')
+            else:
+                self._send(404, {'error': 'não encontrado'})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > MAX_REQUEST_BYTES:
+                self.close_connection = True
+                self._send(413, {'error': 'requisição grande demais'})
+                return
+            body = self.rfile.read(length)
+            if url.path == '/reload':
+                try:
+                    self._send(200, daemon.watcher.reload())
+                except Exception as error:  # Como no /recognize: o erro vai para o cliente
+                    self._send(500, {'error': f'falha ao recarregar a galeria: {error}'})
+                return
+            if url.path != '/recognize':
+                self._send(404, {'error': 'não encontrado'})
+                return
+            try:
+                frames = decode_frames(body, self.headers.get('Content-Type', '').split(';')[0].strip())
+                threshold = parse_qs(url.query).get('threshold')
+                threshold = float(threshold[0]) if threshold else None
+            except (ValueError, TypeError, binascii.Error, AttributeError, cv2.error) as error:
+                self._send(400, {'error': f'requisição inválida: {error}'})
+                return
+            start = time.perf_counter()
+            try:
+                results = daemon.recognize(frames, threshold)
+            except Exception as error:  # O erro vai para o cliente; o daemon continua de pé
+                self._send(500, {'error': f'falha no reconhecimento: {error}'})
+                return
+            self._send(200, {'results': results, 'ms': 1000.0 * (time.perf_counter() - start)})
+
+        def log_message(self, *args):
+            pass  # Sem uma linha no terminal por requisição
+
+    return Handler
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        # HTTPServer.server_bind espera (host, porta)
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = 'localhost', 0
+
+
+def create_server(daemon, host=DAEMON_HOST, port=DAEMON_PORT, unix_socket=None):
+    handler = make_handler(daemon)
+    # Cabeçalho e corpo da resposta saem em escritas separadas: sem isso, o Nagle somado ao
+    # ACK atrasado do cliente acrescenta ~40 ms a cada requisição na mesma conexão
+    handler.disable_nagle_algorithm = not unix_socket
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)  # Socket de uma execução anterior
+        return UnixHTTPServer(unix_socket, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=DAEMON_PORT)
+    parser.add_argument('--unix', help='socket Unix em vez da porta TCP local')
+    parser.add_argument('--workers', type=int, default=2, help='lotes reconhecidos ao mesmo tempo')
+    parser.add_argument('--threshold', type=float, default=0.5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    daemon = RecognitionDaemon(workers=args.workers, threshold=args.threshold).start()
+    server = create_server(daemon, port=args.port, unix_socket=args.unix)
+    print(f"Daemon pronto em {time.perf_counter() - start:.1f} s: {len(daemon.watcher.matcher.names)} pessoas, "
+          f"{args.unix or f'http://{DAEMON_HOST}:{args.port}'}.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.close()
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+
+if __name__ == "__main__":
+    main()
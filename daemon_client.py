@@ -0,0 +1,132 @@
+"""Cliente leve do daemon de reconhecimento (daemon.py).
+
+Não importa dlib, face_recognition nem a galeria: o custo de cada chamada
+é só o envio dos frames e a inferência no daemon, que já está aquecido.
+
+Uso: python daemon_client.py foto1.jpg foto2.jpg [--unix data/daemon.sock]
+"""
+import io
+import json
+import base64
+import socket
+import argparse
+import http.client
+from collections import namedtuple
+import cv2
+import numpy as np
+
+DAEMON_HOST = '127.0.0.1'
+DAEMON_PORT = 9110
+
+# Um rosto devolvido pelo daemon: caixa (top, right, bottom, left), nome e distância
+DaemonFace = namedtuple('DaemonFace', ['location', 'name', 'distance'])
+
+
+class DaemonError(RuntimeError):
+    pass
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class DaemonClient:
+    """Conexão persistente (keep-alive) com o daemon, por TCP local ou socket Unix."""
+
+    def __init__(self, host=DAEMON_HOST, port=DAEMON_PORT, unix_socket=None, timeout=30.0):
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.timeout = timeout
+        self._connection = None
+
+    def _connect(self):
+        if self.unix_socket:
+            return _UnixConnection(self.unix_socket, self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _request(self, method, path, body=None, content_type='application/json'):
+        headers = {'Content-Type': content_type} if body is not None else {}
+        # Uma nova tentativa se a conexão guardada tiver sido fechada pelo daemon
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = self._connect()
+            try:
+                self._connection.request(method, path, body=body, headers=headers)
+                response = self._connection.getresponse()
+                payload = response.read()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                self.close()
+                if attempt:
+                    raise
+        result = json.loads(payload) if payload else {}
+        if response.status != 200:
+            raise DaemonError(result.get('error', f"HTTP {response.status}"))
+        return result
+
+    def recognize(self, frames, threshold=None):
+        """Reconhece uma lista de frames BGR; retorna, para cada frame, a lista de DaemonFace.
+
+        Frames do mesmo tamanho vão como um único array .npy (sem
+        compressão nem decodificação); tamanhos diferentes, como JPEG em base64.
+        """
+        frames = list(frames)
+        if not frames:
+            return []
+        query = f'?threshold={threshold}' if threshold is not None else ''
+        if all(frame.shape == frames[0].shape for frame in frames):
+            buffer = io.BytesIO()
+            np.save(buffer, np.ascontiguousarray(np.stack(frames)), allow_pickle=False)
+            result = self._request('POST', '/recognize' + query, buffer.getvalue(), 'application/x-npy')
+        else:
+            images = [base64.b64encode(cv2.imencode('.jpg', frame)[1]).decode('ascii') for frame in frames]
+            result = self._request('POST', '/recognize' + query, json.dumps({'images': images}).encode())
+        return [[DaemonFace(tuple(face['location']), face['name'], face['distance']) for face in faces]
+                for faces in result['results']]
+
+    def status(self):
+        return self._request('GET', '/status')
+
+    def reload(self):
+        """Força a releitura de data/known_faces (normalmente automática)."""
+        return self._request('POST', '/reload', b'')
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('images', nargs='*', help='imagens a reconhecer (sem imagens: mostra o estado)')
+    parser.add_argument('--port', type=int, default=DAEMON_PORT)
+    parser.add_argument('--unix', help='socket Unix do daemon')
+    parser.add_argument('--threshold', type=float)
+    args = parser.parse_args()
+
+    client = DaemonClient(port=args.port, unix_socket=args.unix)
+    try:
+        if not args.images:
+            print(json.dumps(client.status(), indent=2, ensure_ascii=False))
+            return
+        frames = [cv2.imread(path) for path in args.images]
+        for path, frame in zip(args.images, frames):
+            if frame is None:
+                raise SystemExit(f"Não foi possível ler {path}.")
+        for path, faces in zip(args.images, client.recognize(frames, args.threshold)):
+            print(json.dumps({'image': path, 'faces': [face._asdict() for face in faces]}, ensure_ascii=False))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
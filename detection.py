@@ -0,0 +1,238 @@
+import os
+import threading
+import cv2
+import face_recognition
+from tracking import iou
+
+# Modelo do detector 'dnn' (SSD ResNet-10 do OpenCV), não incluído no repositório
+DNN_PROTOTXT = 'models/deploy.prototxt'
+DNN_WEIGHTS = 'models/res10_300x300_ssd_iter_140000.caffemodel'
+
+
+def scale_location(location, factor, shape):
+    """Converte uma caixa (top, right, bottom, left) de escala e limita ao frame."""
+    height, width = shape[:2]
+    top, right, bottom, left = (int(round(value * factor)) for value in location)
+    return max(top, 0), min(right, width), min(bottom, height), max(left, 0)
+
+
+def expand_location(location, margin, shape):
+    """Aumenta a caixa em `margin` (fração do tamanho) para cada lado, dentro do frame."""
+    height, width = shape[:2]
+    top, right, bottom, left = location
+    dy, dx = int((bottom - top) * margin), int((right - left) * margin)
+    return max(top - dy, 0), min(right + dx, width), min(bottom + dy, height), max(left - dx, 0)
+
+
+class DlibBackend:
+    """HOG ou CNN do dlib, via face_recognition."""
+
+    def __init__(self, model='hog', upsample=1):
+        self.model = model
+        self.upsample = upsample
+
+    def detect(self, rgb_frame):
+        return face_recognition.face_locations(rgb_frame, number_of_times_to_upsample=self.upsample,
+                                               model=self.model)
+
+
+class MediaPipeBackend:
+    """Detector de rostos do MediaPipe (o do teste2.py); o modelo é carregado no primeiro uso."""
+
+    def __init__(self, model_selection=1, min_confidence=0.5):
+        self.model_selection = model_selection
+        self.min_confidence = min_confidence
+        self._detection = None
+        self._lock = threading.Lock()  # O grafo do MediaPipe não aceita chamadas concorrentes
+
+    def detect(self, rgb_frame):
+        with self._lock:
+            if self._detection is None:
+                import mediapipe as mp
+                self._detection = mp.solutions.face_detection.FaceDetection(
+                    model_selection=self.model_selection, min_detection_confidence=self.min_confidence)
+            results = self._detection.process(rgb_frame)
+        height, width = rgb_frame.shape[:2]
+        locations = []
+        for found in results.detections or []:
+            box = found.location_data.relative_bounding_box
+            # Bordas calculadas antes do corte: um rosto que sai do frame não pode deslocar a caixa
+            x1, y1 = box.xmin * width, box.ymin * height
+            x2, y2 = x1 + box.width * width, y1 + box.height * height
+            left, top = max(int(x1), 0), max(int(y1), 0)
+            right, bottom = min(int(x2), width), min(int(y2), height)
+            if right > left and bottom > top:
+                locations.append((top, right, bottom, left))
+        return locations
+
+
+class HaarBackend:
+    """Cascata de Haar do OpenCV (frontal): a mais barata, com mais falsos positivos."""
+
+    def __init__(self, cascade='haarcascade_frontalface_default.xml', min_size=40):
+        if not hasattr(cv2, 'CascadeClassifier'):
+            raise ImportError("Esta build do OpenCV não traz as cascatas de Haar (módulo objdetect).")
+        self.cascade_file = os.path.join(cv2.data.haarcascades, cascade)
+        self.min_size = min_size
+        self._cascade = threading.local()  # CascadeClassifier não é seguro entre threads
+
+    def detect(self, rgb_frame):
+        cascade = getattr(self._cascade, 'value', None)
+        if cascade is None:
+            cascade = self._cascade.value = cv2.CascadeClassifier(self.cascade_file)
+            if cascade.empty():
+                raise OSError(f"Cascata de Haar não encontrada: {self.cascade_file}")
+        gray = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2GRAY)
+        boxes = cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5,
+                                         minSize=(self.min_size, self.min_size))
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in boxes]
+
+
+class DnnBackend:
+    """SSD ResNet-10 do módulo DNN do OpenCV (arquivos em models/, baixados à parte)."""
+
+    def __init__(self, prototxt=DNN_PROTOTXT, weights=DNN_WEIGHTS, min_confidence=0.5, input_size=300):
+        if not (os.path.exists(prototxt) and os.path.exists(weights)):
+            raise OSError(f"Modelo DNN não encontrado ({prototxt}, {weights}).")
+        self.prototxt = prototxt
+        self.weights = weights
+        self.min_confidence = min_confidence
+        self.input_size = input_size
+        self._net = threading.local()
+
+    def detect(self, rgb_frame):
+        net = getattr(self._net, 'value', None)
+        if net is None:
+            net = self._net.value = cv2.dnn.readNetFromCaffe(self.prototxt, self.weights)
+        height, width = rgb_frame.shape[:2]
+        # O modelo foi treinado com BGR e estas médias
+        blob = cv2.dnn.blobFromImage(rgb_frame, 1.0, (self.input_size, self.input_size),
+                                     (104.0, 177.0, 123.0), swapRB=True)
+        net.setInput(blob)
+        detections = net.forward()[0, 0]
+        locations = []
+        for confidence, x1, y1, x2, y2 in detections[:, 2:7]:
+            if confidence < self.min_confidence:
+                continue
+            left, top = max(int(x1 * width), 0), max(int(y1 * height), 0)
+            right, bottom = min(int(x2 * width), width), min(int(y2 * height), height)
+            if right > left and bottom > top:
+                locations.append((top, right, bottom, left))
+        return locations
+
+
+# Nome (DETECTOR_BACKEND em principal.py) -> fábrica(upsample)
+DETECTOR_BACKENDS = {
+    'hog': lambda upsample: DlibBackend('hog', upsample),
+    'cnn': lambda upsample: DlibBackend('cnn', upsample),
+    'mediapipe': lambda upsample: MediaPipeBackend(),
+    'haar': lambda upsample: HaarBackend(),
+    'dnn': lambda upsample: DnnBackend(),
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name, upsample=1):
+    """Instância compartilhada do detector `name` (modelos carregados uma vez por processo)."""
+    if name not in DETECTOR_BACKENDS:
+        raise ValueError(f"Detector desconhecido: {name} (opções: {', '.join(DETECTOR_BACKENDS)})")
+    with _backends_lock:
+        backend = _backends.get((name, upsample))
+        if backend is None:
+            backend = _backends[(name, upsample)] = DETECTOR_BACKENDS[name](upsample)
+        return backend
+
+
+def detect_faces(rgb_frame, model='hog', scale=1.0, upsample=1):
+    """Detecta rostos em uma cópia reduzida do frame e devolve as caixas na resolução original.
+
+    `model` é um nome de DETECTOR_BACKENDS; as caixas podem ir direto para
+    `encoding_cache.encode_faces`, sem uma segunda detecção.
+    """
+    backend = get_backend(model, upsample)
+    if scale == 1.0:
+        return backend.detect(rgb_frame)
+    small_frame = cv2.resize(rgb_frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    locations = backend.detect(small_frame)
+    return [scale_location(location, 1.0 / scale, rgb_frame.shape) for location in locations]
+
+
+def detect_faces_in_regions(rgb_frame, regions, model='hog', scale=1.0, upsample=1):
+    """Detecta rostos só dentro das regiões dadas, devolvendo caixas no frame inteiro."""
+    locations = []
+    for top, right, bottom, left in regions:
+        crop = rgb_frame[top:bottom, left:right]
+        if crop.size == 0:
+            continue
+        for c_top, c_right, c_bottom, c_left in detect_faces(crop, model, scale, upsample):
+            location = (c_top + top, c_right + left, c_bottom + top, c_left + left)
+            # Regiões sobrepostas podem encontrar o mesmo rosto duas vezes
+            if all(iou(location, found) < 0.5 for found in locations):
+                locations.append(location)
+    return locations
+
+
+class FaceDetector:
+    """Detecção com redução de escala e busca restrita às regiões já conhecidas.
+
+    Com `roi` ativo, após uma varredura completa os frames seguintes só
+    procuram rostos em volta das últimas posições conhecidas (ampliadas por
+    `roi_margin`); uma nova varredura do frame inteiro acontece a cada
+    `full_every` detecções ou quando nenhum rosto é encontrado nas regiões.
+    `model` é qualquer nome de DETECTOR_BACKENDS.
+    """
+
+    def __init__(self, model='hog', scale=1.0, upsample=1, roi=False, full_every=10, roi_margin=0.6):
+        get_backend(model, upsample)  # Nome inválido ou modelo ausente falham já na construção
+        self.model = model
+        self.scale = scale
+        self.upsample = upsample
+        self.roi = roi
+        self.full_every = full_every
+        self.roi_margin = roi_margin
+        self.full_sweeps = 0
+        self.roi_sweeps = 0
+        self._known_locations = []
+        self._since_full = 0
+        self._lock = threading.Lock()
+
+    def detect(self, rgb_frame, regions=None, full=False):
+        """Retorna as caixas (top, right, bottom, left) dos rostos na resolução do frame.
+
+        `regions` (ex.: áreas com movimento, ver `motion_gate`) restringe a
+        busca a essas regiões e às posições já conhecidas, sem recorrer à
+        varredura completa; `full` força a varredura do frame inteiro.
+        """
+        with self._lock:
+            known = [expand_location(location, self.roi_margin, rgb_frame.shape)
+                     for location in self._known_locations]
+            use_roi = self.roi and known and self._since_full < self.full_every
+
+        locations = []
+        if full:
+            search = None
+        elif regions is not None:
+            # Regiões com mudança: um resultado vazio é uma resposta válida, sem varredura completa
+            search = known + list(regions)
+        else:
+            search = known if use_roi else None
+        if search is not None:
+            locations = detect_faces_in_regions(rgb_frame, search, self.model, self.scale, self.upsample)
+        if search is not None and (locations or regions is not None):
+            full_sweep = False
+        else:
+            # Sem regiões conhecidas (ou nada encontrado nelas): varre o frame inteiro
+            locations = detect_faces(rgb_frame, self.model, self.scale, self.upsample)
+            full_sweep = True
+
+        with self._lock:
+            self._known_locations = locations
+            if full_sweep:
+                self._since_full = 0
+                self.full_sweeps += 1
+            else:
+                self._since_full += 1
+                self.roi_sweeps += 1
+        return locations
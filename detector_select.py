@@ -0,0 +1,212 @@
+"""Escolha automática do detector de rostos (DETECTOR_BACKEND = 'auto').
+
+Cada foto de data/known_faces é colada em um frame de fundo neutro, em uma
+posição conhecida, e cada detector candidato roda sobre esses frames na
+escala de detecção configurada. Um rosto conta como encontrado quando o
+centro de alguma caixa cai dentro da foto colada; caixas fora dela são
+falsos positivos, assim como qualquer caixa nos frames de distração (as
+mesmas fotos com os blocos embaralhados: cor e textura de pele, sem rosto).
+Vence o detector mais rápido cujo recall atinge `recall_target` com no
+máximo `max_false_positives` falsos positivos por frame (sem nenhum, o de
+maior recall entre os que respeitam o limite).
+A escolha fica salva em data/detector_choice.json e só é refeita quando as
+fotos, os candidatos ou os parâmetros mudam.
+
+Uso: python detector_select.py --recall 0.9 --scale 0.5
+"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+import argparse
+import cv2
+import numpy as np
+
+from encoding_cache import KNOWN_FACES_DIR, IMAGE_EXTENSIONS
+from detection import DETECTOR_BACKENDS, get_backend, detect_faces
+
+CHOICE_FILE = 'data/detector_choice.json'
+CANDIDATES = ('haar', 'dnn', 'mediapipe', 'hog', 'cnn')  # Do mais barato ao mais caro
+RECALL_TARGET = 0.9
+MAX_FALSE_POSITIVES = 0.1  # Falsos positivos por frame (frames com rosto e de distração)
+DISTRACTOR_GRID = 8  # Blocos por lado no embaralhamento das fotos de distração
+
+
+def _signature(files, candidates, recall_target, scale, frame_size, max_false_positives):
+    """Identifica o conjunto de fotos (nome, tamanho, mtime) e os parâmetros da escolha."""
+    digest = hashlib.sha1()
+    for path in files:
+        stat = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    digest.update(json.dumps([list(candidates), recall_target, scale, list(frame_size),
+                              max_false_positives]).encode())
+    return digest.hexdigest()
+
+
+def _shuffle_blocks(image, rng, grid=DISTRACTOR_GRID):
+    """A imagem com os blocos de uma grade `grid` x `grid` embaralhados."""
+    height, width = image.shape[0] // grid * grid, image.shape[1] // grid * grid
+    block_h, block_w = height // grid, width // grid
+    blocks = [image[y:y + block_h, x:x + block_w]
+              for y in range(0, height, block_h) for x in range(0, width, block_w)]
+    order = rng.permutation(len(blocks))
+    rows = [np.hstack([blocks[i] for i in order[r * grid:(r + 1) * grid]]) for r in range(grid)]
+    return np.vstack(rows)
+
+
+def benchmark_frames(files, frame_size=(640, 480), face_fraction=0.4, seed=0, distractors=False):
+    """Frames RGB com uma foto cada, mais a caixa (top, right, bottom, left) onde ela foi colada.
+
+    Com `distractors=True`, cada foto é colada com os blocos embaralhados
+    (nenhum rosto no frame).
+    """
+    rng = np.random.default_rng(seed)
+    width, height = frame_size
+    frames, boxes = [], []
+    for path in files:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        factor = min(face_fraction * height / image.shape[0], 0.9 * width / image.shape[1])
+        face = cv2.resize(image, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        if distractors:
+            face = _shuffle_blocks(face, rng)
+        frame = np.full((height, width, 3), 110, dtype=np.uint8)
+        frame += rng.integers(0, 24, size=frame.shape, dtype=np.uint8)
+        top = int(rng.integers(0, height - face.shape[0] + 1))
+        left = int(rng.integers(0, width - face.shape[1] + 1))
+        frame[top:top + face.shape[0], left:left + face.shape[1]] = face
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        boxes.append((top, left + face.shape[1], top + face.shape[0], left))
+    return frames, boxes
+
+
+def _inside(box, location):
+    top, right, bottom, left = box
+    l_top, l_right, l_bottom, l_left = location
+    y, x = (l_top + l_bottom) / 2, (l_left + l_right) / 2
+    return top <= y <= bottom and left <= x <= right
+
+
+def _found(box, locations):
+    return any(_inside(box, location) for location in locations)
+
+
+def _false_positives(box, locations):
+    """Caixas fora da foto colada (todas, nos frames de distração, onde `box` é None)."""
+    return sum(1 for location in locations if box is None or not _inside(box, location))
+
+
+def evaluate_backends(frames, boxes, candidates=CANDIDATES, scale=1.0, distractors=()):
+    """{detector: {'recall', 'false_positives', 'ms'}} ou {'skipped': motivo} para os indisponíveis.
+
+    `false_positives` é a média de caixas erradas por frame, somando os
+    frames com rosto e os `distractors` (frames sem rosto).
+    """
+    report = {}
+    for name in candidates:
+        try:
+            get_backend(name)
+            detect_faces(frames[0], name, scale)  # Aquecimento (carregamento do modelo)
+        except (ImportError, OSError) as error:
+            report[name] = {'skipped': str(error)}
+            continue
+        start = time.perf_counter()
+        results = [detect_faces(frame, name, scale) for frame in frames]
+        elapsed = time.perf_counter() - start
+        distractor_results = [detect_faces(frame, name, scale) for frame in distractors]
+        hits = sum(_found(box, locations) for box, locations in zip(boxes, results))
+        false_positives = (sum(_false_positives(box, locations) for box, locations in zip(boxes, results))
+                           + sum(len(locations) for locations in distractor_results))
+        report[name] = {'recall': hits / len(frames),
+                        'false_positives': false_positives / (len(frames) + len(distractors)),
+                        'ms': 1000.0 * elapsed / len(frames)}
+    return report
+
+
+def choose_backend(report, recall_target=RECALL_TARGET, max_false_positives=MAX_FALSE_POSITIVES):
+    measured = {name: result for name, result in report.items() if 'skipped' not in result}
+    if not measured:
+        return None
+    precise = [name for name, result in measured.items() if result['false_positives'] <= max_false_positives]
+    passing = [name for name in precise if measured[name]['recall'] >= recall_target]
+    if passing:
+        return min(passing, key=lambda name: measured[name]['ms'])
+    # Nenhum atinge as duas metas: o de maior recall, preferindo os que respeitam o limite de falsos positivos
+    return max(measured, key=lambda name: (name in precise, measured[name]['recall'],
+                                           -measured[name]['false_positives'], -measured[name]['ms']))
+
+
+def select_backend(directory=KNOWN_FACES_DIR, recall_target=RECALL_TARGET, candidates=CANDIDATES, scale=1.0,
+                   frame_size=(640, 480), max_images=50, choice_file=CHOICE_FILE, fallback='hog',
+                   max_false_positives=MAX_FALSE_POSITIVES):
+    """Nome do detector mais rápido que atinge `recall_target` nas fotos de `directory`
+    sem passar de `max_false_positives` falsos positivos por frame."""
+    files = sorted(os.path.join(directory, filename) for filename in os.listdir(directory)
+                   if filename.lower().endswith(IMAGE_EXTENSIONS))[:max_images] if os.path.isdir(directory) else []
+    if not files:
+        print(f"Sem fotos para escolher o detector; usando '{fallback}'.")
+        return fallback
+    signature = _signature(files, candidates, recall_target, scale, frame_size, max_false_positives)
+    try:
+        with open(choice_file) as file:
+            saved = json.load(file)
+        if saved.get('signature') == signature and saved.get('backend') in DETECTOR_BACKENDS:
+            return saved['backend']
+    except (OSError, ValueError):
+        pass
+
+    frames, boxes = benchmark_frames(files, frame_size)
+    if not frames:
+        return fallback
+    distractors, _ = benchmark_frames(files, frame_size, seed=1, distractors=True)
+    report = evaluate_backends(frames, boxes, candidates, scale, distractors)
+    backend = choose_backend(report, recall_target, max_false_positives) or fallback
+    for name, result in report.items():
+        if 'skipped' in result:
+            print(f"  {name}: indisponível ({result['skipped']})")
+        else:
+            print(f"  {name}: recall {result['recall']:.0%}, {result['false_positives']:.2f} falsos "
+                  f"positivos/frame, {result['ms']:.1f} ms/frame")
+    print(f"Detector escolhido: {backend} (recall mínimo {recall_target:.0%}, no máximo "
+          f"{max_false_positives:g} falsos positivos/frame, {len(frames)} fotos + {len(distractors)} sem rosto).")
+
+    directory = os.path.dirname(choice_file) or '.'
+    os.makedirs(directory, exist_ok=True)
+    # Temporário com nome único: principal.py, server.py e o daemon podem escolher ao mesmo tempo
+    fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(choice_file) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as file:
+            json.dump({'signature': signature, 'backend': backend, 'report': report}, file, indent=2)
+        os.replace(tmp_file, choice_file)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+    return backend
+
+
+def resolve_backend(name, scale=1.0, **kwargs):
+    """Nome configurado -> detector; 'auto' dispara (ou reaproveita) a escolha automática."""
+    if name == 'auto':
+        return select_backend(scale=scale, **kwargs)
+    return name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--directory', default=KNOWN_FACES_DIR)
+    parser.add_argument('--recall', type=float, default=RECALL_TARGET)
+    parser.add_argument('--max-fp', type=float, default=MAX_FALSE_POSITIVES, help='falsos positivos por frame')
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--candidates', default=','.join(CANDIDATES))
+    parser.add_argument('--force', action='store_true', help='ignora a escolha salva')
+    args = parser.parse_args()
+    if args.force and os.path.exists(CHOICE_FILE):
+        os.remove(CHOICE_FILE)
+    select_backend(args.directory, args.recall, tuple(args.candidates.split(',')), args.scale,
+                   max_false_positives=args.max_fp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import os
+import json
+import hashlib
+import tempfile
+import zipfile
+import numpy as np
+import face_recognition
+
+# Configuração dos diretórios
+KNOWN_FACES_DIR = 'data/known_faces'
+CACHE_FILE = 'data/encodings_cache.npz'
+
+# Versão do formato do arquivo; incrementar sempre que o layout mudar
+CACHE_FORMAT_VERSION = 1
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+ENCODING_SIZE = 128
+
+
+def model_version():
+    """Identifica o modelo usado para gerar as codificações."""
+    try:
+        import dlib
+        dlib_version = dlib.__version__
+    except (ImportError, AttributeError):
+        dlib_version = 'desconhecido'
+    try:
+        import face_recognition_models
+        models_version = getattr(face_recognition_models, '__version__', 'desconhecido')
+    except ImportError:
+        models_version = 'desconhecido'
+    return f"dlib={dlib_version};models={models_version};detector=hog;jitters=1"
+
+
+def file_digest(path):
+    """Calcula o SHA-1 do conteúdo de um arquivo."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_image_file(path):
+    """Retorna a codificação do primeiro rosto da imagem, ou None se não houver rosto."""
+    image = face_recognition.load_image_file(path)
+    encodings = face_recognition.face_encodings(image)
+    if encodings:
+        return np.asarray(encodings[0], dtype=np.float64)
+    return None
+
+
+def face_shapes(rgb_image, locations):
+    """Landmarks de 5 pontos (objetos do dlib) das caixas dadas, ou None sem o dlib.
+
+    São os mesmos pontos que `encode_faces` usa para alinhar o rosto: quem
+    já os calculou (ex.: `face_quality`) pode repassá-los em `shapes`.
+    """
+    try:
+        from face_recognition.api import _raw_face_landmarks
+    except (ImportError, AttributeError):
+        return None
+    return _raw_face_landmarks(rgb_image, locations, model='small')
+
+
+def encode_faces(rgb_image, locations, num_jitters=1, shapes=None):
+    """Codifica os rostos nas caixas (top, right, bottom, left) dadas, sem detectar de novo.
+
+    Equivale a `face_recognition.face_encodings(rgb_image, locations)`
+    (landmarks de 5 pontos, mesmo padding), mas todos os rostos do frame
+    passam pela rede do dlib em uma única chamada. Retorna uma lista de
+    vetores 128-d, na ordem das caixas.
+    """
+    if not len(locations):
+        return []
+    try:
+        import dlib
+        from face_recognition.api import face_encoder
+    except (ImportError, AttributeError):
+        return face_recognition.face_encodings(rgb_image, locations, num_jitters=num_jitters)
+    detections = dlib.full_object_detections()
+    for shape in shapes if shapes is not None else face_shapes(rgb_image, locations):
+        detections.append(shape)
+    descriptors = face_encoder.compute_face_descriptor(np.ascontiguousarray(rgb_image), detections, num_jitters)
+    return [np.array(descriptor) for descriptor in descriptors]
+
+
+class EncodingCache:
+    """Cache em disco das codificações das imagens de um diretório.
+
+    Cada entrada é indexada pelo nome do arquivo e validada pelo tamanho,
+    mtime e SHA-1 do conteúdo; somente imagens novas ou alteradas são
+    codificadas novamente e entradas de arquivos removidos são descartadas.
+    """
+
+    def __init__(self, directory=KNOWN_FACES_DIR, cache_file=CACHE_FILE):
+        self.directory = directory
+        self.cache_file = cache_file
+        self.model = model_version()
+        # filename -> {'sha1', 'mtime_ns', 'size', 'encoding' (ndarray ou None)}
+        self.entries = {}
+        self.dirty = False
+
+    def load(self):
+        """Carrega o cache do disco; arquivos inválidos ou de outra versão são ignorados."""
+        self.entries = {}
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with np.load(self.cache_file, allow_pickle=False) as data:
+                meta = json.loads(str(data['meta']))
+                if meta.get('format') != CACHE_FORMAT_VERSION or meta.get('model') != self.model:
+                    print("Cache de codificações desatualizado. Recalculando.")
+                    return
+                filenames = data['filenames']
+                digests = data['sha1']
+                mtimes = data['mtime_ns']
+                sizes = data['size']
+                has_face = data['has_face']
+                encodings = data['encodings']
+                count = len(filenames)
+                if not (len(digests) == len(mtimes) == len(sizes) == len(has_face) == count
+                        and encodings.shape == (count, ENCODING_SIZE)):
+                    raise ValueError("dimensões inconsistentes")
+                for i in range(count):
+                    self.entries[str(filenames[i])] = {
+                        'sha1': str(digests[i]),
+                        'mtime_ns': int(mtimes[i]),
+                        'size': int(sizes[i]),
+                        'encoding': encodings[i].copy() if has_face[i] else None,
+                    }
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as error:
+            print(f"Cache de codificações inválido ({error}). Recalculando.")
+            self.entries = {}
+
+    def save(self):
+        """Grava o cache de forma atômica (arquivo temporário + rename)."""
+        filenames = sorted(self.entries)
+        encodings = np.zeros((len(filenames), ENCODING_SIZE), dtype=np.float64)
+        has_face = np.zeros(len(filenames), dtype=bool)
+        for i, filename in enumerate(filenames):
+            encoding = self.entries[filename]['encoding']
+            if encoding is not None:
+                encodings[i] = encoding
+                has_face[i] = True
+        meta = json.dumps({'format': CACHE_FORMAT_VERSION, 'model': self.model})
+
+        directory = os.path.dirname(self.cache_file) or '.'
+        os.makedirs(directory, exist_ok=True)
+        # Temporário com nome único: principal.py, add_faces.py, bulk_enroll.py e o daemon
+        # podem gravar o cache ao mesmo tempo, e um nome fixo faria um apagar o do outro
+        fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(self.cache_file) + '.', suffix='.tmp',
+                                        dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                np.savez(
+                    file,
+                    meta=np.array(meta),
+                    filenames=np.array(filenames, dtype=str),
+                    sha1=np.array([self.entries[f]['sha1'] for f in filenames], dtype=str),
+                    mtime_ns=np.array([self.entries[f]['mtime_ns'] for f in filenames], dtype=np.int64),
+                    size=np.array([self.entries[f]['size'] for f in filenames], dtype=np.int64),
+                    has_face=has_face,
+                    encodings=encodings,
+                )
+            os.replace(tmp_file, self.cache_file)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+        self.dirty = False
+
+    def refresh(self):
+        """Sincroniza o cache com o diretório e retorna estatísticas da operação."""
+        stats = {'reused': 0, 'encoded': 0, 'removed': 0}
+        present = set()
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(self.directory, filename)
+            if not os.path.isfile(path):
+                continue
+            present.add(filename)
+            stat = os.stat(path)
+            entry = self.entries.get(filename)
+
+            # Caminho rápido: mesmo tamanho e mtime
+            if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                stats['reused'] += 1
+                continue
+
+            # Conteúdo igual com mtime diferente (ex.: arquivo copiado)
+            digest = file_digest(path)
+            if entry and entry['sha1'] == digest:
+                entry['mtime_ns'] = stat.st_mtime_ns
+                entry['size'] = stat.st_size
+                self.dirty = True
+                stats['reused'] += 1
+                continue
+
+            encoding = encode_image_file(path)
+            if encoding is None:
+                print(f"Não foi possível encontrar um rosto em {filename}.")
+            self.entries[filename] = {
+                'sha1': digest,
+                'mtime_ns': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'encoding': encoding,
+            }
+            self.dirty = True
+            stats['encoded'] += 1
+
+        for filename in list(self.entries):
+            if filename not in present:
+                del self.entries[filename]
+                self.dirty = True
+                stats['removed'] += 1
+        return stats
+
+    def put(self, filename, encoding, digest=None):
+        """Registra a codificação de um arquivo já gravado no diretório (sem recodificá-lo)."""
+        path = os.path.join(self.directory, filename)
+        stat = os.stat(path)
+        self.entries[filename] = {
+            'sha1': digest or file_digest(path),
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'encoding': None if encoding is None else np.asarray(encoding, dtype=np.float64),
+        }
+        self.dirty = True
+
+    def encodings(self):
+        """Lista de (filename, encoding) das imagens em que um rosto foi encontrado."""
+        return [
+            (filename, entry['encoding'])
+            for filename, entry in sorted(self.entries.items())
+            if entry['encoding'] is not None
+        ]
+
+
+def load_encodings(directory=KNOWN_FACES_DIR, cache_file=CACHE_FILE):
+    """Retorna as codificações do diretório, recalculando só o que mudou."""
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    cache = EncodingCache(directory, cache_file)
+    cache.load()
+    stats = cache.refresh()
+    if cache.dirty:
+        cache.save()
+    if stats['encoded'] or stats['removed']:
+        print(f"Cache de codificações: {stats['reused']} reaproveitadas, "
+              f"{stats['encoded']} calculadas, {stats['removed']} removidas.")
+    return cache.encodings()
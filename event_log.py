@@ -0,0 +1,150 @@
+import os
+import json
+import datetime
+import threading
+
+RECOGNITION_LOG_FILE = 'recognition_log.jsonl'
+LEGACY_LOG_FILE = 'recognition_log.json'
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def parse_time(value):
+    return datetime.datetime.strptime(value, TIME_FORMAT)
+
+
+class JsonlEventStore:
+    """Arquivo JSONL só de acréscimo, um evento de reconhecimento por linha.
+
+    Um índice lateral (`<arquivo>.idx`) guarda o último horário de cada
+    pessoa e a posição do arquivo até onde ele é válido; na abertura, só as
+    linhas escritas depois dessa posição são lidas.
+    """
+
+    def __init__(self, path=RECOGNITION_LOG_FILE, legacy_file=LEGACY_LOG_FILE):
+        self.path = path
+        self.index_path = path + '.idx'
+        if not os.path.exists(path) and legacy_file and os.path.exists(legacy_file):
+            self._import_legacy(legacy_file)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._last_seen = {}
+
+    def _import_legacy(self, legacy_file):
+        """Converte uma única vez o histórico antigo (JSON nome -> lista de horários)."""
+        with open(legacy_file, 'r') as file:
+            history = json.load(file)
+        events = sorted((time, name) for name, times in history.items() for time in times)
+        with open(self.path, 'w', encoding='utf-8') as file:
+            for time, name in events:
+                file.write(json.dumps({'name': name, 'time': time}, ensure_ascii=False) + '\n')
+        print(f"Histórico de {legacy_file} convertido para {self.path} ({len(events)} eventos).")
+
+    def load_last_seen(self):
+        """Reconstrói {nome: datetime} lendo só o que veio depois do último índice salvo."""
+        last_seen, offset = {}, 0
+        size = os.path.getsize(self.path)
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+            if index['offset'] <= size:
+                offset = index['offset']
+                last_seen = {name: parse_time(time) for name, time in index['last_seen'].items()}
+        except (OSError, ValueError, KeyError):
+            pass
+
+        with open(self.path, 'rb') as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break  # Linha incompleta (gravação interrompida)
+                try:
+                    event = json.loads(line)
+                    last_seen[event['name']] = parse_time(event['time'])
+                except (ValueError, KeyError):
+                    continue
+        self._last_seen = dict(last_seen)
+        return last_seen
+
+    def append(self, events):
+        """Acrescenta os eventos e força a gravação em disco (um fsync por lote)."""
+        for event in events:
+            self._file.write(json.dumps(event, ensure_ascii=False) + '\n')
+            self._last_seen[event['name']] = parse_time(event['time'])
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def save_index(self):
+        index = {'offset': self._file.tell(),
+                 'last_seen': {name: time.strftime(TIME_FORMAT) for name, time in self._last_seen.items()}}
+        tmp_file = self.index_path + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as file:
+            json.dump(index, file, ensure_ascii=False)
+        os.replace(tmp_file, self.index_path)
+
+    def close(self):
+        self.save_index()
+        self._file.close()
+
+
+class RecognitionLog:
+    """Registro de reconhecimentos com gravação em lote em segundo plano.
+
+    `record()` só consulta um dicionário em memória (último horário de cada
+    pessoa, já convertido para datetime) e coloca o evento em um buffer; uma
+    thread grava o buffer a cada `flush_interval` segundos ou ao acumular
+    `flush_events` eventos. `close()` grava o que restar.
+    """
+
+    def __init__(self, store=None, dedupe_seconds=60, flush_interval=1.0, flush_events=32, index_every=20):
+        self.store = store or JsonlEventStore()
+        self.dedupe = datetime.timedelta(seconds=dedupe_seconds)
+        self.flush_interval = flush_interval
+        self.flush_events = flush_events
+        self.index_every = index_every
+        self.last_seen = self.store.load_last_seen()
+        self._buffer = []
+        self._flushes = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._writer = threading.Thread(target=self._run, name='recognition-log', daemon=True)
+        self._writer.start()
+
+    def seen(self, name):
+        return name in self.last_seen
+
+    def record(self, name, now=None, **extra):
+        """Registra o reconhecimento se a pessoa não foi registrada nos últimos 60 s."""
+        now = now or datetime.datetime.now()
+        event = {'name': name, 'time': now.strftime(TIME_FORMAT), **extra}
+        # Consulta e atualização sob o mesmo lock: vários workers (server.py) chamam record()
+        with self._condition:
+            last_time = self.last_seen.get(name)
+            if last_time is not None and now - last_time < self.dedupe:
+                return False
+            self.last_seen[name] = now
+            self._buffer.append(event)
+            if len(self._buffer) >= self.flush_events:
+                self._condition.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._closed or len(self._buffer) >= self.flush_events, self.flush_interval)
+                events, self._buffer = self._buffer, []
+                closed = self._closed
+            if events:
+                self.store.append(events)
+                self._flushes += 1
+                if self._flushes % self.index_every == 0:
+                    self.store.save_index()
+            if closed:
+                break
+
+    def close(self):
+        """Grava os eventos pendentes e fecha o armazenamento."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._writer.join()
+        self.store.close()
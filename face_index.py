@@ -0,0 +1,292 @@
+import os
+import json
+import tempfile
+import zipfile
+import numpy as np
+
+# Arquivo padrão do índice persistido da galeria
+INDEX_FILE = 'data/gallery_index.npz'
+INDEX_FORMAT_VERSION = 1
+
+
+def squared_distances(queries, vectors, sq_norms=None):
+    """Matriz M x N de distâncias euclidianas ao quadrado (float32, nunca negativas)."""
+    queries = np.asarray(queries, dtype=np.float32)
+    if sq_norms is None:
+        sq_norms = np.einsum('ij,ij->i', vectors, vectors)
+    q_norms = np.einsum('ij,ij->i', queries, queries)
+    # ||q - v||² = ||q||² + ||v||² - 2 q·v, com um único produto de matrizes
+    squared = q_norms[:, None] + sq_norms[None, :] - 2.0 * (queries @ vectors.T)
+    return np.maximum(squared, 0.0, out=squared)
+
+
+def top_k(distances, k):
+    """Índices e valores dos k menores elementos de cada linha, em ordem crescente."""
+    count = distances.shape[1]
+    if k < count:
+        indices = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.broadcast_to(np.arange(count), distances.shape).copy()
+    top = np.take_along_axis(distances, indices, axis=1)
+    order = np.argsort(top, axis=1)
+    return np.take_along_axis(indices, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+
+class FlatIndex:
+    """Busca exata: varre todos os vetores com um produto de matrizes."""
+
+    kind = 'flat'
+
+    def __init__(self, dim=128):
+        self.dim = dim
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _update_norms(self):
+        self._sq_norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+
+    def add(self, vectors, ids):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if len(vectors) != len(ids):
+            raise ValueError("O número de vetores e de ids deve ser igual.")
+        if not len(ids):
+            return
+        self.vectors = np.ascontiguousarray(np.vstack([self.vectors, vectors]))
+        self.ids = np.concatenate([self.ids, ids])
+        self._update_norms()
+
+    def remove(self, ids):
+        keep = ~np.isin(self.ids, np.asarray(ids, dtype=np.int64))
+        if not keep.all():
+            self.vectors = np.ascontiguousarray(self.vectors[keep])
+            self.ids = self.ids[keep]
+            self._update_norms()
+
+    def remap(self, mapping):
+        """Renumera os ids (dict id_antigo -> id_novo)."""
+        self.ids = np.array([mapping.get(int(i), int(i)) for i in self.ids], dtype=np.int64)
+
+    def items(self):
+        return self.ids, self.vectors
+
+    def search(self, queries, k=1):
+        """Retorna (ids, distâncias) M x k; posições sem vizinho ficam com id -1 e distância inf."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        if not len(self) or not len(queries):
+            return ids, distances
+        found = min(k, len(self))
+        rows, top = top_k(squared_distances(queries, self.vectors, self._sq_norms), found)
+        ids[:, :found] = self.ids[rows]
+        distances[:, :found] = np.sqrt(top)
+        return ids, distances
+
+    def get_state(self):
+        return {'vectors': self.vectors, 'ids': self.ids}, {'dim': self.dim}
+
+    @classmethod
+    def from_state(cls, arrays, params):
+        index = cls(dim=params['dim'])
+        index.add(arrays['vectors'], arrays['ids'])
+        return index
+
+
+def kmeans(vectors, clusters, iterations=10, seed=0, chunk=8192):
+    """K-means (Lloyd) simples em NumPy; retorna os centróides."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for _ in range(iterations):
+        sq_norms = np.einsum('ij,ij->i', centroids, centroids)
+        for start in range(0, len(vectors), chunk):
+            block = vectors[start:start + chunk]
+            assignment[start:start + chunk] = squared_distances(block, centroids, sq_norms).argmin(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=clusters)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Clusters vazios recebem pontos aleatórios para não desperdiçar listas
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    """Índice aproximado por listas invertidas (partição por k-means).
+
+    Cada consulta visita apenas as `nprobe` listas de centróides mais
+    próximos: mais listas aumentam o recall e a latência. Enquanto não
+    houver vetores suficientes para o treino, a busca é exata.
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, dim=128, nlist=None, nprobe=8, min_train=256, seed=0):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.seed = seed
+        self.centroids = None
+        self.lists = []
+        self._pending = FlatIndex(dim)  # vetores recebidos antes do treino
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def __len__(self):
+        return len(self._pending) + sum(len(lst) for lst in self.lists)
+
+    def train(self, vectors):
+        """Calcula as partições e redistribui os vetores já inseridos."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        nlist = self.nlist or max(1, int(np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+        # Amostra limitada mantém o treino rápido mesmo com galerias enormes
+        sample_size = min(len(vectors), 64 * nlist)
+        rng = np.random.default_rng(self.seed)
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+        self.centroids = kmeans(sample, nlist, seed=self.seed)
+        self._centroid_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        self.lists = [FlatIndex(self.dim) for _ in range(nlist)]
+        ids, pending = self._pending.items()
+        self._pending = FlatIndex(self.dim)
+        self._assign(pending, ids)
+
+    def _assign(self, vectors, ids):
+        if not len(ids):
+            return
+        nearest = squared_distances(vectors, self.centroids, self._centroid_norms).argmin(axis=1)
+        # Agrupa por lista com uma ordenação, em vez de uma máscara por lista
+        order = np.argsort(nearest, kind='stable')
+        bounds = np.searchsorted(nearest[order], np.arange(len(self.lists) + 1))
+        for list_no in range(len(self.lists)):
+            rows = order[bounds[list_no]:bounds[list_no + 1]]
+            if len(rows):
+                self.lists[list_no].add(vectors[rows], ids[rows])
+
+    def add(self, vectors, ids):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        if self.is_trained:
+            self._assign(vectors, ids)
+            return
+        self._pending.add(vectors, ids)
+        if len(self._pending) >= self.min_train:
+            self.train(self._pending.vectors)
+
+    def remove(self, ids):
+        self._pending.remove(ids)
+        for lst in self.lists:
+            lst.remove(ids)
+
+    def remap(self, mapping):
+        self._pending.remap(mapping)
+        for lst in self.lists:
+            lst.remap(mapping)
+
+    def items(self):
+        parts = [self._pending] + self.lists
+        return (np.concatenate([p.ids for p in parts]),
+                np.vstack([p.vectors for p in parts]))
+
+    def search(self, queries, k=1):
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if not self.is_trained:
+            return self._pending.search(queries, k)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        if not len(queries):
+            return ids, distances
+        nprobe = min(self.nprobe, len(self.lists))
+        probes, _ = top_k(squared_distances(queries, self.centroids, self._centroid_norms), nprobe)
+        for q, query in enumerate(queries):
+            candidates = [self.lists[list_no] for list_no in probes[q] if len(self.lists[list_no])]
+            if not candidates:
+                continue
+            vectors = np.vstack([c.vectors for c in candidates])
+            sq_norms = np.concatenate([c._sq_norms for c in candidates])
+            candidate_ids = np.concatenate([c.ids for c in candidates])
+            found = min(k, len(candidate_ids))
+            rows, top = top_k(squared_distances(query[None, :], vectors, sq_norms), found)
+            ids[q, :found] = candidate_ids[rows[0]]
+            distances[q, :found] = np.sqrt(top[0])
+        return ids, distances
+
+    def get_state(self):
+        params = {'dim': self.dim, 'nlist': self.nlist, 'nprobe': self.nprobe,
+                  'min_train': self.min_train, 'seed': self.seed}
+        arrays = {'pending_vectors': self._pending.vectors, 'pending_ids': self._pending.ids}
+        if self.is_trained:
+            arrays['centroids'] = self.centroids
+            arrays['list_sizes'] = np.array([len(lst) for lst in self.lists], dtype=np.int64)
+            arrays['vectors'] = np.vstack([lst.vectors for lst in self.lists])
+            arrays['ids'] = np.concatenate([lst.ids for lst in self.lists])
+        return arrays, params
+
+    @classmethod
+    def from_state(cls, arrays, params):
+        index = cls(dim=params['dim'], nlist=params['nlist'], nprobe=params['nprobe'],
+                    min_train=params['min_train'], seed=params['seed'])
+        index._pending.add(arrays['pending_vectors'], arrays['pending_ids'])
+        if 'centroids' in arrays:
+            index.centroids = np.asarray(arrays['centroids'], dtype=np.float32)
+            index._centroid_norms = np.einsum('ij,ij->i', index.centroids, index.centroids)
+            index.lists = [FlatIndex(index.dim) for _ in range(len(index.centroids))]
+            offsets = np.concatenate([[0], np.cumsum(arrays['list_sizes'])])
+            for list_no, lst in enumerate(index.lists):
+                start, end = offsets[list_no], offsets[list_no + 1]
+                lst.add(arrays['vectors'][start:end], arrays['ids'][start:end])
+        return index
+
+
+INDEX_TYPES = {FlatIndex.kind: FlatIndex, IVFIndex.kind: IVFIndex}
+
+
+def create_index(kind='flat', dim=128, **params):
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Tipo de índice desconhecido: {kind}")
+    return INDEX_TYPES[kind](dim=dim, **params)
+
+
+def save_index(index, path=INDEX_FILE, keys=None):
+    """Grava o índice (e a chave de cada id, se houver) de forma atômica."""
+    arrays, params = index.get_state()
+    meta = json.dumps({'format': INDEX_FORMAT_VERSION, 'kind': index.kind, 'params': params})
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    # Temporário com nome único: add_faces.py, bulk_enroll.py, principal.py e o daemon podem regravar o índice
+    fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            np.savez(file, meta=np.array(meta), keys=np.array(keys or [], dtype=str), **arrays)
+        os.replace(tmp_file, path)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+
+
+def load_index(path=INDEX_FILE):
+    """Retorna (índice, chaves) ou (None, []) se o arquivo não existir ou for inválido."""
+    if not os.path.exists(path):
+        return None, []
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('format') != INDEX_FORMAT_VERSION or meta.get('kind') not in INDEX_TYPES:
+                print("Índice da galeria em formato desconhecido. Reconstruindo.")
+                return None, []
+            arrays = {name: data[name] for name in data.files if name not in ('meta', 'keys')}
+            keys = [str(key) for key in data['keys']]
+            return INDEX_TYPES[meta['kind']].from_state(arrays, meta['params']), keys
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as error:
+        print(f"Índice da galeria inválido ({error}). Reconstruindo.")
+        return None, []
@@ -0,0 +1,132 @@
+"""Portão de qualidade antes da codificação: rostos pequenos, borrados ou de perfil não são codificados."""
+import math
+import threading
+import cv2
+import numpy as np
+
+from encoding_cache import face_shapes
+
+QUALITY_MIN_SIZE = 40  # Pixels; o dlib alinha o rosto em 150 x 150
+QUALITY_MIN_SHARPNESS = 25.0  # Fotos de data/known_faces ficam acima de ~45; borradas, abaixo de ~20
+QUALITY_MAX_YAW = 0.35  # Desvio do nariz / distância entre os olhos (0 = frontal)
+QUALITY_MIN_EYE_SPAN = 0.25  # Distância entre os olhos / largura da caixa
+SHARPNESS_SIZE = 64
+
+# Cadastro: limites mais rígidos (a foto salva vira referência para todas as comparações futuras)
+ENROLL_MIN_SIZE = 80
+ENROLL_MIN_SHARPNESS = 40.0
+ENROLL_MAX_YAW = 0.25
+
+# Motivos de rejeição, na ordem em que são verificados
+SMALL, BLURRY, POSE = 'small', 'blurry', 'pose'
+REJECTION_MESSAGES = {SMALL: 'rosto pequeno demais', BLURRY: 'imagem borrada',
+                      POSE: 'rosto virado ou olhos encobertos'}
+
+
+def sharpness(rgb_frame, location):
+    """Variância do Laplaciano do rosto em escala de cinza, reduzido para 64 x 64."""
+    top, right, bottom, left = location
+    crop = rgb_frame[max(top, 0):bottom, max(left, 0):right]
+    if crop.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+    gray = cv2.resize(gray, (SHARPNESS_SIZE, SHARPNESS_SIZE), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def pose_scores(shape, location):
+    """(desvio lateral, abertura dos olhos, rotação em graus) a partir dos 5 landmarks do dlib.
+
+    Pontos 0-1 e 2-3 são os cantos de cada olho e 4, a base do nariz.
+    """
+    points = np.array([(shape.part(i).x, shape.part(i).y) for i in range(5)], dtype=np.float64)
+    eye_a, eye_b = points[0:2].mean(axis=0), points[2:4].mean(axis=0)
+    axis = eye_b - eye_a
+    span = float(np.hypot(*axis))
+    if span == 0:
+        return float('inf'), 0.0, 0.0
+    # Projeção do nariz sobre a linha dos olhos, relativa ao ponto médio (0 = centralizado)
+    yaw = abs(float(np.dot(points[4] - (eye_a + eye_b) / 2, axis))) / (span * span)
+    top, right, bottom, left = location
+    eye_span = span / max(right - left, 1)
+    roll = math.degrees(math.atan2(axis[1], axis[0]))
+    return yaw, eye_span, roll
+
+
+class FaceQualityGate:
+    """Decide quais rostos detectados merecem ser codificados e conta os descartados.
+
+    `filter` devolve os índices aceitos e os landmarks deles (para
+    `encode_faces`); `counts` guarda quantos rostos foram avaliados,
+    aceitos e rejeitados por motivo. Com `use_landmarks=False` (ou sem o
+    dlib), só tamanho e nitidez são verificados.
+    """
+
+    def __init__(self, min_size=QUALITY_MIN_SIZE, min_sharpness=QUALITY_MIN_SHARPNESS, max_yaw=QUALITY_MAX_YAW,
+                 min_eye_span=QUALITY_MIN_EYE_SPAN, use_landmarks=True):
+        self.min_size = min_size
+        self.min_sharpness = min_sharpness
+        self.max_yaw = max_yaw
+        self.min_eye_span = min_eye_span
+        self.use_landmarks = use_landmarks
+        self.counts = {'checked': 0, 'accepted': 0, SMALL: 0, BLURRY: 0, POSE: 0}
+        self._lock = threading.Lock()
+
+    def check_box(self, rgb_frame, location):
+        """Motivo da rejeição pelo tamanho ou pela nitidez, ou None."""
+        top, right, bottom, left = location
+        if min(bottom - top, right - left) < self.min_size:
+            return SMALL
+        if sharpness(rgb_frame, location) < self.min_sharpness:
+            return BLURRY
+        return None
+
+    def check_pose(self, shape, location):
+        yaw, eye_span, _ = pose_scores(shape, location)
+        return POSE if yaw > self.max_yaw or eye_span < self.min_eye_span else None
+
+    def filter(self, rgb_frame, locations):
+        """Retorna (índices aceitos, landmarks dos aceitos ou None)."""
+        reasons = [self.check_box(rgb_frame, location) for location in locations]
+        accepted = [i for i, reason in enumerate(reasons) if reason is None]
+        shapes = None
+        if self.use_landmarks and accepted:
+            shapes = face_shapes(rgb_frame, [locations[i] for i in accepted])
+            if shapes is not None:
+                kept, kept_shapes = [], []
+                for i, shape in zip(accepted, shapes):
+                    reasons[i] = self.check_pose(shape, locations[i])
+                    if reasons[i] is None:
+                        kept.append(i)
+                        kept_shapes.append(shape)
+                accepted, shapes = kept, kept_shapes
+        with self._lock:
+            self.counts['checked'] += len(locations)
+            self.counts['accepted'] += len(accepted)
+            for reason in reasons:
+                if reason is not None:
+                    self.counts[reason] += 1
+        return accepted, shapes
+
+    def check(self, rgb_frame, location):
+        """Retorna (motivo da rejeição ou None, landmarks ou None) de um único rosto (ex.: no cadastro)."""
+        reason = self.check_box(rgb_frame, location)
+        shape = None
+        if reason is None and self.use_landmarks:
+            shapes = face_shapes(rgb_frame, [location])
+            if shapes:
+                shape = shapes[0]
+                reason = self.check_pose(shape, location)
+        return reason, shape
+
+    def summary(self):
+        with self._lock:
+            counts = dict(self.counts)
+        counts['encodes_saved'] = counts['checked'] - counts['accepted']
+        counts['saved_fraction'] = counts['encodes_saved'] / counts['checked'] if counts['checked'] else 0.0
+        return counts
+
+
+def enrollment_gate():
+    """Portão com os limites de cadastro (add_faces.py e bulk_enroll.py)."""
+    return FaceQualityGate(ENROLL_MIN_SIZE, ENROLL_MIN_SHARPNESS, ENROLL_MAX_YAW)
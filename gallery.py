@@ -0,0 +1,160 @@
+import os
+import numpy as np
+from encoding_cache import KNOWN_FACES_DIR, ENCODING_SIZE, load_encodings
+from face_index import INDEX_FILE, squared_distances, top_k, create_index, save_index, load_index
+
+UNKNOWN_NAME = "Desconhecido"
+
+
+def name_from_filename(filename):
+    """Extrai o nome da pessoa de arquivos como "ana_3.jpg" ou "ana.jpg"."""
+    name = filename.split('_')[0]  # Nome antes do "_X.jpg"
+    return os.path.splitext(name)[0]  # Remover a extensão .jpg do nome
+
+
+class FaceGallery:
+    """Galeria de rostos conhecidos em uma matriz contígua float32 (N x 128).
+
+    Cada linha tem um rótulo inteiro que aponta para `names`. As distâncias
+    de todos os rostos de um frame contra toda a galeria são calculadas de
+    uma vez com um único produto de matrizes. Para galerias grandes, um
+    índice aproximado (ver `face_index`) pode ser anexado com `attach_index`.
+    """
+
+    def __init__(self, dim=ENCODING_SIZE):
+        self.dim = dim
+        self.names = []  # rótulo -> nome
+        self.keys = []  # linha -> arquivo de origem (ou None)
+        self.index = None
+        self._label_of = {}  # nome -> rótulo
+        self.matrix = np.empty((0, dim), dtype=np.float32)
+        self.labels = np.empty(0, dtype=np.int32)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+
+    @classmethod
+    def from_encodings(cls, encodings, names, keys=None):
+        gallery = cls()
+        gallery.add(encodings, names, keys)
+        return gallery
+
+    @classmethod
+    def from_directory(cls, directory=KNOWN_FACES_DIR, extension='.jpg'):
+        """Monta a galeria a partir do cache de codificações do diretório."""
+        encodings, names, keys = [], [], []
+        for filename, encoding in load_encodings(directory):
+            if filename.endswith(extension):
+                encodings.append(encoding)
+                names.append(name_from_filename(filename))
+                keys.append(filename)
+        return cls.from_encodings(encodings, names, keys)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def label_for(self, name):
+        """Retorna o rótulo do nome, criando um novo se necessário."""
+        label = self._label_of.get(name)
+        if label is None:
+            label = len(self.names)
+            self.names.append(name)
+            self._label_of[name] = label
+        return label
+
+    def add(self, encodings, names, keys=None):
+        """Acrescenta codificações (uma por nome) à galeria e ao índice anexado."""
+        vectors = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        if len(vectors) != len(names):
+            raise ValueError("O número de codificações e de nomes deve ser igual.")
+        if not len(vectors):
+            return
+        first_row = len(self)
+        labels = np.array([self.label_for(name) for name in names], dtype=np.int32)
+        self.matrix = np.ascontiguousarray(np.vstack([self.matrix, vectors]))
+        self.labels = np.concatenate([self.labels, labels])
+        self.keys.extend(keys if keys is not None else [None] * len(vectors))
+        self._sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix)
+        if self.index is not None:
+            self.index.add(vectors, np.arange(first_row, len(self)))
+
+    def distances(self, queries):
+        """Matriz M x N de distâncias euclidianas entre as consultas e a galeria."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        return np.sqrt(squared_distances(queries, self.matrix, self._sq_norms))
+
+    def search(self, queries, k=1):
+        """Retorna (índices, distâncias) dos k vizinhos mais próximos de cada consulta.
+
+        Com um índice anexado, posições sem vizinho encontrado têm índice -1.
+        """
+        if self.index is not None:
+            return self.index.search(queries, k)
+        distances = self.distances(queries)
+        k = min(k, distances.shape[1])
+        if k == 0:
+            empty = np.empty((distances.shape[0], 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        return top_k(distances, k)
+
+    def attach_index(self, path=INDEX_FILE, kind=None, **params):
+        """Anexa um índice persistido, sincronizando-o com a galeria pelas chaves.
+
+        Linhas com chave e vetor iguais aos salvos são reaproveitadas; as
+        novas são inseridas e as removidas ou alteradas são descartadas, de
+        modo que só a diferença é processada. `kind` None usa o tipo salvo
+        (ou 'flat'); parâmetros como `nprobe` sobrescrevem os salvos.
+        """
+        index, saved_keys = load_index(path)
+        if index is None or (kind is not None and index.kind != kind):
+            index, saved_keys = create_index(kind or 'flat', self.dim), []
+        for name, value in params.items():
+            setattr(index, name, value)
+
+        row_of_key = {key: row for row, key in enumerate(self.keys) if key is not None}
+        old_ids, old_vectors = index.items()
+        rows = np.array([row_of_key.get(saved_keys[i], -1) if i < len(saved_keys) else -1
+                         for i in old_ids], dtype=np.int64)
+        valid = rows >= 0
+        valid[valid] = (self.matrix[rows[valid]] == old_vectors[valid]).all(axis=1)
+        mapping, stale, used_rows = {}, [], set()
+        for old_id, row, ok in zip(old_ids.tolist(), rows.tolist(), valid.tolist()):
+            if ok and row not in used_rows:
+                mapping[old_id] = row
+                used_rows.add(row)
+            else:
+                stale.append(old_id)
+        index.remove(stale)
+        index.remap(mapping)
+        missing = np.setdiff1d(np.arange(len(self)), np.fromiter(used_rows, dtype=np.int64))
+        index.add(self.matrix[missing], missing)
+
+        self.index = index
+        if stale or len(missing) or saved_keys != self.keys:
+            self.save_index(path)
+        return index
+
+    def save_index(self, path=INDEX_FILE):
+        save_index(self.index, path, keys=[key or '' for key in self.keys])
+
+    def identify(self, queries, threshold=0.5):
+        """Lista de (nome, distância) para cada consulta; acima do limite vira "Desconhecido"."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if not len(queries):
+            return []
+        if not len(self):
+            return [(UNKNOWN_NAME, float('inf'))] * len(queries)
+        indices, distances = self.search(queries, k=1)
+        results = []
+        for index, distance in zip(indices[:, 0], distances[:, 0]):
+            if index >= 0 and distance < threshold:
+                results.append((self.names[self.labels[index]], float(distance)))
+            else:
+                results.append((UNKNOWN_NAME, float(distance)))
+        return results
+
+    def contains(self, query, tolerance=0.5):
+        """Indica se alguma codificação da galeria está a no máximo `tolerance` da consulta."""
+        if not len(self):
+            return False
+        if self.index is not None:
+            return bool(self.search(query, k=1)[1][0, 0] <= tolerance)
+        return bool((self.distances(query)[0] <= tolerance).any())
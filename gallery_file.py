@@ -0,0 +1,440 @@
+"""Galeria compacta em disco, aberta com np.memmap e compartilhada entre processos.
+
+Formato (little-endian):
+
+    b'FGAL' | uint32 tamanho do cabeçalho | cabeçalho JSON | seções alinhadas em 64 bytes
+
+O cabeçalho traz a versão do formato, o tipo dos vetores ('float16' ou
+'int8'), a dimensão, a tabela de nomes (rótulo -> nome), o arquivo de origem
+de cada linha, a assinatura do diretório de fotos e a posição de cada
+seção: `vectors` (N x 128), `scales` (float32, só no int8: vetor = escala *
+inteiros), `labels` (int32) e `sq_norms` (float32, normas ao quadrado dos
+vetores já dequantizados). O modelo por identidade (ver identities.py) vai
+junto, no mesmo tipo: `centroids`, `templates` (com `*_scales` e
+`*_sq_norms`) e `template_start` (int64, identidade i -> linhas
+[start[i], start[i + 1]) de `templates`), com os nomes e o max_templates em
+`identities` no cabeçalho. Como as seções são lidas por np.memmap, abrir o
+arquivo é quase instantâneo e processos que abrem o mesmo arquivo dividem
+as mesmas páginas do cache do sistema, sem cópia.
+
+Uso:
+    python gallery_file.py build --dtype int8
+    python gallery_file.py check --queries 5000
+"""
+import os
+import json
+import struct
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+
+from encoding_cache import KNOWN_FACES_DIR, IMAGE_EXTENSIONS, ENCODING_SIZE, model_version, load_encodings
+from gallery import FaceGallery, UNKNOWN_NAME, name_from_filename
+from face_index import top_k
+from identities import IdentityGallery, MAX_TEMPLATES, SHORTLIST
+
+GALLERY_FILE = 'data/gallery.fgal'
+GALLERY_FORMAT_VERSION = 2
+MAGIC = b'FGAL'
+ALIGN = 64
+DTYPES = ('float16', 'int8')
+
+
+def _align(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def directory_signature(directory=KNOWN_FACES_DIR):
+    """Identifica as fotos do diretório (nome, tamanho, mtime) e o modelo de codificação."""
+    digest = hashlib.sha1(model_version().encode())
+    for filename in sorted(os.listdir(directory)):
+        if filename.lower().endswith(IMAGE_EXTENSIONS):
+            stat = os.stat(os.path.join(directory, filename))
+            digest.update(f"{filename}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()
+
+
+def quantize(matrix, dtype):
+    """Retorna (vetores no tipo compacto, escalas ou None, vetores dequantizados em float32)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if dtype == 'float16':
+        vectors = matrix.astype(np.float16)
+        return vectors, None, vectors.astype(np.float32)
+    if dtype == 'int8':
+        # Escala simétrica por linha: o maior valor absoluto de cada vetor vira ±127
+        scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.empty(0, dtype=np.float32)
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        vectors = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return vectors, scales, vectors.astype(np.float32) * scales[:, None]
+    raise ValueError(f"Tipo desconhecido: {dtype} (opções: {', '.join(DTYPES)})")
+
+
+def _quantized_sections(prefix, matrix, dtype):
+    """Seções `<prefix>`, `<prefix>_sq_norms` e, no int8, `<prefix>_scales` de uma matriz."""
+    vectors, scales, restored = quantize(np.asarray(matrix, dtype=np.float32).reshape(-1, ENCODING_SIZE), dtype)
+    arrays = {prefix: vectors, f'{prefix}_sq_norms': np.einsum('ij,ij->i', restored, restored).astype(np.float32)}
+    if scales is not None:
+        arrays[f'{prefix}_scales'] = scales
+    return arrays
+
+
+def write_gallery_file(path, matrix, labels, names, keys=None, dtype='float16', source=None, identities=None):
+    """Grava a galeria (e o modelo `identities`, se houver) no formato compacto, de forma atômica."""
+    matrix = np.asarray(matrix, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+    vectors, scales, restored = quantize(matrix, dtype)
+    arrays = {'vectors': vectors, 'labels': np.asarray(labels, dtype=np.int32),
+              'sq_norms': np.einsum('ij,ij->i', restored, restored).astype(np.float32)}
+    if scales is not None:
+        arrays['scales'] = scales
+    model = None
+    if identities is not None:
+        arrays.update(_quantized_sections('centroids', identities.centroids, dtype))
+        arrays.update(_quantized_sections('templates', identities.templates, dtype))
+        arrays['template_start'] = np.asarray(identities.template_start, dtype=np.int64)
+        model = {'names': list(identities.names), 'max_templates': identities.max_templates}
+
+    # Posições relativas ao início da primeira seção (independem do tamanho do cabeçalho)
+    sections, offset = {}, 0
+    for name, array in arrays.items():
+        sections[name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({
+        'format': GALLERY_FORMAT_VERSION, 'dtype': dtype, 'dim': ENCODING_SIZE, 'count': len(matrix),
+        'names': list(names), 'keys': [key or '' for key in keys] if keys is not None else [],
+        'model': model_version(), 'source': source, 'identities': model, 'sections': sections,
+    }).encode()
+    data_start = _align(len(MAGIC) + 4 + len(header))
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    # Temporário com nome único: bulk_enroll.py e add_faces.py podem reconstruir o arquivo ao mesmo tempo
+    fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(MAGIC + struct.pack('<I', len(header)) + header)
+            for name, array in arrays.items():
+                file.write(b'\0' * (data_start + sections[name]['offset'] - file.tell()))
+                file.write(np.ascontiguousarray(array).tobytes())
+        os.replace(tmp_file, path)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+
+
+def read_header(path):
+    """Retorna (cabeçalho, início das seções); ValueError se o arquivo não for uma galeria válida."""
+    with open(path, 'rb') as file:
+        prefix = file.read(len(MAGIC) + 4)
+        if len(prefix) < len(MAGIC) + 4 or prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError("não é um arquivo de galeria")
+        (size,) = struct.unpack('<I', prefix[len(MAGIC):])
+        header = json.loads(file.read(size))
+    if header.get('format') != GALLERY_FORMAT_VERSION:
+        raise ValueError(f"versão {header.get('format')} do formato não suportada")
+    return header, _align(len(MAGIC) + 4 + size)
+
+
+def map_sections(path):
+    """Retorna (cabeçalho, {seção: np.memmap}) de um arquivo de galeria."""
+    header, data_start = read_header(path)
+    arrays = {}
+    for name, section in header['sections'].items():
+        shape = tuple(section['shape'])
+        if not np.prod(shape):
+            arrays[name] = np.empty(shape, dtype=section['dtype'])  # mmap não aceita tamanho zero
+        else:
+            arrays[name] = np.memmap(path, dtype=section['dtype'], mode='r',
+                                     offset=data_start + section['offset'], shape=shape)
+    return header, arrays
+
+
+def dequantize(vectors, scales, rows):
+    """Linhas `rows` de uma seção mapeada, convertidas para float32."""
+    block = np.asarray(vectors[rows], dtype=np.float32)
+    if scales is not None:
+        block *= np.asarray(scales[rows])[..., None]
+    return block
+
+
+def chunked_squared_distances(queries, vectors, scales, sq_norms, chunk):
+    """Distâncias ao quadrado (M x N) contra uma seção mapeada, convertida em blocos de `chunk` linhas."""
+    q_norms = np.einsum('ij,ij->i', queries, queries)
+    squared = np.empty((len(queries), len(vectors)), dtype=np.float32)
+    for start in range(0, len(vectors), chunk):
+        end = min(start + chunk, len(vectors))
+        dots = queries @ np.asarray(vectors[start:end], dtype=np.float32).T
+        if scales is not None:
+            dots *= scales[start:end]
+        squared[:, start:end] = q_norms[:, None] + sq_norms[start:end] - 2.0 * dots
+    return np.maximum(squared, 0.0, out=squared)
+
+
+class MappedGallery:
+    """Galeria somente leitura sobre um arquivo compacto (mesma interface de consulta da FaceGallery).
+
+    Os vetores ficam no arquivo mapeado; as distâncias são calculadas em
+    blocos de `chunk` linhas convertidos para float32, então a memória
+    própria de cada processo não cresce com o tamanho da galeria.
+    """
+
+    def __init__(self, path=GALLERY_FILE, chunk=16384):
+        self.path = path
+        self.chunk = chunk
+        self.header, arrays = map_sections(path)
+        self.dtype = self.header['dtype']
+        self.dim = self.header['dim']
+        self.names = self.header['names']
+        self.keys = self.header['keys']
+        self._vectors = arrays['vectors']
+        self._scales = arrays.get('scales')
+        self.labels = arrays['labels']
+        self._sq_norms = arrays['sq_norms']
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def matrix(self):
+        """Todos os vetores dequantizados em float32 (uma cópia; use só para montar outros modelos)."""
+        return self.vectors(slice(None))
+
+    def vectors(self, rows):
+        return dequantize(self._vectors, self._scales, rows)
+
+    def squared_distances(self, queries):
+        """Matriz M x N de distâncias ao quadrado (float32) entre as consultas e a galeria."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        return chunked_squared_distances(queries, self._vectors, self._scales, self._sq_norms, self.chunk)
+
+    def distances(self, queries):
+        return np.sqrt(self.squared_distances(queries))
+
+    def search(self, queries, k=1):
+        """Retorna (índices, distâncias) dos k vizinhos mais próximos de cada consulta."""
+        squared = self.squared_distances(queries)
+        k = min(k, squared.shape[1])
+        if k == 0:
+            empty = np.empty((squared.shape[0], 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        rows, top = top_k(squared, k)
+        return rows, np.sqrt(top)
+
+    def identify(self, queries, threshold=0.5):
+        """Lista de (nome, distância) para cada consulta; acima do limite vira "Desconhecido"."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if not len(queries):
+            return []
+        if not len(self):
+            return [(UNKNOWN_NAME, float('inf'))] * len(queries)
+        rows, distances = self.search(queries, k=1)
+        results = []
+        for row, distance in zip(rows[:, 0], distances[:, 0]):
+            if distance < threshold:
+                results.append((self.names[self.labels[row]], float(distance)))
+            else:
+                results.append((UNKNOWN_NAME, float(distance)))
+        return results
+
+    def contains(self, query, tolerance=0.5):
+        if not len(self):
+            return False
+        return bool(self.squared_distances(query)[0].min() <= tolerance * tolerance)
+
+
+class MappedIdentityGallery(IdentityGallery):
+    """Modelo por identidade somente leitura, lido do arquivo compacto (mesma interface da IdentityGallery).
+
+    Centróides e modelos ficam no arquivo mapeado: o primeiro estágio
+    converte os centróides em blocos e o segundo só as linhas dos modelos
+    pré-selecionados, então vários processos usam o mesmo modelo sem que
+    cada um guarde uma cópia em float32.
+    """
+
+    def __init__(self, path=GALLERY_FILE, shortlist=SHORTLIST, chunk=16384):
+        self.header, arrays = map_sections(path)
+        model = self.header.get('identities')
+        if model is None:
+            raise ValueError("arquivo sem o modelo por identidade")
+        super().__init__(max_templates=model['max_templates'], shortlist=shortlist)
+        self.path = path
+        self.chunk = chunk
+        self.dtype = self.header['dtype']
+        self.names = model['names']
+        self.centroids = arrays['centroids']
+        self.templates = arrays['templates']
+        self.template_start = arrays['template_start']
+        self._centroid_scales = arrays.get('centroids_scales')
+        self._template_scales = arrays.get('templates_scales')
+        self._centroid_norms = arrays['centroids_sq_norms']
+        self._template_norms = arrays['templates_sq_norms']
+
+    def add_identities(self, names, encoding_groups):
+        raise TypeError("MappedIdentityGallery é somente leitura; gere o arquivo de novo com as fotos novas")
+
+    def _centroid_squared_distances(self, queries):
+        return chunked_squared_distances(queries, self.centroids, self._centroid_scales, self._centroid_norms,
+                                         self.chunk)
+
+    def _template_vectors(self, rows):
+        return dequantize(self.templates, self._template_scales, rows)
+
+
+def build_gallery_file(directory=KNOWN_FACES_DIR, path=GALLERY_FILE, dtype='float16', max_templates=MAX_TEMPLATES):
+    """Gera o arquivo (galeria e modelo por identidade) a partir do cache de codificações do diretório."""
+    gallery = FaceGallery.from_directory(directory)
+    identities = IdentityGallery.from_gallery(gallery, max_templates=max_templates)
+    write_gallery_file(path, gallery.matrix, gallery.labels, gallery.names, gallery.keys, dtype,
+                       source=directory_signature(directory), identities=identities)
+    return gallery
+
+
+def update_gallery_file(path=GALLERY_FILE, directory=KNOWN_FACES_DIR, dtype='float16', max_templates=MAX_TEMPLATES):
+    """Gera o arquivo de novo se as fotos, o modelo de codificação, o tipo ou o max_templates mudaram."""
+    try:
+        header, _ = read_header(path)
+        if (header.get('dtype') == dtype and header.get('source') == directory_signature(directory)
+                and (header.get('identities') or {}).get('max_templates') == max_templates):
+            return
+    except (OSError, ValueError) as error:
+        if os.path.exists(path):
+            print(f"Arquivo da galeria inválido ({error}). Recriando.")
+    build_gallery_file(directory, path, dtype, max_templates)
+
+
+def open_gallery(path=GALLERY_FILE, directory=KNOWN_FACES_DIR, dtype='float16', max_templates=MAX_TEMPLATES):
+    """Abre a galeria mapeada (modo 'samples'), gerando o arquivo de novo se necessário."""
+    update_gallery_file(path, directory, dtype, max_templates)
+    return MappedGallery(path)
+
+
+def open_identity_gallery(path=GALLERY_FILE, directory=KNOWN_FACES_DIR, dtype='float16',
+                          max_templates=MAX_TEMPLATES, shortlist=SHORTLIST):
+    """Abre o modelo por identidade mapeado (modo 'identities'), gerando o arquivo de novo se necessário."""
+    update_gallery_file(path, directory, dtype, max_templates)
+    return MappedIdentityGallery(path, shortlist)
+
+
+def exact_search(queries, matrix, chunk=1024):
+    """Vizinho mais próximo com distâncias em float64 (referência da verificação de precisão)."""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    queries = np.asarray(queries, dtype=np.float64)
+    sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+    rows = np.empty(len(queries), dtype=np.int64)
+    distances = np.empty(len(queries), dtype=np.float64)
+    for start in range(0, len(queries), chunk):
+        block = queries[start:start + chunk]
+        squared = np.einsum('ij,ij->i', block, block)[:, None] + sq_norms - 2.0 * (block @ matrix.T)
+        rows[start:start + chunk] = squared.argmin(axis=1)
+        distances[start:start + chunk] = np.sqrt(np.maximum(squared.min(axis=1), 0.0))
+    return rows, distances
+
+
+def accuracy_check(matrix, labels, names, mapped, queries, threshold=0.5):
+    """Compara a decisão top-1 (nome ou "Desconhecido" no limite `threshold`) com o float64.
+
+    `top1_agreement` é a fração de consultas com a mesma decisão;
+    `row_agreement`, a fração com o mesmo vizinho mais próximo.
+    """
+    labels = np.asarray(labels)
+    ref_rows, ref_distances = exact_search(queries, matrix)
+    rows, distances = mapped.search(queries, k=1)
+    rows, distances = rows[:, 0], distances[:, 0].astype(np.float64)
+
+    def decisions(found_rows, found_distances):
+        return [names[labels[row]] if distance < threshold else UNKNOWN_NAME
+                for row, distance in zip(found_rows, found_distances)]
+
+    agree = np.array(decisions(ref_rows, ref_distances)) == np.array(decisions(rows, distances))
+    errors = np.abs(distances - ref_distances)
+    return {'queries': len(queries), 'top1_agreement': float(agree.mean()) if len(agree) else 1.0,
+            'disagreements': int((~agree).sum()), 'row_agreement': float((rows == ref_rows).mean()),
+            'max_distance_error': float(errors.max()) if len(errors) else 0.0,
+            'mean_distance_error': float(errors.mean()) if len(errors) else 0.0}
+
+
+def identity_check(model, mapped, queries, threshold=0.5):
+    """Fração das consultas com a mesma decisão no modelo por identidade em float32 e no mapeado."""
+    expected = [name for name, _ in model.identify(queries, threshold)]
+    found = [name for name, _ in mapped.identify(queries, threshold)]
+    agree = np.array(expected) == np.array(found)
+    return {'queries': len(queries), 'agreement': float(agree.mean()) if len(agree) else 1.0,
+            'disagreements': int((~agree).sum())}
+
+
+def noisy_queries(matrix, count, spread=0.03, seed=1):
+    """Consultas próximas de codificações da galeria (novas fotos das mesmas pessoas)."""
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(matrix), count)
+    return np.asarray(matrix, dtype=np.float64)[rows] + rng.normal(0.0, spread, size=(count, matrix.shape[1]))
+
+
+def shell_queries(matrix, count, low, high, seed=2):
+    """Consultas a uma distância entre `low` e `high` de codificações da galeria, em direção aleatória.
+
+    Com o intervalo em torno do limite (ex.: 0.48 a 0.52) as decisões ficam
+    na fronteira, onde a quantização pode trocar o resultado; bem acima do
+    limite, são rostos desconhecidos.
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(matrix), count)
+    directions = rng.normal(size=(count, matrix.shape[1]))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    radii = rng.uniform(low, high, size=(count, 1))
+    return np.asarray(matrix, dtype=np.float64)[rows] + radii * directions
+
+
+def check_queries(matrix, count, threshold=0.5):
+    """Séries de consultas da verificação: positivas, na fronteira do limite e desconhecidas."""
+    return {'positivas': noisy_queries(matrix, count),
+            'fronteira': shell_queries(matrix, count, threshold - 0.02, threshold + 0.02),
+            'desconhecidas': shell_queries(matrix, count, threshold + 0.1, threshold + 0.4, seed=3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['build', 'check'])
+    parser.add_argument('--directory', default=KNOWN_FACES_DIR)
+    parser.add_argument('-o', '--output', default=GALLERY_FILE)
+    parser.add_argument('--dtype', choices=DTYPES, default='float16')
+    parser.add_argument('--queries', type=int, default=2000, help='consultas da verificação de precisão')
+    parser.add_argument('--threshold', type=float, default=0.5)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        gallery = build_gallery_file(args.directory, args.output, args.dtype)
+        print(f"{len(gallery)} codificações de {len(gallery.names)} pessoas gravadas em {args.output} "
+              f"({os.path.getsize(args.output) / 1024:.1f} KiB; float64 seriam "
+              f"{len(gallery) * ENCODING_SIZE * 8 / 1024:.1f} KiB).")
+        return
+
+    # Codificações reais em float64, direto do cache, como referência
+    encodings = [(filename, encoding) for filename, encoding in load_encodings(args.directory)
+                 if filename.endswith('.jpg')]
+    if not encodings:
+        print("Galeria vazia: nada para verificar.")
+        return
+    matrix = np.array([encoding for _, encoding in encodings], dtype=np.float64)
+    gallery = FaceGallery.from_encodings(matrix, [name_from_filename(filename) for filename, _ in encodings],
+                                         [filename for filename, _ in encodings])
+    model = IdentityGallery.from_gallery(gallery)
+    query_sets = check_queries(matrix, args.queries, args.threshold)
+    with tempfile.TemporaryDirectory() as directory:
+        for dtype in DTYPES:
+            path = os.path.join(directory, f'gallery_{dtype}.fgal')
+            write_gallery_file(path, matrix, gallery.labels, gallery.names, gallery.keys, dtype, identities=model)
+            mapped = MappedGallery(path)
+            mapped_model = MappedIdentityGallery(path)
+            print(f"{dtype} (arquivo de {os.path.getsize(path) / 1024:.1f} KiB):")
+            for kind, queries in query_sets.items():
+                result = accuracy_check(matrix, gallery.labels, gallery.names, mapped, queries, args.threshold)
+                print(f"  {kind}: top-1 igual ao float64 em {result['top1_agreement']:.4%} das "
+                      f"{result['queries']} consultas ({result['disagreements']} divergências), "
+                      f"erro de distância máx. {result['max_distance_error']:.2e}")
+                result = identity_check(model, mapped_model, queries.astype(np.float32), args.threshold)
+                print(f"    por identidade: decisão igual ao modelo em float32 em {result['agreement']:.4%} "
+                      f"({result['disagreements']} divergências)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import numpy as np
+from face_index import squared_distances, top_k
+from gallery import UNKNOWN_NAME
+
+# Padrões do modelo (principal.py tem os próprios ajustes: IDENTITY_MAX_TEMPLATES e IDENTITY_SHORTLIST)
+MAX_TEMPLATES = 15
+SHORTLIST = 3
+
+
+def reject_outliers(vectors, mad_factor=3.0):
+    """Remove amostras muito distantes do centro da identidade (mediana + k * MAD)."""
+    if len(vectors) < 3:
+        return vectors
+    center = np.median(vectors, axis=0)
+    distances = np.linalg.norm(vectors - center, axis=1)
+    median = np.median(distances)
+    mad = np.median(np.abs(distances - median))
+    # Piso para o MAD evita descartar tudo quando as amostras são quase idênticas
+    keep = distances <= median + mad_factor * max(mad, 0.01)
+    return vectors[keep]
+
+
+def select_templates(vectors, centroid, count):
+    """Escolhe até `count` amostras representativas por amostragem do ponto mais distante."""
+    if len(vectors) <= count:
+        return vectors
+    # Começa pela amostra mais próxima do centróide e cobre o restante da variação
+    chosen = [int(np.argmin(np.linalg.norm(vectors - centroid, axis=1)))]
+    nearest = np.linalg.norm(vectors - vectors[chosen[0]], axis=1)
+    while len(chosen) < count:
+        candidate = int(np.argmax(nearest))
+        chosen.append(candidate)
+        nearest = np.minimum(nearest, np.linalg.norm(vectors - vectors[candidate], axis=1))
+    return vectors[chosen]
+
+
+class IdentityGallery:
+    """Modelo por identidade: um centróide e até `max_templates` amostras representativas.
+
+    A comparação é feita em dois estágios: primeiro contra os centróides de
+    todas as pessoas e, depois, só contra os modelos (fotos reais) das
+    `shortlist` identidades mais próximas; o limite vale para essas fotos,
+    como na FaceGallery. O custo passa a depender do número de
+    pessoas, e não do número de fotos, e fotos ruins são descartadas na
+    montagem do modelo.
+    """
+
+    def __init__(self, max_templates=MAX_TEMPLATES, shortlist=SHORTLIST, mad_factor=3.0):
+        self.max_templates = max_templates
+        self.shortlist = shortlist
+        self.mad_factor = mad_factor
+        self.names = []
+        self.centroids = np.empty((0, 128), dtype=np.float32)
+        self.templates = np.empty((0, 128), dtype=np.float32)
+        self.template_start = np.zeros(1, dtype=np.int64)  # identidade i -> linhas [start[i], start[i + 1])
+        self._identities = {}  # nome -> identidade
+        self._counts = []  # fotos aceitas por identidade, para somar novas fotos ao centróide
+        self._identity_templates = []
+
+    @classmethod
+    def from_gallery(cls, gallery, **params):
+        """Monta o modelo a partir das codificações de uma FaceGallery."""
+        model = cls(**params)
+        matrix = gallery.matrix
+        # Agrupa as linhas por rótulo com uma única ordenação
+        order = np.argsort(gallery.labels, kind='stable')
+        bounds = np.searchsorted(gallery.labels[order], np.arange(len(gallery.names) + 1))
+        names, groups = [], []
+        for label, name in enumerate(gallery.names):
+            rows = order[bounds[label]:bounds[label + 1]]
+            if len(rows):
+                names.append(name)
+                groups.append(matrix[rows])
+        model.add_identities(names, groups)
+        return model
+
+    def __len__(self):
+        return len(self.names)
+
+    def add_identities(self, names, encoding_groups):
+        """Agrega as codificações de cada pessoa (um grupo por nome) em centróide e modelos.
+
+        Um nome já presente não vira uma segunda identidade: as fotos novas entram
+        no centróide existente e os modelos são escolhidos de novo entre os
+        antigos e as fotos novas.
+        """
+        centroids = list(self.centroids)
+        for name, encodings in zip(names, encoding_groups):
+            vectors = reject_outliers(np.asarray(encodings, dtype=np.float32).reshape(-1, 128), self.mad_factor)
+            if not len(vectors):
+                continue
+            identity = self._identities.get(name)
+            if identity is None:
+                identity = self._identities[name] = len(self.names)
+                self.names.append(name)
+                self._counts.append(0)
+                self._identity_templates.append(np.empty((0, 128), dtype=np.float32))
+                centroids.append(np.zeros(128, dtype=np.float32))
+            count = self._counts[identity] + len(vectors)
+            centroid = (centroids[identity] * self._counts[identity] + vectors.sum(axis=0)) / count
+            pool = np.vstack([self._identity_templates[identity], vectors])
+            # O centróide serve só para a pré-seleção: como modelo, ficaria mais perto de
+            # qualquer consulta do que as fotos reais e afrouxaria o limite de distância
+            self._identity_templates[identity] = select_templates(pool, centroid, self.max_templates)
+            self._counts[identity] = count
+            centroids[identity] = centroid
+        if centroids:
+            self._stack(centroids)
+
+    def _stack(self, centroids):
+        """Reúne centróides e modelos em matrizes contíguas, na ordem das identidades."""
+        sizes = [len(templates) for templates in self._identity_templates]
+        self.centroids = np.ascontiguousarray(np.vstack(centroids), dtype=np.float32)
+        self.templates = np.ascontiguousarray(np.vstack(self._identity_templates), dtype=np.float32)
+        self.template_start = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self._centroid_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        self._template_norms = np.einsum('ij,ij->i', self.templates, self.templates)
+
+    def _centroid_squared_distances(self, queries):
+        return squared_distances(queries, self.centroids, self._centroid_norms)
+
+    def _template_vectors(self, rows):
+        return self.templates[rows]
+
+    def match(self, queries):
+        """Retorna (identidade, distância) da melhor correspondência de cada consulta."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, 128)
+        best = np.full(len(queries), -1, dtype=np.int64)
+        best_distances = np.full(len(queries), np.inf, dtype=np.float32)
+        if not len(self) or not len(queries):
+            return best, best_distances
+
+        # Estágio 1: centróides de todas as identidades
+        shortlist = min(self.shortlist, len(self))
+        candidates, _ = top_k(self._centroid_squared_distances(queries), shortlist)
+
+        # Estágio 2: somente os modelos das identidades pré-selecionadas
+        starts, ends = self.template_start[candidates], self.template_start[candidates + 1]
+        for q, query in enumerate(queries):
+            rows = np.concatenate([np.arange(start, end) for start, end in zip(starts[q], ends[q])])
+            owners = np.repeat(candidates[q], ends[q] - starts[q])
+            squared = squared_distances(query[None, :], self._template_vectors(rows), self._template_norms[rows])[0]
+            nearest = int(np.argmin(squared))
+            best[q] = owners[nearest]
+            best_distances[q] = np.sqrt(squared[nearest])
+        return best, best_distances
+
+    def identify(self, queries, threshold=0.5):
+        """Lista de (nome, distância) para cada consulta; acima do limite vira "Desconhecido"."""
+        identities, distances = self.match(queries)
+        results = []
+        for identity, distance in zip(identities, distances):
+            if identity >= 0 and distance < threshold:
+                results.append((self.names[identity], float(distance)))
+            else:
+                results.append((UNKNOWN_NAME, float(distance)))
+        return results
@@ -0,0 +1,305 @@
+import os
+import io
+import math
+import bisect
+import time
+import tempfile
+import pstats
+import cProfile
+import datetime
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+METRICS_FILE = 'data/metrics.prom'
+PROFILE_DIR = 'data/profiles'
+METRICS_PORT = 9108
+
+# Limites dos buckets dos histogramas, em segundos (como no Prometheus)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+STAGES = ('capture', 'detect', 'encode', 'match', 'log', 'render')
+COUNTERS = ('frames', 'frames_dropped', 'frames_skipped', 'faces_seen', 'faces_recognized', 'faces_unknown')
+
+
+class _NullTimer:
+    """Contexto que não faz nada (métricas desligadas)."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    """Histograma cumulativo por buckets mais uma janela circular das últimas `window` amostras.
+
+    Os buckets seguem a semântica do Prometheus (contagens desde o início);
+    a janela dá os percentis recentes (p50/p95/p99) sem guardar o histórico.
+    """
+
+    def __init__(self, buckets=BUCKETS, window=1024):
+        # Listas e bisect: no caminho quente, operações escalares do NumPy custariam vários µs
+        self.bounds = tuple(buckets)
+        self.bucket_counts = [0] * (len(buckets) + 1)  # último = +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.drops = 0  # itens descartados neste estágio (filas cheias, frames atrasados)
+        self._window = [0.0] * window
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(self.bounds, seconds)] += 1
+            self._window[self.count % len(self._window)] = seconds
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def drop(self, count=1):
+        with self._lock:
+            self.drops += count
+
+    def snapshot(self):
+        with self._lock:
+            recent = np.array(self._window[:min(self.count, len(self._window))])
+            return list(self.bucket_counts), self.count, self.total, recent
+
+    def summary(self):
+        _, count, total, recent = self.snapshot()
+        if not count:
+            return {'count': 0, 'avg_ms': 0.0, 'max_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0,
+                    'drops': self.drops}
+        p50, p95, p99 = 1000.0 * np.percentile(recent, (50, 95, 99))
+        return {'count': count, 'avg_ms': 1000.0 * total / count, 'max_ms': 1000.0 * self.max,
+                'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99), 'drops': self.drops}
+
+
+class Metrics:
+    """Registro de tempos por estágio, contadores e captura de perfil sob demanda.
+
+    Desligado (`enabled=False`), `timer()` devolve um contexto vazio
+    compartilhado e `observe()`/`inc()` retornam de imediato, então os pontos
+    de medição podem ficar no caminho quente. `tick()` deve ser chamado uma
+    vez por frame pela thread do laço principal: é ali que o cProfile é
+    ligado e desligado (ele mede só a thread que o ligou).
+    """
+
+    def __init__(self, enabled=True, window=1024, profile_dir=PROFILE_DIR):
+        self.enabled = enabled
+        self.window = window
+        self.profile_dir = profile_dir
+        self.started_at = time.time()
+        self.histograms = {stage: Histogram(window=window) for stage in STAGES}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self._lock = threading.Lock()
+        self._profile_request = None
+        self._profiler = None
+        self._profile_until = 0.0
+
+    def timer(self, stage):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self._histogram(stage))
+
+    def _histogram(self, stage):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, Histogram(window=self.window))
+        return histogram
+
+    def observe(self, stage, seconds):
+        if self.enabled:
+            self._histogram(stage).observe(seconds)
+
+    def drop(self, stage, count=1):
+        """Conta itens descartados em um estágio (e no total de frames descartados)."""
+        if self.enabled:
+            self._histogram(stage).drop(count)
+            self.inc('frames_dropped', count)
+
+    def inc(self, counter, amount=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def count_faces(self, faces, unknown_name="Desconhecido"):
+        """Atualiza os contadores de rostos vistos, reconhecidos e desconhecidos."""
+        if not self.enabled:
+            return
+        unknown = sum(1 for face in faces if face.name == unknown_name)
+        with self._lock:
+            self.counters['faces_seen'] += len(faces)
+            self.counters['faces_unknown'] += unknown
+            self.counters['faces_recognized'] += len(faces) - unknown
+
+    # Perfil sob demanda
+
+    def request_profile(self, seconds=10.0):
+        """Pede uma captura do cProfile de `seconds` segundos (começa no próximo `tick()`)."""
+        self._profile_request = seconds
+
+    def tick(self):
+        if self._profile_request is None and self._profiler is None:
+            return
+        now = time.perf_counter()
+        if self._profiler is None:
+            seconds, self._profile_request = self._profile_request, None
+            self._profiler = cProfile.Profile()
+            self._profile_until = now + seconds
+            self._profiler.enable()
+            print(f"Perfil: capturando {seconds:g} s.")
+        elif now >= self._profile_until:
+            self._profiler.disable()
+            path = self._save_profile(self._profiler)
+            self._profiler = None
+            print(f"Perfil salvo em {path} (resumo em {path}.txt).")
+
+    def _save_profile(self, profiler):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, datetime.datetime.now().strftime("profile_%Y%m%d_%H%M%S.prof"))
+        profiler.dump_stats(path)
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(30)
+        with open(path + '.txt', 'w') as file:
+            file.write(text.getvalue())
+        return path
+
+    # Exportação
+
+    def summary(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {'counters': counters,
+                'stages': {stage: histogram.summary() for stage, histogram in self.histograms.items()}}
+
+    def prometheus_text(self):
+        """Métricas no formato de texto do Prometheus."""
+        lines = ['# HELP face_stage_seconds Duração de cada estágio do reconhecimento.',
+                 '# TYPE face_stage_seconds histogram']
+        recent = ['# HELP face_stage_recent_seconds Percentis das últimas amostras de cada estágio.',
+                  '# TYPE face_stage_recent_seconds gauge']
+        for stage, histogram in self.histograms.items():
+            buckets, count, total, window = histogram.snapshot()
+            cumulative = np.cumsum(buckets)
+            for bound, value in zip(histogram.bounds, cumulative):
+                lines.append(f'face_stage_seconds_bucket{{stage="{stage}",le="{bound:g}"}} {value}')
+            lines.append(f'face_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'face_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'face_stage_seconds_count{{stage="{stage}"}} {count}')
+            if count:
+                for quantile, value in zip((0.5, 0.95, 0.99), np.percentile(window, (50, 95, 99))):
+                    recent.append(f'face_stage_recent_seconds{{stage="{stage}",quantile="{quantile}"}} {value:.6f}')
+        with self._lock:
+            counters = dict(self.counters)
+        for counter, value in counters.items():
+            lines.append(f'# TYPE face_{counter}_total counter')
+            lines.append(f'face_{counter}_total {value}')
+        lines.append('# TYPE face_uptime_seconds gauge')
+        lines.append(f'face_uptime_seconds {time.time() - self.started_at:.1f}')
+        return '\n'.join(lines + recent) + '\n'
+
+
+class MetricsFileExporter:
+    """Grava periodicamente as métricas em um arquivo .prom (coletor de arquivos de texto do node_exporter)."""
+
+    def __init__(self, metrics, path=METRICS_FILE, interval=5.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._last_time = 0.0
+
+    def maybe_export(self):
+        now = time.perf_counter()
+        if not self.metrics.enabled or now - self._last_time < self.interval:
+            return
+        self._last_time = now
+        self.export()
+
+    def export(self):
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        # Temporário com nome único: principal.py e server.py podem exportar para o mesmo arquivo
+        fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(self.path) + '.', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as file:
+                file.write(self.metrics.prometheus_text())
+            os.chmod(tmp_file, 0o644)  # mkstemp cria com 0600; o node_exporter costuma rodar com outro usuário
+            os.replace(tmp_file, self.path)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+
+    def close(self):
+        if self.metrics.enabled:
+            self.export()
+
+
+class MetricsServer:
+    """Endpoint HTTP local: GET /metrics (texto do Prometheus) e GET /profile?seconds=N."""
+
+    def __init__(self, metrics, port=METRICS_PORT, host='127.0.0.1'):
+        self.metrics = metrics
+        metrics_ref = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/metrics':
+                    body, status = metrics_ref.prometheus_text().encode(), 200
+                elif url.path == '/profile':
+                    try:
+                        seconds = float(parse_qs(url.query).get('seconds', ['10'])[0])
+                    except ValueError:
+                        seconds = math.nan
+                    if math.isfinite(seconds) and seconds > 0:
+                        metrics_ref.request_profile(seconds)
+                        body, status = f"Perfil de {seconds:g} s solicitado.\n".encode(), 202
+                    else:
+                        body, status = b"Parametro seconds invalido.\n", 400
+                else:
+                    body, status = b"Nao encontrado.\n", 404
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Sem uma linha no terminal a cada coleta
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def maybe_export(self):
+        pass  # Servidor responde sob demanda
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,136 @@
+import threading
+import cv2
+import numpy as np
+
+# Decisões do portão de movimento
+SKIP = 'skip'  # Nada mudou: reaproveita o último resultado
+REGIONS = 'regions'  # Mudança localizada: detecta só nas regiões alteradas (e em volta dos rostos conhecidos)
+FULL = 'full'  # Mudança grande, primeiro frame ou resultado velho demais: passada completa
+
+
+class MotionGate:
+    """Decide, com uma comparação barata em baixa resolução, se um frame precisa de detecção.
+
+    O frame é reduzido para `width` pixels de largura em tons de cinza e
+    comparado com o último frame efetivamente processado ('diff') ou passado
+    por um subtrator de fundo MOG2 ('mog2'). Menos de `min_changed` (fração
+    dos pixels) alterados: o frame é pulado. Mudança acima de `full_changed`:
+    passada completa. Entre os dois, só as regiões alteradas são examinadas
+    (ou o frame inteiro, se forem mais de `max_regions`).
+    Depois de `max_stale` frames sem passada completa, uma é forçada.
+    """
+
+    def __init__(self, mode='diff', width=160, pixel_threshold=25, min_changed=0.002, full_changed=0.25,
+                 max_stale=30, region_margin=0.5, min_region=0.25, min_component=6, max_regions=4):
+        if mode not in ('diff', 'mog2'):
+            raise ValueError(f"Modo de detecção de movimento desconhecido: {mode}")
+        self.mode = mode
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.full_changed = full_changed
+        self.max_stale = max_stale
+        self.region_margin = region_margin
+        self.min_region = min_region  # Lado mínimo da região, como fração da altura do frame
+        self.min_component = min_component  # Áreas menores (em pixels da imagem reduzida) são ruído
+        self.max_regions = max_regions  # Mais regiões que isso: uma passada completa sai mais barata
+        self._reference = None
+        self._subtractor = cv2.createBackgroundSubtractorMOG2(history=300, detectShadows=False) if mode == 'mog2' else None
+        self._kernel = np.ones((3, 3), np.uint8)
+        self._since_full = 0
+        self._lock = threading.Lock()
+        self.counts = {SKIP: 0, REGIONS: 0, FULL: 0, 'forced': 0}
+        self.gate_seconds = 0.0
+        self._inference = {REGIONS: [0, 0.0], FULL: [0, 0.0]}  # decisão -> [frames, segundos]
+
+    def _small_gray(self, frame):
+        factor = self.width / frame.shape[1]
+        small = cv2.resize(frame, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0), factor
+
+    def _changed_mask(self, gray):
+        if self._subtractor is not None:
+            mask = self._subtractor.apply(gray)
+        elif self._reference is None:
+            return None
+        else:
+            mask = cv2.absdiff(gray, self._reference)
+            mask = cv2.threshold(mask, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1]
+        return cv2.dilate(mask, self._kernel, iterations=2)
+
+    def _regions(self, mask, factor, shape):
+        """Caixas (top, right, bottom, left) das áreas alteradas, na resolução original."""
+        height, width = shape[:2]
+        count, _, boxes, _ = cv2.connectedComponentsWithStats(mask)
+        minimum = self.min_region * height
+        regions = []
+        for x, y, w, h, area in boxes[1:count]:
+            if area < self.min_component:
+                continue
+            # Amplia cada área (a mudança pode ser só parte do rosto) e garante um tamanho mínimo
+            cx, cy = (x + w / 2) / factor, (y + h / 2) / factor
+            half_w = max(w / factor * (1 + 2 * self.region_margin), minimum) / 2
+            half_h = max(h / factor * (1 + 2 * self.region_margin), minimum) / 2
+            regions.append((max(int(cy - half_h), 0), min(int(cx + half_w), width),
+                            min(int(cy + half_h), height), max(int(cx - half_w), 0)))
+        return regions
+
+    def check(self, frame):
+        """Retorna (decisão, regiões); `regiões` só é preenchida na decisão REGIONS."""
+        with self._lock:
+            start = cv2.getTickCount()
+            gray, factor = self._small_gray(frame)
+            mask = self._changed_mask(gray)
+            if mask is None:
+                decision, regions = FULL, []
+            else:
+                changed = cv2.countNonZero(mask) / mask.size
+                if self._since_full >= self.max_stale:
+                    decision, regions = FULL, []
+                    self.counts['forced'] += 1
+                elif changed < self.min_changed:
+                    decision, regions = SKIP, []
+                elif changed >= self.full_changed:
+                    decision, regions = FULL, []
+                else:
+                    regions = self._regions(mask, factor, frame.shape)
+                    if not regions:
+                        decision = SKIP
+                    elif len(regions) > self.max_regions:
+                        decision, regions = FULL, []
+                    else:
+                        decision = REGIONS
+
+            self.counts[decision] += 1
+            self._since_full = 0 if decision == FULL else self._since_full + 1
+            # No modo 'diff' a referência é o último frame processado: mudanças lentas se acumulam
+            if decision != SKIP:
+                self._reference = gray
+            self.gate_seconds += (cv2.getTickCount() - start) / cv2.getTickFrequency()
+            return decision, regions
+
+    def record_inference(self, decision, seconds):
+        """Registra o custo da inferência feita após `decision` (usado na estimativa de economia)."""
+        with self._lock:
+            self._inference[decision][0] += 1
+            self._inference[decision][1] += seconds
+
+    def summary(self):
+        """Frames pulados/restritos/completos e estimativa do tempo de CPU economizado."""
+        with self._lock:
+            full_frames, full_seconds = self._inference[FULL]
+            region_frames, region_seconds = self._inference[REGIONS]
+            frames = sum(self.counts[decision] for decision in (SKIP, REGIONS, FULL))
+            full_average = full_seconds / full_frames if full_frames else 0.0
+            # Cada frame pulado economiza uma passada completa; cada restrito, a diferença de custo
+            saved = self.counts[SKIP] * full_average + max(region_frames * full_average - region_seconds, 0.0)
+            saved = max(saved - self.gate_seconds, 0.0)
+            # Custo estimado sem o portão: todos os frames com passada completa
+            ungated = frames * full_average
+            return {'frames': frames, 'skipped': self.counts[SKIP], 'restricted': self.counts[REGIONS],
+                    'full': self.counts[FULL], 'forced': self.counts['forced'],
+                    'gate_ms': 1000.0 * self.gate_seconds / frames if frames else 0.0,
+                    'full_ms': 1000.0 * full_average,
+                    'saved_seconds': saved,
+                    'saved_fraction': min(saved / ungated, 1.0) if ungated else 0.0}
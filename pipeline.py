@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import tempfile
+import queue
+import threading
+from collections import namedtuple
+from recognizer import RecognizedFace
+from metrics import Metrics
+
+# Frame capturado: número sequencial, instante da captura (perf_counter) e imagem BGR
+CapturedFrame = namedtuple('CapturedFrame', ['frame_id', 'captured_at', 'image'])
+
+# Resultado de um frame: o frame capturado e a lista de RecognizedFace
+FrameResult = namedtuple('FrameResult', ['frame', 'faces'])
+
+
+class MetricsPublisher:
+    """Grava periodicamente um resumo JSON de um registro `Metrics` (lido pelo painel app.py)."""
+
+    def __init__(self, path, interval=2.0):
+        self.path = path
+        self.interval = interval
+        self._last_time = time.perf_counter()
+        self._last_frames = 0
+
+    def maybe_publish_metrics(self, metrics, frames_stage='render'):
+        if time.perf_counter() - self._last_time < self.interval:
+            return
+        summary = metrics.summary()
+        counters = summary['counters']
+        # Nomes dos contadores que o painel já conhece
+        dashboard = {'faces': counters['faces_seen'], 'recognized': counters['faces_recognized'],
+                     'unknown': counters['faces_unknown'], 'skipped_frames': counters['frames_skipped'],
+                     'dropped_frames': counters['frames_dropped'],
+                     'encodes_saved': counters.get('encodes_skipped', 0)}
+        self._write(time.perf_counter(), summary['stages'], dashboard, frames_stage)
+
+    def _write(self, now, summary, counters, frames_stage):
+        frames = summary[frames_stage]['count'] if frames_stage in summary else 0
+        payload = {
+            'updated_at': time.time(),
+            'fps': (frames - self._last_frames) / (now - self._last_time),
+            'counters': dict(counters),
+            'stages': summary,
+        }
+        self._last_time, self._last_frames = now, frames
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        # Temporário com nome único: principal.py e server.py publicam no mesmo arquivo
+        fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(self.path) + '.', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(payload, file)
+            os.chmod(tmp_file, 0o644)  # mkstemp cria com 0600; o painel pode rodar com outro usuário
+            os.replace(tmp_file, self.path)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+
+
+class LatestFrameGrabber(threading.Thread):
+    """Lê a câmera continuamente e guarda só o frame mais novo.
+
+    Frames não consumidos antes da chegada do próximo são descartados, de
+    modo que o buffer do driver nunca acumula atraso. Com `pace_fps`, a
+    leitura é limitada a esse ritmo (arquivos de vídeo simulando câmeras).
+    Tempos de leitura e descartes vão para o estágio `stage` de `metrics`.
+    """
+
+    def __init__(self, video, metrics=None, pace_fps=None, name='frame-grabber', stage='capture'):
+        super().__init__(name=name, daemon=True)
+        self.video = video
+        self.metrics = metrics or Metrics(enabled=False)
+        self.stage = stage
+        self.pace = 1.0 / pace_fps if pace_fps else None
+        self.finished = False
+        self._latest = None
+        self._consumed = True
+        self._stop_event = threading.Event()
+        self._condition = threading.Condition()
+
+    def run(self):
+        frame_id = 0
+        next_read = time.perf_counter()
+        while not self._stop_event.is_set():
+            if self.pace is not None:
+                next_read += self.pace
+                self._stop_event.wait(max(next_read - time.perf_counter(), 0.0))
+            start = time.perf_counter()
+            ret, image = self.video.read()
+            if not ret:
+                print("Falha ao capturar o vídeo")
+                break
+            self.metrics.observe(self.stage, time.perf_counter() - start)
+            self.metrics.inc('frames')
+            frame_id += 1
+            with self._condition:
+                if not self._consumed:
+                    self.metrics.drop(self.stage)
+                self._latest = CapturedFrame(frame_id, time.perf_counter(), image)
+                self._consumed = False
+                self._condition.notify_all()
+        with self._condition:
+            self.finished = True
+            self._condition.notify_all()
+
+    @property
+    def ready(self):
+        """Há um frame novo ainda não consumido."""
+        return not self._consumed
+
+    def take(self, timeout=None):
+        """Retorna o frame mais novo ainda não consumido (ou None no fim/tempo esgotado)."""
+        with self._condition:
+            ready = self._condition.wait_for(lambda: not self._consumed or self.finished, timeout)
+            if not ready or self._consumed:
+                return None
+            self._consumed = True
+            return self._latest
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class RecognitionPipeline:
+    """Pipeline captura -> detecção/codificação/comparação -> exibição.
+
+    Uma thread lê a câmera (guardando só o frame mais novo), um conjunto de
+    workers roda a detecção, a codificação e a comparação (o dlib libera o
+    GIL) e os resultados vão para uma fila limitada que, quando cheia,
+    descarta o resultado mais antigo. A exibição consome `next_result()` na
+    thread principal (exigência do `cv2.imshow`). Tempos e descartes de
+    cada estágio vão para o `Metrics` do reconhecedor (que deve estar ligado).
+    """
+
+    def __init__(self, video, recognizer, workers=2, queue_size=2):
+        self.recognizer = recognizer
+        self.metrics = recognizer.metrics
+        self.grabber = LatestFrameGrabber(video, metrics=self.metrics)
+        self.results = queue.Queue(maxsize=queue_size)
+        self.workers = [threading.Thread(target=self._work, name=f'recognizer-{i}', daemon=True)
+                        for i in range(workers)]
+        self._last_rendered = 0
+        self._stop_event = threading.Event()
+
+    def start(self):
+        self.grabber.start()
+        for worker in self.workers:
+            worker.start()
+        return self
+
+    def _work(self):
+        while not self._stop_event.is_set():
+            frame = self.grabber.take(timeout=0.1)
+            if frame is None:
+                if self.grabber.finished:
+                    break
+                continue
+            start = time.perf_counter()
+            locations, matches = self.recognizer.detect_and_identify(frame.image)
+            faces = [RecognizedFace(location, name, distance, None)
+                     for location, (name, distance) in zip(locations, matches)]
+            self.metrics.observe('recognize', time.perf_counter() - start)
+            self._put(FrameResult(frame, faces))
+
+    def _put(self, result):
+        # Fila cheia: descarta o resultado mais antigo em favor do mais novo
+        while True:
+            try:
+                self.results.put_nowait(result)
+                return
+            except queue.Full:
+                try:
+                    self.results.get_nowait()
+                    self.metrics.drop('recognize')
+                except queue.Empty:
+                    pass
+
+    @property
+    def running(self):
+        workers_alive = any(worker.is_alive() for worker in self.workers)
+        return not self._stop_event.is_set() and (workers_alive or not self.results.empty())
+
+    def next_result(self, timeout=0.05):
+        """Retorna o resultado mais novo disponível (ou None); resultados mais antigos que o último exibido são descartados."""
+        try:
+            result = self.results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        # Esvazia a fila ficando só com o resultado mais novo
+        while True:
+            try:
+                newer = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.metrics.drop('render')
+            if newer.frame.frame_id > result.frame.frame_id:
+                result = newer
+        # Com vários workers os resultados podem chegar fora de ordem
+        if result.frame.frame_id < self._last_rendered:
+            self.metrics.drop('render')
+            return None
+        self._last_rendered = result.frame.frame_id
+        return result
+
+    def record_render(self, result, render_seconds):
+        """Registra o custo da exibição e a latência da captura até a tela."""
+        self.metrics.observe('render', render_seconds)
+        self.metrics.observe('end_to_end', time.perf_counter() - result.frame.captured_at)
+
+    def stop(self):
+        self._stop_event.set()
+        self.grabber.stop()
+        self.grabber.join(timeout=1.0)
+        for worker in self.workers:
+            worker.join(timeout=1.0)
+
+    def summary(self):
+        stages = self.metrics.summary()['stages']
+        return {name: stages[name] for name in ('capture', 'recognize', 'render', 'end_to_end') if name in stages}
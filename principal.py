@@ -1,134 +1,276 @@
 import os
 import cv2
-import face_recognition
-import numpy as np
 import datetime
-import json
+import signal
+import time
+from gallery import FaceGallery
+from face_index import INDEX_FILE
+from gallery_file import GALLERY_FILE, open_gallery, open_identity_gallery
+from identities import IdentityGallery
+from recognizer import FaceRecognizer
+from tracking import FaceTracker
+from pipeline import RecognitionPipeline, MetricsPublisher
+from detection import FaceDetector
+from detector_select import resolve_backend
+from motion_gate import MotionGate
+from face_quality import (FaceQualityGate, QUALITY_MIN_SIZE, QUALITY_MIN_SHARPNESS, QUALITY_MAX_YAW,
+                          QUALITY_MIN_EYE_SPAN)
+from renderer import OverlayRenderer, ThumbnailCache
+from metrics import Metrics, MetricsFileExporter, MetricsServer, METRICS_PORT
+from event_log import RecognitionLog, JsonlEventStore
+from attendance_store import AttendanceStore, ATTENDANCE_DB
 
 # Configuração dos diretórios
 KNOWN_FACES_DIR = 'data/known_faces'
-RECOGNITION_LOG_FILE = 'recognition_log.json'
+RECOGNITION_LOG_FILE = 'recognition_log.jsonl'
+LEGACY_LOG_FILE = 'recognition_log.json'
+METRICS_FILE = 'data/pipeline_metrics.json'  # Resumo de FPS e latências lido pelo app.py
+LOG_BACKEND = 'sqlite'  # 'sqlite' (data/attendance.db, lido pelo app.py) ou 'jsonl' (recognition_log.jsonl)
+
+# Comparação: 'identities' (centróide + modelos por pessoa, em dois estágios) ou 'samples' (todas as fotos)
+MATCH_MODE = 'identities'
+# Modelo por identidade: fotos mantidas por pessoa (das mais variadas) e pessoas comparadas no segundo
+# estágio. Com menos fotos, rostos novos perto do limite deixam de ser reconhecidos; o valor de
+# max_templates deve manter o reconhecimento do modo 'samples' (ver benchmarks/bench_identities.py --templates)
+IDENTITY_MAX_TEMPLATES = 15
+IDENTITY_SHORTLIST = 3
+
+# Índice da galeria no modo 'samples': 'flat' (busca exata) ou 'ivf' (aproximada, para galerias muito grandes)
+GALLERY_INDEX = 'flat'
+IVF_NPROBE = 8  # Listas visitadas por consulta no 'ivf': mais listas = mais recall e mais latência
+
+# Armazenamento da galeria (ou do modelo por identidade): None (float32 na memória do processo) ou
+# 'float16'/'int8' (data/gallery.fgal, mapeado em memória e compartilhado entre processos; ver gallery_file.py)
+GALLERY_FILE_DTYPE = None
+
+# Detector: 'hog', 'cnn', 'mediapipe', 'haar', 'dnn' (modelo em models/) ou 'auto' (o mais rápido que
+# encontra ao menos DETECTOR_RECALL dos rostos das fotos de data/known_faces; ver detector_select.py)
+DETECTOR_BACKEND = 'hog'
+DETECTOR_RECALL = 0.9
+
+# Detecção em escala reduzida (1.0 = frame inteiro) e busca restrita às posições já conhecidas
+DETECTION_SCALE = 0.5
+DETECTION_ROI = True
+FULL_SWEEP_EVERY = 10  # Varredura do frame inteiro a cada N detecções no modo ROI
+
+# Rastreamento: detecção + codificação só a cada DETECT_EVERY frames (ou quando uma trilha se perde)
+TRACKING = True
+DETECT_EVERY = 5
+TRACKER_TYPE = 'kcf'  # Rastreador do OpenCV entre detecções ('kcf', 'csrt', 'mil' ou None)
+
+# Portão de movimento: frames sem mudança reaproveitam o último resultado (sala parada custa quase nada)
+MOTION_GATE = True
+MOTION_MODE = 'diff'  # 'diff' (diferença para o último frame processado) ou 'mog2' (subtração de fundo)
+MAX_STALE_FRAMES = 30  # Passada completa forçada depois de N frames sem uma
+
+# Portão de qualidade: rostos pequenos, borrados ou de perfil não são codificados. Os limites
+# (QUALITY_MIN_SIZE, QUALITY_MIN_SHARPNESS, QUALITY_MAX_YAW, QUALITY_MIN_EYE_SPAN) ficam em face_quality.py
+QUALITY_GATE = True
+
+# Exibição: caixas e painel lateral com as miniaturas das pessoas reconhecidas (False = sem janela)
+RENDER = True
+THUMBNAIL_SIZE = 100
+PANEL_COLUMNS = 2
+
+# Instrumentação: tempos por estágio e contadores no formato do Prometheus
+METRICS_EXPORT = 'file'  # 'file' (data/metrics.prom), 'http' (http://127.0.0.1:9108/metrics) ou None (sem exportação)
+PROMETHEUS_FILE = 'data/metrics.prom'
+PROFILE_SECONDS = 10  # Duração do cProfile pedido com `kill -USR1 <pid>` (ou GET /profile no modo 'http')
+
+# Pipeline em threads (captura, reconhecimento e exibição em paralelo); substitui o rastreamento
+PIPELINE = False
+PIPELINE_WORKERS = 2
 
 if not os.path.exists(KNOWN_FACES_DIR):
     os.makedirs(KNOWN_FACES_DIR)
 
 # Função para carregar rostos conhecidos
 def load_known_faces():
-    known_faces = []
-    known_names = []
-    for filename in os.listdir(KNOWN_FACES_DIR):
-        if filename.endswith('.jpg'):
-            name = filename.split('_')[0]  # Nome antes do "_X.jpg"
-            name = os.path.splitext(name)[0]  # Remover a extensão .jpg do nome
-            img_path = os.path.join(KNOWN_FACES_DIR, filename)
-            # Carregar imagem e calcular as "encodings"
-            image = face_recognition.load_image_file(img_path)
-            encodings = face_recognition.face_encodings(image)
-            if encodings:  # Verifica se encontrou um rosto
-                known_faces.append(encodings[0])
-                known_names.append(name)
-    return known_faces, known_names
-
-def create_panel(frame, name):
-    person_image_path = os.path.join(KNOWN_FACES_DIR, f"{name}.jpg")
-    if os.path.exists(person_image_path):
-        person_image = cv2.imread(person_image_path)
-        person_image = cv2.resize(person_image, (200, 200))  # Ajuste o tamanho da foto
-        panel_height = max(frame.shape[0], 200)
-        panel_width = frame.shape[1] + 200
-        panel = np.zeros((panel_height, panel_width, 3), dtype=np.uint8)
-        panel[:frame.shape[0], :frame.shape[1]] = frame
-        panel[:200, frame.shape[1]:] = person_image
-        return panel
-    return frame
+    if GALLERY_FILE_DTYPE is not None:
+        # Arquivo compacto gerado de novo só quando as fotos mudam
+        if MATCH_MODE == 'identities':
+            return open_identity_gallery(GALLERY_FILE, KNOWN_FACES_DIR, GALLERY_FILE_DTYPE,
+                                         IDENTITY_MAX_TEMPLATES, IDENTITY_SHORTLIST)
+        return open_gallery(GALLERY_FILE, KNOWN_FACES_DIR, GALLERY_FILE_DTYPE, IDENTITY_MAX_TEMPLATES)
+    # As "encodings" vêm do cache em disco; só imagens novas ou alteradas são recalculadas
+    gallery = FaceGallery.from_directory(KNOWN_FACES_DIR)
+    if MATCH_MODE == 'identities':
+        return IdentityGallery.from_gallery(gallery, max_templates=IDENTITY_MAX_TEMPLATES,
+                                            shortlist=IDENTITY_SHORTLIST)
+    if GALLERY_INDEX != 'flat':
+        gallery.attach_index(INDEX_FILE, kind=GALLERY_INDEX, nprobe=IVF_NPROBE)
+    return gallery
 
 # Função para carregar o histórico de reconhecimentos
 def load_recognition_log():
-    if os.path.exists(RECOGNITION_LOG_FILE):
-        with open(RECOGNITION_LOG_FILE, 'r') as file:
-            return json.load(file)
-    return {}
+    # Gravação em lote por uma thread; o JSON antigo é importado uma única vez
+    if LOG_BACKEND == 'sqlite':
+        return RecognitionLog(AttendanceStore(ATTENDANCE_DB, legacy_file=LEGACY_LOG_FILE))
+    return RecognitionLog(JsonlEventStore(RECOGNITION_LOG_FILE, legacy_file=LEGACY_LOG_FILE))
 
-# Função para salvar o histórico de reconhecimentos
-def save_recognition_log(recognition_log):
-    with open(RECOGNITION_LOG_FILE, 'w') as file:
-        json.dump(recognition_log, file, indent=4)
+# Registra no histórico as pessoas reconhecidas (no máximo uma vez a cada 60 segundos)
+def register_recognitions(recognition_log, faces):
+    for face in faces:
+        name = face.name
+        # Se a pessoa for reconhecida (não for "Desconhecido") nesta detecção, e não só mantida pela trilha
+        if name != "Desconhecido" and face.matched:
+            first_time = not recognition_log.seen(name)
+            now = datetime.datetime.now()
+            # Consulta O(1) ao último horário em memória; a gravação em disco é feita em lote
+            if recognition_log.record(name, now):
+                current_time = now.strftime("%Y-%m-%d %H:%M:%S")
+                if first_time:
+                    print(f"{name} reconhecido pela primeira vez às {current_time}")
+                else:
+                    print(f"{name} reconhecido novamente às {current_time}")
 
-# Função para capturar e identificar rostos
-def capture_and_identify_faces():
-    video = cv2.VideoCapture(0)
-    if not video.isOpened():
-        print("Erro: Não foi possível acessar a câmera.")
-        return
+# Executa o pipeline em threads: captura, workers de reconhecimento e exibição
+def run_pipeline(video, recognizer, recognition_log, renderer=None, exporter=None):
+    pipeline = RecognitionPipeline(video, recognizer, workers=PIPELINE_WORKERS).start()
+    metrics = recognizer.metrics
+    publisher = MetricsPublisher(METRICS_FILE)
+    try:
+        while pipeline.running:
+            result = pipeline.next_result()
+            if result is not None:
+                start = time.perf_counter()
+                with metrics.timer('log'):
+                    register_recognitions(recognition_log, result.faces)
+                metrics.count_faces(result.faces)
 
-    # Carrega os rostos conhecidos
-    known_faces, known_names = load_known_faces()
+                # Exibe o frame
+                if renderer is not None:
+                    cv2.imshow("Reconhecimento Facial", renderer.render(result.frame.image, result.faces))
+                pipeline.record_render(result, time.perf_counter() - start)
+                publisher.maybe_publish_metrics(metrics)
+            metrics.tick()
+            if exporter is not None:
+                exporter.maybe_export()
 
-    # Carrega o histórico de reconhecimentos
-    recognition_log = load_recognition_log()
+            # Parar o loop ao pressionar 'q'
+            if renderer is not None and cv2.waitKey(1) == ord('q'):
+                break
+    finally:
+        pipeline.stop()
+    for stage, stats in pipeline.summary().items():
+        print(f"{stage}: {stats['count']} itens, média {stats['avg_ms']:.1f} ms, "
+              f"máx {stats['max_ms']:.1f} ms, {stats['drops']} descartados")
 
+# Laço serial: um frame por vez, com rastreamento entre detecções
+def run_serial(video, recognizer, recognition_log, renderer=None, exporter=None):
+    metrics = recognizer.metrics
+    publisher = MetricsPublisher(METRICS_FILE)
     while True:
+        start = time.perf_counter()
         ret, frame = video.read()
         if not ret:
             print("Falha ao capturar o vídeo")
             break
+        captured = time.perf_counter()
+        metrics.observe('capture', captured - start)
+        metrics.inc('frames')
 
-        # Convertendo para RGB (necessário para face_recognition)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        # Localiza e identifica os rostos (ou só atualiza as trilhas entre detecções)
+        faces, detected = recognizer.process(frame)
+        metrics.observe('recognize', time.perf_counter() - captured)
+        if detected:
+            with metrics.timer('log'):
+                register_recognitions(recognition_log, faces)
+            metrics.count_faces(faces)
 
-        # Localiza rostos no frame
-        face_locations = face_recognition.face_locations(rgb_frame)
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+        # Exibe o frame
+        render_start = time.perf_counter()
+        if renderer is not None:
+            cv2.imshow("Reconhecimento Facial", renderer.render(frame, faces))
+        metrics.observe('render', time.perf_counter() - render_start)
+        publisher.maybe_publish_metrics(metrics)
+        metrics.tick()
+        if exporter is not None:
+            exporter.maybe_export()
 
-        for face_encoding, face_location in zip(face_encodings, face_locations):
-            # Comparação com rostos conhecidos
-            face_distances = face_recognition.face_distance(known_faces, face_encoding)
-            best_match_index = np.argmin(face_distances)
+        # Parar o loop ao pressionar 'q'
+        if renderer is not None and cv2.waitKey(1) == ord('q'):
+            break
 
-            if face_distances[best_match_index] < 0.5:  # Limite ajustável
-                name = known_names[best_match_index]
-            else:
-                name = "Desconhecido"
+# Resumo do portão de movimento: frames pulados e tempo de CPU economizado
+def print_gate_summary(gate):
+    summary = gate.summary()
+    print(f"Portão de movimento: {summary['skipped']} de {summary['frames']} frames pulados, "
+          f"{summary['restricted']} com detecção restrita, {summary['full']} completos "
+          f"({summary['forced']} forçados). Economia estimada: {summary['saved_seconds']:.1f} s de CPU "
+          f"({100 * summary['saved_fraction']:.0f}%), custo do portão {summary['gate_ms']:.2f} ms/frame.")
 
-            # Desenhar o nome e o bounding box no frame
-            top, right, bottom, left = face_location
-            color = (0, 255, 0) if name != "Desconhecido" else (0, 0, 255)
-            cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
-            cv2.putText(frame, name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+def print_quality_summary(quality):
+    summary = quality.summary()
+    print(f"Portão de qualidade: {summary['encodes_saved']} de {summary['checked']} rostos não codificados "
+          f"({100 * summary['saved_fraction']:.0f}%): {summary['small']} pequenos, {summary['blurry']} borrados, "
+          f"{summary['pose']} de perfil.")
 
-            frame = create_panel(frame, name)
+def create_quality_gate():
+    if not QUALITY_GATE:
+        return None
+    return FaceQualityGate(QUALITY_MIN_SIZE, QUALITY_MIN_SHARPNESS, QUALITY_MAX_YAW, QUALITY_MIN_EYE_SPAN)
 
-            # Se a pessoa for reconhecida (não for "Desconhecido")
-            if name != "Desconhecido":
-                now = datetime.datetime.now()
-                current_time = now.strftime("%Y-%m-%d %H:%M:%S")
+# Exportador das métricas conforme METRICS_EXPORT
+def create_metrics_exporter(metrics):
+    if METRICS_EXPORT == 'http':
+        print(f"Métricas em http://127.0.0.1:{METRICS_PORT}/metrics")
+        return MetricsServer(metrics, METRICS_PORT).start()
+    if METRICS_EXPORT == 'file':
+        return MetricsFileExporter(metrics, PROMETHEUS_FILE)
+    return None
 
-                # Verifica se já foi registrada anteriormente
-                if name in recognition_log:
-                    # Obter o tempo do último reconhecimento registrado
-                    last_time_str = recognition_log[name][-1]
-                    last_time = datetime.datetime.strptime(last_time_str, "%Y-%m-%d %H:%M:%S")
-
-                    # Verificar se já se passaram 60 segundos
-                    time_diff = now - last_time
-                    if time_diff.total_seconds() >= 60:
-                        recognition_log[name].append(current_time)
-                        print(f"{name} reconhecido novamente às {current_time}")
-                else:
-                    # Se for a primeira vez que é reconhecida, registra
-                    recognition_log[name] = [current_time]
-                    print(f"{name} reconhecido pela primeira vez às {current_time}")
+# Função para capturar e identificar rostos
+def capture_and_identify_faces():
+    video = cv2.VideoCapture(0)
+    if not video.isOpened():
+        print("Erro: Não foi possível acessar a câmera.")
+        return
 
-        # Exibe o frame
-        cv2.imshow("Reconhecimento Facial", frame)
-        save_recognition_log(recognition_log) # Salva o histórico de reconhecimentos no arquivo JSON
+    # Carrega os rostos conhecidos
+    gallery = load_known_faces()
+    tracker = FaceTracker(TRACKER_TYPE) if TRACKING and not PIPELINE else None
+    backend = resolve_backend(DETECTOR_BACKEND, DETECTION_SCALE, recall_target=DETECTOR_RECALL)
+    detector = FaceDetector(backend, scale=DETECTION_SCALE, roi=DETECTION_ROI, full_every=FULL_SWEEP_EVERY)
+    # O portão depende da ordem dos frames: só no laço serial
+    gate = MotionGate(MOTION_MODE, max_stale=MAX_STALE_FRAMES) if MOTION_GATE and not PIPELINE else None
+    quality = create_quality_gate()
+    # Registro único de tempos e contadores: alimenta o painel (METRICS_FILE) e, se ligado, o Prometheus
+    metrics = Metrics()
+    exporter = create_metrics_exporter(metrics)
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda *_: metrics.request_profile(PROFILE_SECONDS))
+    recognizer = FaceRecognizer(gallery, threshold=0.5, detect_every=DETECT_EVERY,  # Limite ajustável
+                                tracker=tracker, detector=detector, gate=gate, metrics=metrics,
+                                quality=quality)
 
-        # Parar o loop ao pressionar 'q'
-        if cv2.waitKey(1) == ord('q'):
-            break
-    
-    video.release()
-    cv2.destroyAllWindows()
+    # Miniaturas carregadas uma vez; sem janela (RENDER = False), nada é desenhado
+    renderer = None
+    if RENDER:
+        renderer = OverlayRenderer(ThumbnailCache(KNOWN_FACES_DIR, THUMBNAIL_SIZE), columns=PANEL_COLUMNS)
+        renderer.thumbnails.preload(gallery.names)
+
+    # Carrega o histórico de reconhecimentos
+    recognition_log = load_recognition_log()
+
+    try:
+        if PIPELINE:
+            run_pipeline(video, recognizer, recognition_log, renderer, exporter)
+        else:
+            run_serial(video, recognizer, recognition_log, renderer, exporter)
+    except KeyboardInterrupt:
+        pass  # Sem janela, o laço é interrompido com Ctrl+C
+    finally:
+        recognition_log.close()  # Grava os eventos pendentes
+        if exporter is not None:
+            exporter.close()
+        video.release()
+        if renderer is not None:
+            cv2.destroyAllWindows()
+        if gate is not None:
+            print_gate_summary(gate)
+        if quality is not None:
+            print_quality_summary(quality)
 
 # Execução principal
 if __name__ == "__main__":
@@ -0,0 +1,115 @@
+import time
+from collections import namedtuple
+import cv2
+from detection import FaceDetector
+from encoding_cache import encode_faces
+from gallery import UNKNOWN_NAME
+from motion_gate import SKIP, FULL
+from metrics import Metrics
+
+# Um rosto no frame: caixa (top, right, bottom, left), nome, distância e trilha (ou None).
+# `matched` é False quando o nome vem de uma trilha que não foi detectada e
+# identificada de novo neste frame: o rosto não deve ser registrado no histórico.
+RecognizedFace = namedtuple('RecognizedFace', ['location', 'name', 'distance', 'track_id', 'matched'],
+                            defaults=(True,))
+
+
+class FaceRecognizer:
+    """Detecta, codifica e identifica os rostos de frames BGR.
+
+    `matcher` é qualquer objeto com `identify(encodings, threshold)`, como
+    FaceGallery ou IdentityGallery. Com um `tracker` (ver `tracking`), a
+    detecção e a codificação rodam só a cada `detect_every` frames ou quando
+    uma trilha é perdida; nos demais frames as trilhas carregam os nomes.
+    `detector` (ver `detection`) define a escala e o modo ROI da detecção.
+    Com um `gate` (ver `motion_gate`), frames sem mudança reaproveitam o
+    último resultado e mudanças localizadas restringem a detecção.
+    `metrics` (ver `metrics`) recebe os tempos de detecção, codificação e
+    comparação. Com um `quality` (ver `face_quality`), rostos pequenos,
+    borrados ou de perfil não são codificados: saem como "Desconhecido" com
+    distância None ("não avaliado").
+    """
+
+    def __init__(self, matcher, threshold=0.5, model='hog', detect_every=1, tracker=None, detector=None,
+                 gate=None, metrics=None, quality=None):
+        self.matcher = matcher
+        self.threshold = threshold
+        self.detector = detector or FaceDetector(model=model)
+        self.detect_every = detect_every
+        self.tracker = tracker
+        self.gate = gate
+        self.quality = quality
+        self.metrics = metrics or Metrics(enabled=False)
+        self._frames_since_detection = None
+        self._last_faces = None
+
+    def detect_and_identify(self, frame, regions=None, full=False):
+        """Retorna (caixas, [(nome, distância)]) dos rostos do frame."""
+        # Convertendo para RGB (necessário para face_recognition)
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        # Detecção (possivelmente em escala reduzida); a codificação usa a resolução original
+        # e recebe as caixas prontas, em lote, sem detectar de novo
+        with self.metrics.timer('detect'):
+            locations = self.detector.detect(rgb_frame, regions, full)
+        accepted, shapes = range(len(locations)), None
+        if self.quality is not None and locations:
+            with self.metrics.timer('quality'):
+                accepted, shapes = self.quality.filter(rgb_frame, locations)
+            if len(accepted) < len(locations):
+                self.metrics.inc('encodes_skipped', len(locations) - len(accepted))
+        with self.metrics.timer('encode'):
+            encodings = encode_faces(rgb_frame, [locations[i] for i in accepted], shapes=shapes)
+        with self.metrics.timer('match'):
+            found = self.matcher.identify(encodings, threshold=self.threshold)
+        if len(accepted) == len(locations):
+            return locations, found
+        matches = [(UNKNOWN_NAME, None)] * len(locations)
+        for i, match in zip(accepted, found):
+            matches[i] = match
+        return locations, matches
+
+    def _should_detect(self):
+        if self._frames_since_detection is None or self.tracker.lost:
+            return True
+        return self._frames_since_detection >= self.detect_every
+
+    def process(self, frame):
+        """Retorna (rostos, detectou), onde `detectou` indica se houve detecção neste frame."""
+        regions, full = None, False
+        if self.gate is not None:
+            decision, found = self.gate.check(frame)
+            if decision == SKIP:
+                if self._last_faces is not None:
+                    self.metrics.inc('frames_skipped')
+                    return self._last_faces, False
+                decision = FULL
+            regions, full = (None, True) if decision == FULL else (found, False)
+            start = time.perf_counter()
+            faces, detected = self._process(frame, regions, full)
+            if detected:
+                self.gate.record_inference(decision, time.perf_counter() - start)
+        else:
+            faces, detected = self._process(frame, regions, full)
+        self._last_faces = faces
+        return faces, detected
+
+    def _process(self, frame, regions, full):
+        if self.tracker is None:
+            locations, matches = self.detect_and_identify(frame, regions, full)
+            faces = [RecognizedFace(location, name, distance, None)
+                     for location, (name, distance) in zip(locations, matches)]
+            return faces, True
+
+        # Uma passada completa pedida pelo portão sempre detecta
+        if full or self._should_detect():
+            locations, matches = self.detect_and_identify(frame, regions, full)
+            tracks = self.tracker.update(frame, locations, matches)
+            self._frames_since_detection = 1
+            detected = True
+        else:
+            tracks = self.tracker.predict(frame)
+            self._frames_since_detection += 1
+            detected = False
+        faces = [RecognizedFace(track.location, track.name, track.distance, track.id, detected and track.matched)
+                 for track in tracks]
+        return faces, detected
@@ -0,0 +1,129 @@
+import os
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+
+from gallery import UNKNOWN_NAME, name_from_filename
+from encoding_cache import KNOWN_FACES_DIR, IMAGE_EXTENSIONS
+
+KNOWN_COLOR = (0, 255, 0)
+UNKNOWN_COLOR = (0, 0, 255)
+
+
+class ThumbnailCache:
+    """Uma miniatura por pessoa (já redimensionada), com descarte LRU.
+
+    O nome vem de `name_from_filename`, então "ana_3.jpg" é encontrado para
+    "ana"; a foto escolhida é a primeira do diretório em ordem alfabética.
+    O diretório só é listado de novo quando seu mtime muda.
+    """
+
+    def __init__(self, directory=KNOWN_FACES_DIR, size=100, capacity=64):
+        self.directory = directory
+        self.size = size
+        self.capacity = capacity
+        self._files = {}  # nome -> arquivo
+        self._directory_mtime = None
+        self._thumbnails = OrderedDict()  # nome -> miniatura (ou None se não houver foto legível)
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._directory_mtime:
+            return
+        files = {}
+        for filename in sorted(os.listdir(self.directory)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                files.setdefault(name_from_filename(filename), filename)
+        # Pessoas cuja foto mudou de arquivo (ou foi removida) são recarregadas
+        for name in [name for name in self._thumbnails if files.get(name) != self._files.get(name)]:
+            del self._thumbnails[name]
+        self._files, self._directory_mtime = files, mtime
+
+    def _load(self, name):
+        filename = self._files.get(name)
+        image = cv2.imread(os.path.join(self.directory, filename)) if filename else None
+        if image is None:
+            return None
+        return cv2.resize(image, (self.size, self.size), interpolation=cv2.INTER_AREA)
+
+    def preload(self, names):
+        for name in list(names)[:self.capacity]:
+            self.get(name)
+
+    def get(self, name):
+        """Miniatura BGR (size x size) da pessoa, ou None."""
+        with self._lock:
+            if self._thumbnails.get(name) is not None:
+                self._thumbnails.move_to_end(name)
+                return self._thumbnails[name]
+            # Sem foto até agora: só tenta de novo se o diretório mudou
+            self._scan()
+            if name in self._thumbnails:
+                self._thumbnails.move_to_end(name)
+                return self._thumbnails[name]
+            thumbnail = self._load(name)
+            self._thumbnails[name] = thumbnail
+            if len(self._thumbnails) > self.capacity:
+                self._thumbnails.popitem(last=False)
+            return thumbnail
+
+
+class OverlayRenderer:
+    """Desenha caixas, nomes e um painel lateral com as pessoas reconhecidas.
+
+    A saída é um único buffer (frame + painel) alocado na primeira chamada e
+    reutilizado enquanto o tamanho do frame não mudar; as caixas são
+    desenhadas direto nele. O painel mostra as miniaturas de todas as pessoas
+    reconhecidas no frame em uma grade de `columns` colunas; quem não couber
+    é omitido, então o custo não cresce com o número de rostos.
+    """
+
+    def __init__(self, thumbnails=None, columns=2):
+        self.thumbnails = thumbnails or ThumbnailCache()
+        self.columns = columns
+        self._buffer = None
+
+    @property
+    def panel_width(self):
+        return self.columns * self.thumbnails.size
+
+    def _output(self, frame):
+        height, width = frame.shape[:2]
+        shape = (max(height, self.thumbnails.size), width + self.panel_width, 3)
+        if self._buffer is None or self._buffer.shape != shape:
+            self._buffer = np.zeros(shape, dtype=np.uint8)
+        return self._buffer
+
+    def render(self, frame, faces):
+        """Retorna o buffer com o frame anotado; é sobrescrito na próxima chamada."""
+        output = self._output(frame)
+        height, width = frame.shape[:2]
+        view = output[:height, :width]
+        np.copyto(view, frame)
+
+        names = []
+        for face in faces:
+            top, right, bottom, left = face.location
+            color = KNOWN_COLOR if face.name != UNKNOWN_NAME else UNKNOWN_COLOR
+            cv2.rectangle(view, (left, top), (right, bottom), color, 2)
+            cv2.putText(view, face.name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+            if face.name != UNKNOWN_NAME and face.name not in names:
+                names.append(face.name)
+
+        panel = output[:, width:]
+        panel.fill(0)
+        size = self.thumbnails.size
+        slots = (output.shape[0] // size) * self.columns
+        for slot, name in enumerate(names[:slots]):
+            thumbnail = self.thumbnails.get(name)
+            top, left = (slot // self.columns) * size, (slot % self.columns) * size
+            cell = panel[top:top + size, left:left + size]
+            if thumbnail is not None:
+                np.copyto(cell, thumbnail)
+            cv2.putText(cell, name, (4, size - 6), cv2.FONT_HERSHEY_SIMPLEX, 0.45, KNOWN_COLOR, 1)
+        return output
@@ -0,0 +1,222 @@
+"""Servidor de reconhecimento sem janela para várias câmeras com uma única galeria.
+
+Cada fonte (índice de câmera, URL RTSP ou arquivo de vídeo) tem uma thread
+de captura que guarda só o frame mais novo. Um conjunto de workers atende
+as fontes de forma justa: entre as que têm frame novo e cujo orçamento de
+FPS já permite outro frame, vai primeiro a que está esperando há mais
+tempo; cada fonte tem no máximo um frame em processamento (backpressure:
+os frames que chegam enquanto isso substituem o anterior e são contados
+como descartados). Os eventos de presença levam o id da fonte, e os tempos
+de captura e de reconhecimento de cada fonte vão para os estágios
+`<id>/capture` e `<id>/recognize` do registro de métricas.
+
+Uso: python server.py 0 sala2=rtsp://10.0.0.5/stream aula.mp4 --workers 4 --fps 5
+"""
+import os
+import time
+import argparse
+import datetime
+import threading
+import cv2
+
+from principal import (load_known_faces, load_recognition_log, DETECTOR_BACKEND, DETECTOR_RECALL,
+                       DETECTION_SCALE, DETECTION_ROI, FULL_SWEEP_EVERY, MOTION_MODE, MAX_STALE_FRAMES,
+                       METRICS_FILE, create_quality_gate)
+from gallery import UNKNOWN_NAME
+from detection import FaceDetector
+from detector_select import resolve_backend
+from motion_gate import MotionGate
+from recognizer import FaceRecognizer
+from pipeline import LatestFrameGrabber, MetricsPublisher
+from metrics import Metrics, MetricsFileExporter, MetricsServer
+
+STATUS_INTERVAL = 30.0  # Segundos entre os resumos por fonte no terminal
+
+
+def parse_source(spec):
+    """'sala1=rtsp://...' -> ('sala1', 'rtsp://...'); '0' -> ('cam0', 0); 'aula.mp4' -> ('aula', 'aula.mp4')."""
+    name, _, target = spec.rpartition('=')
+    if not name or '://' in name:
+        name, target = '', spec
+    if target.isdigit():
+        return name or f"cam{target}", int(target)
+    return name or os.path.splitext(os.path.basename(target))[0] or target, target
+
+
+class Stream:
+    """Uma fonte: captura própria e reconhecedor próprio (estado de ROI/portão)."""
+
+    def __init__(self, source_id, target, matcher, fps_budget, metrics, gate=True, backend='hog'):
+        self.id = source_id
+        self.target = target
+        self.video = cv2.VideoCapture(target)
+        if not self.video.isOpened():
+            raise OSError(f"Não foi possível abrir a fonte {source_id} ({target}).")
+        # Arquivos são lidos no ritmo do próprio vídeo, como uma câmera
+        is_file = isinstance(target, str) and os.path.exists(target)
+        pace = (self.video.get(cv2.CAP_PROP_FPS) or 30.0) if is_file else None
+        self.grabber = LatestFrameGrabber(self.video, metrics, pace, f'grabber-{source_id}',
+                                          stage=f'{source_id}/capture')
+        detector = FaceDetector(backend, scale=DETECTION_SCALE, roi=DETECTION_ROI, full_every=FULL_SWEEP_EVERY)
+        self.recognizer = FaceRecognizer(matcher, threshold=0.5, detector=detector, metrics=metrics,
+                                         gate=MotionGate(MOTION_MODE, max_stale=MAX_STALE_FRAMES) if gate else None,
+                                         quality=create_quality_gate())
+        self.interval = 1.0 / fps_budget if fps_budget else 0.0
+        self.next_due = 0.0
+        self.busy = False
+
+    @property
+    def finished(self):
+        return self.grabber.finished and not self.grabber.ready
+
+
+class StreamScheduler:
+    """Escolhe a próxima fonte a processar, respeitando o orçamento de FPS de cada uma."""
+
+    def __init__(self, streams, poll_interval=0.01):
+        self.streams = streams
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._stopped = False
+
+    def next_job(self):
+        """Bloqueia até haver trabalho; retorna (fonte, frame) ou None quando acabar."""
+        with self._condition:
+            while not self._stopped:
+                now = time.perf_counter()
+                ready = [s for s in self.streams if not s.busy and s.grabber.ready and s.next_due <= now]
+                if ready:
+                    # A fonte com o prazo mais antigo vai primeiro (nenhuma monopoliza os workers)
+                    stream = min(ready, key=lambda s: s.next_due)
+                    frame = stream.grabber.take(timeout=0)
+                    if frame is not None:
+                        stream.busy = True
+                        stream.next_due = max(stream.next_due + stream.interval, now)
+                        return stream, frame
+                if all(s.finished and not s.busy for s in self.streams):
+                    return None
+                waits = [s.next_due - now for s in self.streams if s.next_due > now]
+                self._condition.wait(min(waits + [self.poll_interval]))
+        return None
+
+    def done(self, stream):
+        with self._condition:
+            stream.busy = False
+            self._condition.notify_all()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+
+class RecognitionServer:
+    def __init__(self, sources, workers=4, fps_budget=5.0, gate=True, metrics=None):
+        self.metrics = metrics or Metrics()  # Sempre ligado: status() e o painel leem os estágios por fonte
+        # Uma única galeria (e índice) compartilhada, só leitura, entre todas as fontes
+        self.matcher = load_known_faces()
+        backend = resolve_backend(DETECTOR_BACKEND, DETECTION_SCALE, recall_target=DETECTOR_RECALL)
+        self.streams = [Stream(source_id, target, self.matcher, fps_budget, self.metrics, gate, backend)
+                        for source_id, target in (parse_source(spec) for spec in sources)]
+        self.scheduler = StreamScheduler(self.streams)
+        self.recognition_log = load_recognition_log()
+        self.workers = [threading.Thread(target=self._work, name=f'recognizer-{i}', daemon=True)
+                        for i in range(workers)]
+
+    def _work(self):
+        while True:
+            job = self.scheduler.next_job()
+            if job is None:
+                break
+            stream, frame = job
+            try:
+                start = time.perf_counter()
+                faces, detected = stream.recognizer.process(frame.image)
+                elapsed = time.perf_counter() - start
+                self.metrics.observe(f'{stream.id}/recognize', elapsed)
+                self.metrics.observe('recognize', elapsed)  # Todas as fontes juntas (FPS total do app.py)
+                if detected:
+                    self._register(stream.id, faces)
+            finally:
+                self.scheduler.done(stream)
+
+    def _register(self, source_id, faces):
+        self.metrics.count_faces(faces)
+        with self.metrics.timer('log'):
+            for face in faces:
+                if face.name == UNKNOWN_NAME or not face.matched:
+                    continue
+                now = datetime.datetime.now()
+                if self.recognition_log.record(face.name, now, source=source_id):
+                    print(f"[{source_id}] {face.name} reconhecido às {now.strftime('%Y-%m-%d %H:%M:%S')}")
+
+    def status(self):
+        stages = self.metrics.summary()['stages']
+        empty = {'count': 0, 'avg_ms': 0.0, 'drops': 0}
+        lines = []
+        for stream in self.streams:
+            capture = stages.get(f'{stream.id}/capture', empty)
+            recognize = stages.get(f'{stream.id}/recognize', empty)
+            line = (f"{stream.id}: {recognize['count']} frames processados "
+                    f"({recognize['avg_ms']:.0f} ms em média), {capture['count']} capturados, "
+                    f"{capture['drops']} descartados")
+            if stream.recognizer.quality is not None:
+                line += f", {stream.recognizer.quality.summary()['encodes_saved']} codificações evitadas"
+            lines.append(line)
+        return '\n'.join(lines)
+
+    def run(self, exporter=None):
+        for stream in self.streams:
+            stream.grabber.start()
+        for worker in self.workers:
+            worker.start()
+        publisher = MetricsPublisher(METRICS_FILE)
+        last_status = time.perf_counter()
+        try:
+            while any(worker.is_alive() for worker in self.workers):
+                time.sleep(0.2)
+                publisher.maybe_publish_metrics(self.metrics, frames_stage='recognize')
+                if exporter is not None:
+                    exporter.maybe_export()
+                if time.perf_counter() - last_status >= STATUS_INTERVAL:
+                    print(self.status())
+                    last_status = time.perf_counter()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+        print(self.status())
+
+    def stop(self):
+        self.scheduler.stop()
+        for stream in self.streams:
+            stream.grabber.stop()
+        for worker in self.workers:
+            worker.join(timeout=2.0)
+        for stream in self.streams:
+            stream.grabber.join(timeout=1.0)
+            stream.video.release()
+        self.recognition_log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sources', nargs='+', help='índices de câmera, URLs RTSP ou vídeos (opcional: id=fonte)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--fps', type=float, default=5.0, help='frames processados por segundo, por fonte')
+    parser.add_argument('--no-gate', action='store_true', help='desliga o portão de movimento')
+    parser.add_argument('--metrics', choices=['file', 'http'], default='file')
+    args = parser.parse_args()
+
+    metrics = Metrics()
+    exporter = MetricsServer(metrics).start() if args.metrics == 'http' else MetricsFileExporter(metrics)
+    server = RecognitionServer(args.sources, args.workers, args.fps, gate=not args.no_gate, metrics=metrics)
+    print(f"{len(server.streams)} fontes, {args.workers} workers, até {args.fps:g} FPS por fonte.")
+    try:
+        server.run(exporter)
+    finally:
+        exporter.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,26 @@
 import os
 import cv2
-import face_recognition
-import numpy as np
 import datetime
 import json
+from gallery import FaceGallery
+from detection import detect_faces
+from encoding_cache import encode_faces
+from recognizer import RecognizedFace
+from renderer import OverlayRenderer, ThumbnailCache
 
 # Configuração dos diretórios
 KNOWN_FACES_DIR = 'data/known_faces'
 RECOGNITION_LOG_FILE = 'recognition_log.json'
+DETECTOR_BACKEND = 'cnn'  # Qualquer detector de detection.DETECTOR_BACKENDS
+DETECTION_SCALE = 0.5  # A CNN roda em um frame reduzido; as caixas voltam para a resolução original
 
 if not os.path.exists(KNOWN_FACES_DIR):
     os.makedirs(KNOWN_FACES_DIR)
 
 # Função para carregar rostos conhecidos
 def load_known_faces():
-    known_faces = []
-    known_names = []
-    for filename in os.listdir(KNOWN_FACES_DIR):
-        if filename.endswith('.jpg'):
-            name = filename.split('_')[0]  # Nome antes do "_X.jpg"
-            name = os.path.splitext(name)[0]  # Remover a extensão .jpg do nome
-            img_path = os.path.join(KNOWN_FACES_DIR, filename)
-            # Carregar imagem e calcular as "encodings"
-            image = face_recognition.load_image_file(img_path)
-            encodings = face_recognition.face_encodings(image)
-            if encodings:  # Verifica se encontrou um rosto
-                known_faces.append(encodings[0])
-                known_names.append(name)
-    return known_faces, known_names
-
-def create_panel(frame, name):
-    person_image_path = os.path.join(KNOWN_FACES_DIR, f"{name}.jpg")
-    if os.path.exists(person_image_path):
-        person_image = cv2.imread(person_image_path)
-        person_image = cv2.resize(person_image, (200, 200))  # Ajuste o tamanho da foto
-        panel_height = max(frame.shape[0], 200)
-        panel_width = frame.shape[1] + 200
-        panel = np.zeros((panel_height, panel_width, 3), dtype=np.uint8)
-        panel[:frame.shape[0], :frame.shape[1]] = frame
-        panel[:200, frame.shape[1]:] = person_image
-        return panel
-    return frame
+    # As "encodings" vêm do cache em disco; só imagens novas ou alteradas são recalculadas
+    return FaceGallery.from_directory(KNOWN_FACES_DIR)
 
 # Função para carregar o histórico de reconhecimentos
 def load_recognition_log():
@@ -62,7 +42,10 @@ def capture_and_identify_faces():
         return
 
     # Carrega os rostos conhecidos
-    known_faces, known_names = load_known_faces()
+    gallery = load_known_faces()
+
+    # Miniaturas das pessoas para o painel lateral (carregadas uma vez)
+    renderer = OverlayRenderer(ThumbnailCache(KNOWN_FACES_DIR))
 
     # Carrega o histórico de reconhecimentos
     recognition_log = load_recognition_log()
@@ -77,26 +60,17 @@ def capture_and_identify_faces():
         rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
         # Localiza rostos no frame
-        face_locations = face_recognition.face_locations(rgb_frame, model='cnn')
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-
-        for face_encoding, face_location in zip(face_encodings, face_locations):
-            # Comparação com rostos conhecidos
-            face_distances = face_recognition.face_distance(known_faces, face_encoding)
-            best_match_index = np.argmin(face_distances)
+        face_locations = detect_faces(rgb_frame, model=DETECTOR_BACKEND, scale=DETECTION_SCALE)
+        face_encodings = encode_faces(rgb_frame, face_locations)  # As caixas vão prontas, sem nova detecção
 
-            if face_distances[best_match_index] < 0.5:  # Limite ajustável
-                name = known_names[best_match_index]
-            else:
-                name = "Desconhecido"
+        # Comparação de todos os rostos do frame com a galeria de uma vez
+        matches = gallery.identify(face_encodings, threshold=0.5)  # Limite ajustável
 
-            # Desenhar o nome e o bounding box no frame
-            top, right, bottom, left = face_location
-            color = (0, 255, 0) if name != "Desconhecido" else (0, 0, 255)
-            cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
-            cv2.putText(frame, name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, color, 2)
+        faces = [RecognizedFace(location, name, distance, None)
+                 for location, (name, distance) in zip(face_locations, matches)]
 
-            frame = create_panel(frame, name)
+        for face in faces:
+            name = face.name
 
             # Se a pessoa for reconhecida (não for "Desconhecido")
             if name != "Desconhecido":
@@ -119,8 +93,8 @@ def capture_and_identify_faces():
                     recognition_log[name] = [current_time]
                     print(f"{name} reconhecido pela primeira vez às {current_time}")
 
-        # Exibe o frame
-        cv2.imshow("Reconhecimento Facial", frame)
+        # Exibe o frame com as caixas e o painel lateral
+        cv2.imshow("Reconhecimento Facial", renderer.render(frame, faces))
         save_recognition_log(recognition_log) # Salva o histórico de reconhecimentos no arquivo JSON
 
         # Parar o loop ao pressionar 'q'
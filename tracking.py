@@ -0,0 +1,143 @@
+import cv2
+import numpy as np
+
+
+def iou(box_a, box_b):
+    """Interseção sobre união de duas caixas no formato (top, right, bottom, left)."""
+    top, right = max(box_a[0], box_b[0]), min(box_a[1], box_b[1])
+    bottom, left = min(box_a[2], box_b[2]), max(box_a[3], box_b[3])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    area_a = (box_a[1] - box_a[3]) * (box_a[2] - box_a[0])
+    area_b = (box_b[1] - box_b[3]) * (box_b[2] - box_b[0])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def create_opencv_tracker(tracker_type):
+    """Cria um rastreador do OpenCV ('kcf', 'csrt' ou 'mil'); None se indisponível."""
+    factories = {
+        'kcf': ('TrackerKCF_create', 'TrackerKCF'),
+        'csrt': ('TrackerCSRT_create', 'TrackerCSRT'),
+        'mil': ('TrackerMIL_create', 'TrackerMIL'),
+    }
+    if tracker_type not in factories:
+        return None
+    legacy_name, class_name = factories[tracker_type]
+    # Os nomes variam entre versões do OpenCV (e dependem do opencv-contrib)
+    for module in (cv2, getattr(cv2, 'legacy', None)):
+        if module is None:
+            continue
+        if hasattr(module, legacy_name):
+            return getattr(module, legacy_name)()
+        cls = getattr(module, class_name, None)
+        if cls is not None and hasattr(cls, 'create'):
+            return cls.create()
+    return None
+
+
+class Track:
+    """Um rosto acompanhado entre frames, com o último nome reconhecido."""
+
+    def __init__(self, track_id, location, name, distance):
+        self.id = track_id
+        self.location = location  # (top, right, bottom, left)
+        self.name = name
+        self.distance = distance
+        self.misses = 0
+        self.matched = distance is not None  # identificado na última detecção
+        self.cv_tracker = None
+
+    @property
+    def confidence(self):
+        if self.distance is None or not np.isfinite(self.distance):
+            return 0.0
+        return max(0.0, 1.0 - self.distance)
+
+
+class FaceTracker:
+    """Mantém as identidades entre detecções.
+
+    Nos frames com detecção, as caixas detectadas são associadas às trilhas
+    existentes por IoU; entre detecções, um rastreador do OpenCV (se
+    disponível) atualiza a posição de cada trilha. Sem rastreador, a última
+    caixa detectada é mantida.
+    """
+
+    def __init__(self, tracker_type='kcf', iou_threshold=0.3, max_misses=1):
+        self.tracker_type = tracker_type
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.tracks = []
+        self.lost = False  # alguma trilha foi perdida desde a última detecção
+        self._next_id = 0
+
+    def _start_cv_tracker(self, track, frame):
+        track.cv_tracker = create_opencv_tracker(self.tracker_type)
+        if track.cv_tracker is None:
+            return
+        top, right, bottom, left = track.location
+        try:
+            track.cv_tracker.init(frame, (left, top, right - left, bottom - top))
+        except cv2.error:
+            track.cv_tracker = None
+
+    def update(self, frame, locations, matches):
+        """Associa as detecções do frame (caixas + (nome, distância)) às trilhas."""
+        pairs = sorted(
+            ((iou(track.location, location), t, d)
+             for t, track in enumerate(self.tracks)
+             for d, location in enumerate(locations)),
+            reverse=True,
+        )
+        used_tracks, used_detections = set(), set()
+        for overlap, t, d in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in used_tracks or d in used_detections:
+                continue
+            used_tracks.add(t)
+            used_detections.add(d)
+            track = self.tracks[t]
+            track.location = locations[d]
+            # Rosto não avaliado (portão de qualidade, distância None): a trilha mantém o nome
+            if matches[d][1] is not None or track.distance is None:
+                track.name, track.distance = matches[d]
+            track.matched = matches[d][1] is not None
+            track.misses = 0
+            self._start_cv_tracker(track, frame)
+
+        survivors = []
+        for t, track in enumerate(self.tracks):
+            if t not in used_tracks:
+                # Sobrevive com o nome antigo, mas não conta como reconhecida nesta detecção
+                track.matched = False
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+        for d, location in enumerate(locations):
+            if d not in used_detections:
+                name, distance = matches[d]
+                track = Track(self._next_id, location, name, distance)
+                self._next_id += 1
+                self._start_cv_tracker(track, frame)
+                survivors.append(track)
+        self.tracks = survivors
+        self.lost = False
+        return self.tracks
+
+    def predict(self, frame):
+        """Atualiza as posições das trilhas sem detectar rostos."""
+        height, width = frame.shape[:2]
+        survivors = []
+        for track in self.tracks:
+            if track.cv_tracker is not None:
+                ok, (x, y, w, h) = track.cv_tracker.update(frame)
+                if not ok:
+                    self.lost = True
+                    continue
+                x, y = max(int(x), 0), max(int(y), 0)
+                track.location = (y, min(x + int(w), width), min(y + int(h), height), x)
+            survivors.append(track)
+        self.tracks = survivors
+        return self.tracks